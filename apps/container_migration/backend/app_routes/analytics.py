@@ -0,0 +1,53 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from utils.migration_analytics import ANALYTICS_STEPS, GROUP_COLUMNS, migration_analytics
+
+router = APIRouter()
+
+def parse_list(value: Optional[str], allowed, name: str) -> list:
+    items = [item.strip() for item in (value or "").split(",") if item.strip()]
+    unknown = [item for item in items if item not in allowed]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown {name} {', '.join(unknown)}, use {', '.join(allowed)}")
+    return items
+
+def parse_percentiles(value: str) -> tuple:
+    try:
+        percentiles = tuple(float(item) for item in value.split(",") if item.strip())
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid percentiles '{value}'")
+    if not all(0 < q <= 100 for q in percentiles):
+        raise HTTPException(status_code=400, detail="Percentiles must be in (0, 100]")
+    return percentiles
+
+@router.get("/migrations")
+async def get_migration_analytics(step: Optional[str] = None, group_by: str = "app,cluster_pair",
+                                  app: Optional[str] = None, source_cluster: Optional[str] = None,
+                                  target_cluster: Optional[str] = None, namespace: Optional[str] = None,
+                                  since: Optional[float] = None, until: Optional[float] = None,
+                                  result: str = "done", percentiles: str = "50,90,95,99"):
+    """Count, mean, min, max and percentiles of step durations (ms) per group, for migrations finished between since and until (epoch seconds)"""
+    steps = parse_list(step, ANALYTICS_STEPS, "step") or None
+    groups = tuple(parse_list(group_by, GROUP_COLUMNS, "group"))
+    filters = {"app": app, "source_cluster": source_cluster, "target_cluster": target_cluster, "namespace": namespace}
+    return await asyncio.to_thread(migration_analytics.summary, steps, groups, since, until, filters,
+                                   None if result == "all" else result, parse_percentiles(percentiles))
+
+@router.get("/migrations/trend")
+async def get_migration_trend(step: str = "total", interval: str = "day", group_by: Optional[str] = None,
+                              app: Optional[str] = None, source_cluster: Optional[str] = None,
+                              target_cluster: Optional[str] = None, namespace: Optional[str] = None,
+                              since: Optional[float] = None, until: Optional[float] = None,
+                              result: str = "done", percentiles: str = "50,95"):
+    """Per hour or day statistics of one step, optionally per group"""
+    steps = parse_list(step, ANALYTICS_STEPS, "step")
+    if len(steps) != 1:
+        raise HTTPException(status_code=400, detail=f"Give exactly one step, use one of {', '.join(ANALYTICS_STEPS)}")
+    groups = tuple(parse_list(group_by, GROUP_COLUMNS, "group"))
+    filters = {"app": app, "source_cluster": source_cluster, "target_cluster": target_cluster, "namespace": namespace}
+    try:
+        return await asyncio.to_thread(migration_analytics.trend, steps[0], interval, groups, since, until, filters,
+                                       None if result == "all" else result, parse_percentiles(percentiles))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
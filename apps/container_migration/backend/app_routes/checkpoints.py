@@ -0,0 +1,27 @@
+from typing import Optional
+from fastapi import APIRouter
+from utils.checkpoint_retention import checkpoint_retention
+from utils.result_cache import result_cache
+
+router = APIRouter()
+
+@router.get("")
+async def list_checkpoints(node: Optional[str] = None, app: Optional[str] = None, namespace: Optional[str] = None):
+    """List the indexed checkpoint archives, newest first"""
+    return {"checkpoints": checkpoint_retention.list(node=node, app=app, namespace=namespace)}
+
+@router.get("/retention")
+async def get_retention():
+    """Get the retention policy, per-node usage and how much space the sweeps reclaimed"""
+    return checkpoint_retention.stats()
+
+@router.post("/retention/sweep")
+async def run_retention_sweep():
+    """Run a retention sweep now"""
+    checkpoint_retention.trigger()
+    return {"message": "Retention sweep triggered"}
+
+@router.get("/cache")
+async def get_result_cache():
+    """Get the size and hit/miss counters of the forensic report and AI suggestion cache"""
+    return result_cache.stats()
@@ -33,7 +33,7 @@ def delete_rule_by_index(index: int):
             raise HTTPException(status_code=404, detail=f"Index '{index}' out of range")
         deleted_rule = config.config.pop(index)
         save_config(config)
-        reload_config
+        reload_config()
         return {"message": f"Rule at index '{index}' deleted successfully", "deleted_rule": deleted_rule}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting rule by index: {str(e)}")
\ No newline at end of file
@@ -2,16 +2,23 @@ from fastapi import APIRouter, HTTPException
 from pathlib import Path
 from fastapi.responses import JSONResponse, FileResponse
 import os
+from utils.constants import LOG_DIR
+from utils.log_sink import log_sink
 
 router = APIRouter()
 
-log_directory = "/home/ubuntu/contMigration_logs"
+log_directory = LOG_DIR
 
 @router.get("/structure")
 async def directory_structure():
     directory_structure = get_directory_structure(log_directory)
     return {"data": directory_structure}
 
+@router.get("/sink")
+async def log_sink_stats():
+    """Get queue and write counters of the batched alert/event log writer"""
+    return log_sink.stats()
+
 @router.get("/view/{file_path:path}")
 async def get_file_content(file_path: str):
     try:
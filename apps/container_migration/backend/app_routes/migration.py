@@ -1,52 +1,118 @@
 from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from datetime import datetime
 import subprocess
 import os
 import asyncio
+import json
+import time
 from pathlib import Path
+from typing import Optional
+from pydantic import ValidationError
 from models.migration_info import MigrationInfo
 from models.alert_model import Alert
 from utils.migration_util import load_config
+from utils.migration_queue import MigrationQueue
+from utils.rule_matcher import RuleIndex
+from utils.dedup_store import AlertDedupStore
+from utils.constants import CLUSTER_1, MIGRATION_ENGINE, LOG_DIR, CHECKPOINT_COMPRESSION
+from utils.log_sink import log_sink
+from utils.loop_monitor import event_loop_monitor
+from utils.migration_store import migration_store
+from utils.migration_events import migration_events
+from utils.migration_progress import report_step
+from utils.metrics import migration_metrics
+from utils.perf_store import performance_store
+from utils.migration_analytics import migration_analytics
+from utils.tracing import Incident, incident_tracer, reaction_breakdown
+from utils.migration_engine import migration_engine
+from utils.k8s_client import k8s_client
+from kubernetes.client.rest import ApiException
 import pytz
 
 router = APIRouter()
 
-triggeredMigrations = []
-base_log_path = "/home/ubuntu/contMigration_logs"
+alert_dedup = AlertDedupStore()
+base_log_path = LOG_DIR
+migration_script_path = "/home/ubuntu/meierm78/CubeMig/scripts/migration/single-migration.sh"
 config = load_config()
+rule_index = RuleIndex(config)
 timezone = pytz.timezone('Europe/Berlin')
+migration_queue = MigrationQueue(lambda job: run_migration_job(job.id, job.info, job.log_path))
 
 @router.post("/alert")
-async def handle_alerts(alert: Alert):
+async def handle_alerts(request: Request):
+    received_ns = time.time_ns()
+    try:
+        body = await request.json()
+    except json.JSONDecodeError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid JSON: {str(e)}")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=422, detail="Alert must be a JSON object")
+    if not isinstance(body.get("rule"), (str, type(None))) or not isinstance(body.get("output_fields"), (dict, type(None))):
+        validate_alert(body)
+    # Look the rule up on the raw payload so unmatched alerts cost no model construction or file I/O
+    match_started_ns = time.time_ns()
+    rule_config = rule_index.match(body.get("rule"), body.get("output_fields"))
+    match_finished_ns = time.time_ns()
+    if rule_config is None:
+        migration_metrics.alerts.inc("no_match")
+        return {"message": "No action taken"}
+
+    alert = validate_alert(body)
     info = MigrationInfo(
         hostname=alert.hostname, 
         rule=alert.rule, 
         k8s_pod_name=alert.output_fields.k8s_pod_name, 
         container_name=alert.output_fields.container_name,
         migration_type="automated",
+        source_cluster=rule_config.cluster,
+        target_cluster=rule_config.targetCluster,
+        namespace=alert.output_fields.k8s_ns_name,
         timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     )
     if(info.rule != "PTRACE attached to process"):
-        falco_log_path = f"{base_log_path}/falco"
-        os.makedirs(falco_log_path, exist_ok=True)
-        with open(f"{falco_log_path}/alert.txt", "a") as file:
-            file.write(f"Received alert: {info.rule} for pod: {info.k8s_pod_name} at {datetime.now(timezone)}\n")
+        log_sink.write(f"{base_log_path}/falco/alert.txt", f"Received alert: {info.rule} for pod: {info.k8s_pod_name} at {datetime.now(timezone)}\n")
     
-    for rule_config in config.config:
-        if info.rule == rule_config.rule and info.k8s_pod_name not in triggeredMigrations:
-            if rule_config.action == "migrate":
-                info.forensic_analysis = rule_config.forensic_analysis
-                info.AI_suggestion = rule_config.AI_suggestion
-                triggeredMigrations.append(info.k8s_pod_name)
-                print(f"Triggering migration for pod: {info.k8s_pod_name}")
-                return await trigger_migration(info)
-            elif rule_config.action == "log":
-                print(f"Logging event for pod: {info.k8s_pod_name}")
-                handle_log(info)
-                return {"message": "Event logged"}
+    if rule_config.action == "migrate":
+        if not alert_dedup.claim(dedup_key(info)):
+            migration_metrics.alerts.inc("suppressed")
+            return {"message": "Migration already triggered"}
+        info.forensic_analysis = rule_config.forensic_analysis
+        info.AI_suggestion = rule_config.AI_suggestion
+        info.checkpoint_mode = rule_config.checkpoint_mode
+        info.compression = rule_config.compression
+        info.priority = alert.priority
+        info.weight = rule_config.weight
+        print(f"Triggering migration for pod: {info.k8s_pod_name}")
+        migration_metrics.alerts.inc("migrate")
+        incident = Incident("falco.alert", received_ns, {
+            "falco.rule": alert.rule,
+            "falco.priority": alert.priority,
+            "falco.hostname": alert.hostname,
+            "falco.evt.type": alert.output_fields.evt_type,
+        }, falco_time_ns=alert.output_fields.evt_time)
+        incident.add("rule_match", match_started_ns, match_finished_ns, {"cubemig.rule.action": rule_config.action})
+        return await trigger_migration(info, incident)
+    elif rule_config.action == "log":
+        print(f"Logging event for pod: {info.k8s_pod_name}")
+        handle_log(info)
+        migration_metrics.alerts.inc("log")
+        return {"message": "Event logged"}
+    migration_metrics.alerts.inc("no_action")
     return {"message": "No action taken"}
 
-async def trigger_migration(info: MigrationInfo):
+def validate_alert(body: dict) -> Alert:
+    """Alert model of a request body, invalid alerts are rejected with 422 like a typed parameter"""
+    try:
+        return Alert.model_validate(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False, include_context=False))
+
+def dedup_key(info: MigrationInfo):
+    return (info.source_cluster or CLUSTER_1, info.namespace or "default", info.k8s_pod_name)
+
+async def trigger_migration(info: MigrationInfo, incident: Optional[Incident] = None):
     log_path = f"{base_log_path}/{info.container_name}/{info.timestamp.replace(':', '-')}_{info.k8s_pod_name}"
     os.makedirs(log_path, exist_ok=True)
     with open(f"{log_path}/migration_log.txt", "w") as file:
@@ -61,16 +127,84 @@ async def trigger_migration(info: MigrationInfo):
     print(f"Forensic analysis: {info.forensic_analysis}")
     print(f"AI suggestion: {info.AI_suggestion}")
 
-    # Start the migration process in the background
-    asyncio.create_task(run_migration_script(info, log_path))
+    # Register the migration and hand it to the worker pool
+    migration_id = migration_store.create(info, log_path)
+    if incident is None:
+        incident = Incident(f"migration.{info.migration_type}")
+    incident.root.attributes.update({
+        "k8s.pod.name": info.k8s_pod_name,
+        "k8s.namespace.name": info.namespace or "default",
+        "cubemig.app": info.container_name,
+        "cubemig.source_cluster": info.source_cluster or CLUSTER_1,
+        "cubemig.target_cluster": info.target_cluster,
+        "cubemig.batch_id": info.batch_id,
+    })
+    incident_tracer.bind(migration_id, incident)
+    incident_tracer.start_span(migration_id, "queue")
+    migration_events.publish(migration_id, info.k8s_pod_name, "migration", "queued")
+    job = await migration_queue.submit(info, log_path, job_id=migration_id)
     
-    return {"message": "Migration task has been started", "log_path": log_path}
+    return {"message": "Migration task has been queued", "log_path": log_path, "job_id": job.id, "queue_position": migration_queue.position(job)}
+
+async def run_migration_job(migration_id: int, info: MigrationInfo, log_path: str) -> bool:
+    """Worker entry point, records the final state and releases the pod's alert suppression"""
+    incident_tracer.end_span(migration_id, "queue")
+    migration_events.publish(migration_id, info.k8s_pod_name, "migration", "started")
+    success = False
+    engine = "native" if MIGRATION_ENGINE == "native" and migration_engine.available(info.source_cluster or CLUSTER_1) else "script"
+    try:
+        if engine == "native":
+            success = await migration_engine.run(migration_id, info, log_path)
+        else:
+            success = await run_migration_script(migration_id, info, log_path)
+        return success
+    finally:
+        # Release first, so new alerts for the pod are not suppressed if the bookkeeping below fails
+        if info.migration_type == "automated":
+            alert_dedup.release(dedup_key(info))
+        migration_events.publish(migration_id, info.k8s_pod_name, "migration", "done" if success else "failed")
+        try:
+            migration_metrics.migration_finished(migration_id, log_path, success)
+        except Exception as e:
+            print(f"Could not record metrics of migration {migration_id}: {str(e)}")
+        migration = migration_store.get(migration_id)
+        try:
+            await asyncio.to_thread(migration_analytics.record, migration)
+        except Exception as e:
+            print(f"Could not add migration {migration_id} to the analytics rollups: {str(e)}")
+        try:
+            # The checkpoint mode is reported by the engine or script, a pre-copy request may have run as a full checkpoint
+            performance_store.record(migration, log_path, engine=engine,
+                                     compression=info.compression or CHECKPOINT_COMPRESSION, priority=info.priority,
+                                     forensic_analysis=bool(info.forensic_analysis), ai_suggestion=bool(info.AI_suggestion))
+        except Exception as e:
+            print(f"Could not add migration {migration_id} to the performance store: {str(e)}")
+        try:
+            await incident_tracer.finish(migration_id, log_path, success)
+        except Exception as e:
+            print(f"Could not finish the trace of migration {migration_id}: {str(e)}")
+
+def handle_progress(migration_id: int, pod_name: str, line: str):
+    """Apply a `STEP <step> <start|end> <epoch ms>` or `CHECKPOINT_MODE <mode> <pre-copy rounds>` line printed by the migration script"""
+    parts = line.split()
+    if len(parts) == 3 and parts[0] == "CHECKPOINT_MODE" and parts[2].isdigit():
+        performance_store.annotate(migration_id, checkpoint_mode=parts[1], pre_copy_rounds=int(parts[2]))
+        return
+    if len(parts) != 4 or parts[0] != "STEP":
+        return
+    _, step, phase, timestamp_ms = parts
+    try:
+        timestamp = int(timestamp_ms) / 1000
+    except ValueError:
+        return
+    if phase in ("start", "end"):
+        report_step(migration_id, pod_name, step, phase, timestamp)
 
-async def run_migration_script(info: MigrationInfo, log_path: str):
-    """Run the migration script asynchronously in the background"""
+async def run_migration_script(migration_id: int, info: MigrationInfo, log_path: str) -> bool:
+    """Run the migration script asynchronously in the background, returns True on success"""
     print(info)
     try:
-        cmd = ["/home/ubuntu/meierm78/CubeMig/scripts/migration/single-migration.sh", info.k8s_pod_name, "--log-dir", log_path]
+        cmd = [migration_script_path, info.k8s_pod_name, "--log-dir", log_path]
         if info.source_cluster:
             cmd.extend(["--source-cluster", info.source_cluster])
         if info.target_cluster:
@@ -81,6 +215,8 @@ async def run_migration_script(info: MigrationInfo, log_path: str):
             cmd.append("--forensic-analysis")
         if info.AI_suggestion:
             cmd.append("--ai-suggestion")
+        if info.compression:
+            cmd.extend(["--compression", info.compression])
     
         # Run the subprocess asynchronously
         process = await asyncio.create_subprocess_exec(
@@ -90,40 +226,60 @@ async def run_migration_script(info: MigrationInfo, log_path: str):
             stdin=asyncio.subprocess.DEVNULL
         )
         
-        stdout, stderr = await process.communicate()
+        # Read stdout line by line to pick up step progress while the script runs
+        stderr_task = asyncio.create_task(process.stderr.read())
+        stdout_lines = []
+        async for raw_line in process.stdout:
+            line = raw_line.decode(errors="replace")
+            stdout_lines.append(line)
+            handle_progress(migration_id, info.k8s_pod_name, line)
+        stderr = await stderr_task
+        await process.wait()
+        stdout = "".join(stdout_lines)
         
         # Log the results
         with open(f"{log_path}/migration_result.txt", "w") as file:
             file.write(f"Migration completed at {datetime.now(timezone)}\n")
             file.write(f"Return code: {process.returncode}\n")
             if stdout:
-                file.write(f"STDOUT:\n{stdout.decode()}\n")
+                file.write(f"STDOUT:\n{stdout}\n")
             if stderr:
                 file.write(f"STDERR:\n{stderr.decode()}\n")
         
         if process.returncode == 0:
+            migration_store.set_state(migration_id, "done", returncode=0)
             print(f"Migration of {info.k8s_pod_name} completed successfully")
         else:
+            migration_store.set_state(migration_id, "failed", returncode=process.returncode, error=stderr.decode(errors="replace")[-2000:] or None)
             print(f"Migration of {info.k8s_pod_name} failed with return code {process.returncode}")
+        return process.returncode == 0
             
     except Exception as e:
         # Log any errors that occur during migration
+        migration_store.set_state(migration_id, "failed", error=str(e))
         with open(f"{log_path}/migration_error.txt", "w") as file:
             file.write(f"Migration error at {datetime.now(timezone)}\n")
             file.write(f"Error: {str(e)}\n")
         print(f"Error during migration of {info.k8s_pod_name}: {str(e)}")
+        return False
 
 def handle_log(info: MigrationInfo):
     log_path = f"{base_log_path}/{info.container_name}/{info.timestamp.replace(':', '-')}_{info.k8s_pod_name}"
-    os.makedirs(log_path, exist_ok=True)
-    log_file = os.path.join(log_path, "event_log.txt")
-    if not os.path.exists(log_file):
-        with open(log_file, "w") as file:
-            file.write(f"Log of events generated by Falco on {info.k8s_pod_name}\n")
-            file.write(f"{datetime.now(timezone)}: Event received. Rule: {info.rule}\n")
-    else:
-        with open(log_file, "a") as file:
-            file.write(f"{datetime.now(timezone)}: Event received. Rule: {info.rule}\n")
+    log_sink.write(
+        os.path.join(log_path, "event_log.txt"),
+        f"{datetime.now(timezone)}: Event received. Rule: {info.rule}\n",
+        header=f"Log of events generated by Falco on {info.k8s_pod_name}\n"
+    )
+
+def checkpoint_mode(body: dict) -> str:
+    """Checkpoint mode of a /migrate request; the kubelet checkpoint API only takes full checkpoints"""
+    mode = body.get("checkpointMode") or "full"
+    if mode == "pre-copy":
+        raise HTTPException(status_code=400, detail="Pre-copy is not supported for Kubernetes migrations, the kubelet checkpoint API "
+                                                    "has no pre-dump; use /tee-operation for podman containers")
+    if mode != "full":
+        raise HTTPException(status_code=400, detail=f"Invalid checkpointMode '{mode}', use 'full'")
+    return mode
 
 @router.post("/migrate")
 async def migrate_pod(request: Request):
@@ -145,48 +301,166 @@ async def migrate_pod(request: Request):
         namespace=namespace,
         forensic_analysis=generate_forensic_report,
         AI_suggestion=generate_AI_suggestion,
+        checkpoint_mode=checkpoint_mode(body),
+        compression=body.get("compression"),
+        priority=body.get("priority"),
         timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     )
     return await trigger_migration(info)
 
+@router.post("/migrate/batch")
+async def migrate_batch(request: Request):
+    """Migrate several pods, given by name in `pods` or by `labelSelector`, as one batch"""
+    body = await request.json()
+    source_cluster = body.get("sourceCluster") or CLUSTER_1
+    namespace = body.get("namespace") or "default"
+    pod_names = body.get("pods") or []
+    selector = body.get("labelSelector")
+    if bool(pod_names) == bool(selector):
+        raise HTTPException(status_code=400, detail="Give either 'pods' or 'labelSelector'")
+    mode = checkpoint_mode(body)
+    try:
+        pods = await asyncio.to_thread(resolve_batch_pods, source_cluster, namespace, pod_names, selector)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if not pods:
+        raise HTTPException(status_code=404, detail=f"No running pods match '{selector}' in {namespace}")
+
+    batch_id = migration_store.create_batch(source_cluster, body.get("targetCluster"), namespace, selector)
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    infos = [
+        MigrationInfo(
+            k8s_pod_name=pod_name,
+            container_name=body.get("appName") or container_name,
+            migration_type="manual",
+            source_cluster=source_cluster,
+            target_cluster=body.get("targetCluster"),
+            namespace=namespace,
+            forensic_analysis=body.get("forensicAnalysis"),
+            AI_suggestion=body.get("AISuggestion"),
+            checkpoint_mode=mode,
+            compression=body.get("compression"),
+            priority=body.get("priority"),
+            timestamp=timestamp,
+            batch_id=batch_id,
+        )
+        for pod_name, container_name in pods
+    ]
+    # The queue runs them concurrently within its worker, per-cluster and per-node limits
+    results = await asyncio.gather(*(trigger_migration(info) for info in infos))
+    return {
+        "message": f"Batch of {len(infos)} migrations has been queued",
+        "batch_id": batch_id,
+        "migrations": [{"pod": info.k8s_pod_name, **result} for info, result in zip(infos, results)],
+    }
+
+def resolve_batch_pods(cluster: str, namespace: str, pod_names: list, selector: Optional[str]) -> list:
+    """(pod name, container name) of the pods of a batch; raises LookupError for pods that do not exist"""
+    core = k8s_client.get_client(cluster)
+    if selector:
+        pods = core.list_namespaced_pod(namespace=namespace, label_selector=selector).items
+        pods = [pod for pod in pods if pod.status.phase == "Running"]
+    else:
+        pods, missing = [], []
+        for pod_name in dict.fromkeys(pod_names):
+            try:
+                pods.append(core.read_namespaced_pod(name=pod_name, namespace=namespace))
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+                missing.append(pod_name)
+        if missing:
+            raise LookupError(f"Pods not found in {namespace}: {', '.join(missing)}")
+    return [(pod.metadata.name, pod.spec.containers[0].name) for pod in pods]
+
+@router.get("/migrate/batch/{batch_id}")
+async def get_batch(batch_id: int):
+    """Get a batch with the state and step timestamps of each of its migrations"""
+    batch = migration_store.batch(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail=f"Batch '{batch_id}' not found")
+    return batch
+
+@router.get("/migration-queue")
+async def get_migration_queue():
+    """Get queue depth, running jobs and wait times of the migration worker pool"""
+    return migration_queue.stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: per-step migration, CRIU and AI histograms, alert outcomes and queue depth"""
+    return PlainTextResponse(migration_metrics.render(migration_queue.stats()), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@router.get("/event-loop")
+async def get_event_loop(reset: bool = False):
+    """Get the event loop lag since start or the last reset; `reset=true` starts a new measurement after reading"""
+    stats = event_loop_monitor.stats()
+    if reset:
+        event_loop_monitor.reset()
+    return stats
+
+@router.get("/alert-dedup")
+async def get_alert_dedup():
+    """Get the pods whose alerts are currently suppressed and how many duplicates were coalesced"""
+    return alert_dedup.stats()
+
 @router.get("/migration-status/{pod_name}")
 async def get_migration_status(pod_name: str):
-    """Get the status of a migration by checking the log files"""
+    """Get the status and step timestamps of the latest migration of a pod"""
     try:
-        # Find the most recent migration log for this pod
-        pod_logs = []
-        for container_dir in os.listdir(base_log_path):
-            container_path = os.path.join(base_log_path, container_dir)
-            if os.path.isdir(container_path):
-                for log_dir in os.listdir(container_path):
-                    if pod_name in log_dir:
-                        log_path = os.path.join(container_path, log_dir)
-                        pod_logs.append((log_path, os.path.getctime(log_path)))
-        
-        if not pod_logs:
+        migration = migration_store.latest_for_pod(pod_name)
+        if migration is None:
             return {"status": "not_found", "message": f"No migration logs found for pod {pod_name}"}
-        
-        # Get the most recent log directory
-        latest_log_path = max(pod_logs, key=lambda x: x[1])[0]
-        
-        # Check for completion indicators
-        result_file = os.path.join(latest_log_path, "migration_result.txt")
-        error_file = os.path.join(latest_log_path, "migration_error.txt")
-        
-        if os.path.exists(result_file):
-            with open(result_file, 'r') as f:
-                content = f.read()
-            return {"status": "completed", "log_path": latest_log_path, "result": content}
-        elif os.path.exists(error_file):
-            with open(error_file, 'r') as f:
-                content = f.read()
-            return {"status": "error", "log_path": latest_log_path, "error": content}
+
+        if migration["state"] == "done":
+            return {"status": "completed", "log_path": migration["log_path"], "migration": migration}
+        elif migration["state"] == "failed":
+            return {"status": "error", "log_path": migration["log_path"], "error": migration["error"], "migration": migration}
         else:
-            return {"status": "running", "log_path": latest_log_path, "message": "Migration is still in progress"}
-            
+            return {"status": "running", "log_path": migration["log_path"], "message": "Migration is still in progress", "migration": migration}
+
     except Exception as e:
         return {"status": "error", "message": f"Error checking migration status: {str(e)}"}
 
+@router.get("/migration-events")
+async def stream_migration_events(migration_id: Optional[int] = None, pod: Optional[str] = None):
+    """Server-sent events with the start and end of every migration step, optionally for one migration or pod"""
+    return StreamingResponse(
+        migration_events.stream(migration_id=migration_id, pod=pod),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/migrations")
+async def list_migrations(pod: Optional[str] = None, app: Optional[str] = None, cluster: Optional[str] = None,
+                          state: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+                          limit: int = 50):
+    """List migrations, newest first, filtered by pod, app, source cluster, state or creation time (epoch seconds)"""
+    return {"migrations": migration_store.list(pod=pod, app=app, cluster=cluster, state=state, since=since, until=until, limit=limit)}
+
+@router.get("/migrations/{migration_id}")
+async def get_migration(migration_id: int):
+    """Get a migration and its step timestamps"""
+    migration = migration_store.get(migration_id)
+    if migration is None:
+        raise HTTPException(status_code=404, detail=f"Migration '{migration_id}' not found")
+    return migration
+
+@router.get("/migrations/{migration_id}/trace")
+async def get_migration_trace(migration_id: int, spans: bool = False):
+    """Reaction time of a finished migration from the Falco event to the restored pod, broken down by phase"""
+    migration = migration_store.get(migration_id)
+    if migration is None:
+        raise HTTPException(status_code=404, detail=f"Migration '{migration_id}' not found")
+    trace = await asyncio.to_thread(incident_tracer.spans, migration_id, migration["log_path"])
+    if trace is None:
+        raise HTTPException(status_code=404, detail=f"No trace of migration '{migration_id}', it is still running or was not traced")
+    breakdown = reaction_breakdown(trace)
+    if spans:
+        breakdown["spans"] = trace
+    return breakdown
+
 def reload_config():
-    global config
-    config = load_config()
\ No newline at end of file
+    global config, rule_index
+    config = load_config()
+    rule_index = RuleIndex(config)
\ No newline at end of file
@@ -1,8 +1,11 @@
 from fastapi import APIRouter
 import sys 
+from pathlib import Path
 from models.simulation_info import SimulationInfo
 
 sys.path.append('/home/ubuntu/meierm78/ContMigration-VT1/apps/kubernetes/vuln-spring/')
+# The same module in this checkout, for runs outside the lab (CUBEMIG_CLUSTER_BACKEND=simulated)
+sys.path.append(str(Path(__file__).parents[3] / "kubernetes" / "vuln-spring"))
 
 from vuln_spring_exploit import reverse_shell, data_destruction, log_removal # type: ignore
 
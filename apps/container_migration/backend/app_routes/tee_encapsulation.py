@@ -6,13 +6,14 @@ import json
 import datetime
 from models.tee_operation_info import TeeOperationInfo
 from models.podman_container import PodmanContainer, PodmanContainersResponse
+from utils.constants import LOG_DIR
 
 router = APIRouter()
 
 # Define source and destination VMs
 NORMAL_VM = "sous@bert.cloudlab.zhaw.ch"
 SEV_SNP_VM = "ubuntu@192.168.122.77"
-BASE_LOG_PATH = "/home/ubuntu/contMigration_logs"
+BASE_LOG_PATH = LOG_DIR
 
 def log_operation(container_name, operation, success, src_vm, dest_vm, log_path, output=None, error=None):
     """Log TEE operation details to a file for tracking"""
@@ -157,6 +158,10 @@ def perform_tee_operation(teeInfo: TeeOperationInfo):
         # Add SSH key path as an environment variable for the script
         env = os.environ.copy()
         env["SSH_KEY_PATH"] = os.path.expanduser("~/.ssh/id_rsa")
+        if teeInfo.checkpointMode == "pre-copy":
+            env["PRE_COPY_ROUNDS"] = str(teeInfo.preCopyRounds or 1)
+        if teeInfo.compression:
+            env["CHECKPOINT_COMPRESSION"] = teeInfo.compression
         
         result = subprocess.run(
             [script_path, teeInfo.containerName, src_vm, dest_vm, log_path],
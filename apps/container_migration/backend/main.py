@@ -1,9 +1,40 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app_routes import logs, k8s, migration, config, simulation, tee_encapsulation
+from app_routes import logs, k8s, migration, config, simulation, tee_encapsulation, checkpoints, analytics
+from utils.ai_suggestion import ai_suggestion_service
+from utils.checkpoint_retention import checkpoint_retention
+from utils.log_sink import log_sink
+from utils.loop_monitor import event_loop_monitor
+from utils.migration_analytics import migration_analytics
+from utils.migration_store import migration_store
+from utils.perf_store import performance_store
+from utils.tracing import incident_tracer
 import logging
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migration_store.fail_interrupted()
+    # Migrations that finished while the rollups were not updated, including the ones just failed
+    await asyncio.to_thread(migration_analytics.catch_up)
+    await event_loop_monitor.start()
+    await log_sink.start()
+    await incident_tracer.start()
+    await performance_store.start()
+    await migration.migration_queue.start()
+    await checkpoint_retention.start()
+    yield
+    await checkpoint_retention.stop()
+    await migration.migration_queue.stop()
+    await migration.migration_engine.close()
+    await ai_suggestion_service.close()
+    await incident_tracer.stop()
+    await performance_store.stop()
+    await log_sink.stop()
+    await event_loop_monitor.stop()
+
+app = FastAPI(lifespan=lifespan)
 
 origins = [
     "http://160.85.255.146:4200"
@@ -23,6 +54,8 @@ app.include_router(k8s.router, prefix="/k8s", tags=["Kubernetes"])
 app.include_router(config.router, prefix="/config", tags=["Configuration"])
 app.include_router(simulation.router, prefix="/simulate", tags=["Attack Simulation"])
 app.include_router(tee_encapsulation.router, prefix="/tee-operation", tags=["TEE Encapsulation"])
+app.include_router(checkpoints.router, prefix="/checkpoints", tags=["Checkpoints"])
+app.include_router(analytics.router, prefix="/analytics", tags=["Analytics"])
 
 class IgnoreAlertEndpoint(logging.Filter):
     def filter(self, record):
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+import re
+from pydantic import BaseModel, Field, model_validator
+from typing import List, Literal, Optional
 
 class RuleConfig(BaseModel):
     rule: str
@@ -8,6 +9,37 @@ class RuleConfig(BaseModel):
     targetCluster: Optional[str] = None
     forensic_analysis: Optional[bool] = False
     AI_suggestion: Optional[bool] = False
+    # How `rule` is compared with the Falco rule name
+    match: Optional[Literal["exact", "prefix", "regex"]] = "exact"
+    # Optional regex predicates on the alert's output fields
+    namespace: Optional[str] = None
+    image: Optional[str] = None
+    proc_name: Optional[str] = None
+    # Rules drive Kubernetes migrations, and the kubelet checkpoint API has no pre-dump, so only "full" is accepted.
+    # Pre-copy is available for podman containers through /tee-operation.
+    checkpoint_mode: Optional[Literal["full", "pre-copy"]] = "full"
+    # podman keeps a single pre-checkpoint per container
+    pre_copy_rounds: Optional[int] = Field(default=1, ge=1, le=1)
+    # Checkpoint compression for this app, e.g. "zstd:3"; unset uses CUBEMIG_CHECKPOINT_COMPRESSION
+    compression: Optional[str] = Field(default=None, pattern=r"^(none|gzip|zstd|lz4)(:[0-9]+)?$")
+    # Added to the alert's Falco priority in the migration queue, in priority levels
+    weight: Optional[float] = Field(default=0, ge=-7, le=7)
+
+    @model_validator(mode="after")
+    def check_patterns(self):
+        if self.checkpoint_mode == "pre-copy":
+            raise ValueError("checkpoint_mode 'pre-copy' is not supported for Kubernetes migrations, "
+                             "the kubelet checkpoint API has no pre-dump; use /tee-operation for podman containers")
+        patterns = [self.namespace, self.image, self.proc_name]
+        if self.match == "regex":
+            patterns.append(self.rule)
+        for pattern in patterns:
+            if pattern:
+                try:
+                    re.compile(pattern)
+                except re.error as e:
+                    raise ValueError(f"Invalid regular expression '{pattern}': {e}")
+        return self
 
 class Config(BaseModel):
     config: List[RuleConfig]
\ No newline at end of file
@@ -12,4 +12,14 @@ class MigrationInfo(BaseModel):
      namespace: Optional[str]
      forensic_analysis: Optional[bool] = None
      AI_suggestion: Optional[bool] = None
-     timestamp: Optional[str] = None
\ No newline at end of file
+     timestamp: Optional[str] = None
+     # "full" or "pre-copy"
+     checkpoint_mode: Optional[str] = None
+     pre_copy_rounds: Optional[int] = None
+     # Checkpoint compression spec, e.g. "zstd:3"
+     compression: Optional[str] = None
+     # Set when the migration is part of a POST /migrate/batch request
+     batch_id: Optional[int] = None
+     # Falco priority ("Emergency" to "Debug") and the rule's weight, used to order the migration queue
+     priority: Optional[str] = None
+     weight: Optional[float] = None
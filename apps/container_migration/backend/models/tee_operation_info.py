@@ -1,6 +1,10 @@
-from typing import Optional
-from pydantic import BaseModel
+from typing import Literal, Optional
+from pydantic import BaseModel, Field
 
 class TeeOperationInfo(BaseModel):
      containerName: Optional[str] = None
      operation: Optional[str] = None  # 'encapsulate' or 'decapsulate'
+     checkpointMode: Optional[Literal["full", "pre-copy"]] = None
+     # podman keeps a single pre-checkpoint per container
+     preCopyRounds: Optional[int] = Field(default=None, ge=1, le=1)
+     compression: Optional[str] = None  # e.g. 'gzip', 'zstd:19' or 'lz4'
@@ -0,0 +1,392 @@
+"""Local stand-ins for the clusters, kubelets and registry a migration talks to.
+
+One server answers the three APIs the native migration engine uses, so the
+whole pipeline and its step timings can be exercised on one machine:
+
+- kube API (pods, services, custom objects) of every cluster below /clusters/<cluster>;
+  created pods turn Running after --pod-ready-ms
+- kubelet checkpoint API below /nodes/<node>; writes a synthetic CRI-O checkpoint
+  archive of --checkpoint-mb to <nfs root>/<node>, which the forensic analyzer can read
+- OCI distribution API below /v2 for blob uploads and manifests; blobs are
+  hashed and counted, but not kept
+
+    python -m stubs.cluster_simulator --pods 8 --checkpoint-mb 64 --pod-ready-ms 1500
+    CUBEMIG_CLUSTER_BACKEND=simulated CUBEMIG_LOG_DIR=/tmp/cubemig/logs python main.py
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import os
+import random
+import struct
+import tarfile
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+from utils.constants import CLUSTER_1, CHECKPOINT_NFS_ROOT, KUBELET_CHECKPOINT_DIR
+
+settings = {
+    "api_latency": 0.002,
+    "pod_ready": 1.0,
+    "pod_ready_jitter": 0.0,
+    "checkpoint_delay": 0.2,
+    "checkpoint_mb": 16.0,
+    "nfs_root": CHECKPOINT_NFS_ROOT,
+    "nodes": ["worker1", "worker2"],
+}
+state = {"checkpoints": 0, "checkpoint_bytes": 0, "blobs": 0, "blob_bytes": 0, "manifests": 0, "created": 0, "deleted": 0}
+
+# (cluster, api prefix, namespace, plural) -> name -> object; pods carry their ready time in "_ready_at"
+objects: Dict[Tuple[str, str, str, str], Dict[str, dict]] = {}
+uploads: Dict[str, dict] = {}
+blobs: Dict[str, int] = {}
+manifests: Dict[Tuple[str, str], Tuple[bytes, str]] = {}
+
+app = FastAPI()
+
+def now_rfc3339() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def status(code: int, reason: str, message: str) -> JSONResponse:
+    return JSONResponse({"apiVersion": "v1", "kind": "Status", "status": "Failure", "message": message, "reason": reason, "code": code},
+                        status_code=code)
+
+def pod_object(namespace: str, name: str, app_name: str, container: str, node: str, image: str) -> dict:
+    return {
+        "apiVersion": "v1",
+        "kind": "Pod",
+        "metadata": {"name": name, "namespace": namespace, "labels": {"app": app_name}},
+        "spec": {"nodeName": node, "containers": [{"name": container, "image": image}]},
+    }
+
+def store(cluster: str, prefix: str, namespace: str, plural: str, document: dict) -> dict:
+    document = json.loads(json.dumps(document))
+    metadata = document.setdefault("metadata", {})
+    metadata.update(namespace=namespace, uid=str(uuid.uuid4()), resourceVersion="1", creationTimestamp=now_rfc3339())
+    if plural == "pods":
+        spec = document.setdefault("spec", {})
+        spec.setdefault("nodeName", random.choice(settings["nodes"]))
+        document["status"] = {"phase": "Pending"}
+        document["_ready_at"] = time.monotonic() + settings["pod_ready"] + random.uniform(0, settings["pod_ready_jitter"])
+    objects.setdefault((cluster, prefix, namespace, plural), {})[metadata["name"]] = document
+    state["created"] += 1
+    return document
+
+def public(document: dict) -> dict:
+    """The object as the API returns it, pods past their ready time are Running"""
+    ready_at = document.get("_ready_at")
+    if ready_at is not None and document["status"]["phase"] == "Pending" and time.monotonic() >= ready_at:
+        document["status"] = {"phase": "Running", "startTime": now_rfc3339(),
+                              "containerStatuses": [{"name": container["name"], "ready": True, "restartCount": 0, "image": container.get("image", ""),
+                                                     "imageID": "", "state": {"running": {"startedAt": now_rfc3339()}}}
+                                                    for container in document["spec"].get("containers", [])]}
+    return {key: value for key, value in document.items() if not key.startswith("_")}
+
+def matches(document: dict, selector: Optional[str]) -> bool:
+    """Equality-based label selectors, the only kind the backend uses"""
+    if not selector:
+        return True
+    labels = document["metadata"].get("labels") or {}
+    for requirement in selector.split(","):
+        key, _, value = requirement.partition("=")
+        if labels.get(key.strip()) != value.lstrip("=").strip():
+            return False
+    return True
+
+def apply_json_patch(document: dict, operations: list):
+    for operation in operations:
+        *parents, last = [part.replace("~1", "/").replace("~0", "~") for part in operation["path"].lstrip("/").split("/")]
+        target = document
+        for part in parents:
+            target = target[int(part)] if isinstance(target, list) else target.setdefault(part, {})
+        if operation["op"] == "remove":
+            del target[int(last) if isinstance(target, list) else last]
+        elif isinstance(target, list):
+            target[int(last)] = operation["value"]
+        else:
+            target[last] = operation["value"]
+
+# --- kube API ---
+
+async def collection(request: Request, cluster: str, prefix: str, namespace: str, plural: str):
+    await asyncio.sleep(settings["api_latency"])
+    items = objects.get((cluster, prefix, namespace, plural), {})
+    if request.method == "POST":
+        document = await request.json()
+        name = document.get("metadata", {}).get("name")
+        if not name:
+            return status(422, "Invalid", "metadata.name is required")
+        if name in items:
+            return status(409, "AlreadyExists", f"{plural} \"{name}\" already exists")
+        return JSONResponse(public(store(cluster, prefix, namespace, plural, document)), status_code=201)
+    selector = request.query_params.get("labelSelector")
+    kind = plural[:-1].capitalize() + "List" if plural.endswith("s") else "List"
+    return {"apiVersion": "v1", "kind": kind, "metadata": {"resourceVersion": "1"},
+            "items": [public(document) for document in items.values() if matches(document, selector)]}
+
+async def item(request: Request, cluster: str, prefix: str, namespace: str, plural: str, name: str):
+    await asyncio.sleep(settings["api_latency"])
+    items = objects.get((cluster, prefix, namespace, plural), {})
+    if name not in items:
+        return status(404, "NotFound", f"{plural} \"{name}\" not found")
+    if request.method == "DELETE":
+        state["deleted"] += 1
+        return public(items.pop(name))
+    if request.method == "PATCH":
+        body = await request.json()
+        if isinstance(body, list):
+            apply_json_patch(items[name], body)
+        else:
+            items[name].update({key: value for key, value in body.items() if key != "metadata"})
+    return public(items[name])
+
+@app.api_route("/clusters/{cluster}/api/v1/namespaces/{namespace}/{plural}", methods=["GET", "POST"])
+async def core_collection(request: Request, cluster: str, namespace: str, plural: str):
+    return await collection(request, cluster, "api/v1", namespace, plural)
+
+@app.api_route("/clusters/{cluster}/api/v1/namespaces/{namespace}/{plural}/{name}", methods=["GET", "DELETE", "PATCH"])
+async def core_item(request: Request, cluster: str, namespace: str, plural: str, name: str):
+    return await item(request, cluster, "api/v1", namespace, plural, name)
+
+@app.api_route("/clusters/{cluster}/apis/{group}/{version}/namespaces/{namespace}/{plural}", methods=["GET", "POST"])
+async def group_collection(request: Request, cluster: str, group: str, version: str, namespace: str, plural: str):
+    return await collection(request, cluster, f"apis/{group}/{version}", namespace, plural)
+
+@app.api_route("/clusters/{cluster}/apis/{group}/{version}/namespaces/{namespace}/{plural}/{name}", methods=["GET", "DELETE", "PATCH"])
+async def group_item(request: Request, cluster: str, group: str, version: str, namespace: str, plural: str, name: str):
+    return await item(request, cluster, f"apis/{group}/{version}", namespace, plural, name)
+
+# --- kubelet checkpoint API ---
+
+def protobuf_varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        out.append(byte | (0x80 if value else 0))
+        if not value:
+            return bytes(out)
+
+def protobuf_field(number: int, value) -> bytes:
+    if isinstance(value, bytes):
+        return protobuf_varint(number << 3 | 2) + protobuf_varint(len(value)) + value
+    return protobuf_varint(number << 3) + protobuf_varint(value)
+
+def criu_image(*entries: bytes, magic: int = 0, service: bool = False) -> bytes:
+    """CRIU image: common or service magic, the image's own magic, then size-prefixed protobuf entries"""
+    header = struct.pack("<II", 0x55105940 if service else 0x54564319, magic)
+    return header + b"".join(struct.pack("<I", len(entry)) + entry for entry in entries)
+
+class SyntheticPages(io.RawIOBase):
+    """pages-1.img of the given size without holding it in memory; every other MiB is zeros, the rest random"""
+
+    def __init__(self, size: int, argv: bytes):
+        self.size = size
+        self.offset = 0
+        self.block = bytearray(random.randbytes(1024 * 1024))
+        self.block[:len(argv)] = argv
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        length = min(len(buffer), self.size - self.offset)
+        written = 0
+        while written < length:
+            block_offset = (self.offset + written) % len(self.block)
+            chunk = min(length - written, len(self.block) - block_offset)
+            if (self.offset + written) // len(self.block) % 2:
+                buffer[written:written + chunk] = bytes(chunk)
+            else:
+                buffer[written:written + chunk] = self.block[block_offset:block_offset + chunk]
+            written += chunk
+        self.offset += length
+        return length
+
+def write_checkpoint(path: str, pod: dict, container: str, size: int):
+    """A CRI-O checkpoint archive with one process whose memory makes up most of the size"""
+    argv = b"java\0-jar\0/app/app.jar\0"
+    pages = max(size // 4096, 1)
+    base = 0x7f0000000000
+    images = {
+        "checkpoint/inventory.img": criu_image(protobuf_field(1, 2)),
+        "checkpoint/pstree.img": criu_image(protobuf_field(1, 1) + protobuf_field(2, 0) + protobuf_field(3, 1) + protobuf_field(4, 1) + protobuf_field(5, 1)),
+        "checkpoint/core-1.img": criu_image(protobuf_field(1, 1) + protobuf_field(3, protobuf_field(1, 1) + protobuf_field(6, b"java"))
+                                            + protobuf_field(4, protobuf_field(1, 1) + protobuf_field(2, 1))),
+        "checkpoint/mm-1.img": criu_image(protobuf_field(8, base) + protobuf_field(9, base + len(argv))),
+        "checkpoint/pagemap-1.img": criu_image(protobuf_field(1, 1), protobuf_field(1, base) + protobuf_field(2, pages) + protobuf_field(4, 4)),
+        "checkpoint/files.img": criu_image(
+            protobuf_field(1, 1) + protobuf_field(2, 10) + protobuf_field(3, protobuf_field(1, 10) + protobuf_field(6, b"/app/app.jar")),
+            protobuf_field(1, 4) + protobuf_field(2, 11) + protobuf_field(4, protobuf_field(1, 11) + protobuf_field(3, 2) + protobuf_field(5, 6)
+                                                                           + protobuf_field(6, 10) + protobuf_field(7, 8080))),
+        "checkpoint/fdinfo-1.img": criu_image(protobuf_field(1, 10) + protobuf_field(4, 3), protobuf_field(1, 11) + protobuf_field(4, 4)),
+        "stats-dump": criu_image(protobuf_field(1, protobuf_field(1, 500) + protobuf_field(2, 20000) + protobuf_field(3, 3000)
+                                                + protobuf_field(4, 4000) + protobuf_field(5, pages) + protobuf_field(7, pages)),
+                                 magic=0x57093306, service=True),
+        "config.dump": json.dumps({"id": uuid.uuid4().hex, "name": f"k8s_{container}_{pod['metadata']['name']}",
+                                   "rootfsImageName": pod["spec"]["containers"][0].get("image", ""), "runtimeName": "runc",
+                                   "createdTime": now_rfc3339()}).encode(),
+        "spec.dump": json.dumps({"annotations": {"io.kubernetes.container.name": container, "io.container.manager": "cri-o",
+                                                 "io.kubernetes.pod.name": pod["metadata"]["name"],
+                                                 "io.kubernetes.pod.namespace": pod["metadata"]["namespace"]}}).encode(),
+    }
+    rootfs_diff = io.BytesIO()
+    with tarfile.open(fileobj=rootfs_diff, mode="w") as tar:
+        for name, data in (("etc/mtab", b""), ("tmp/hsperfdata_root/1", b"\0" * 32)):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    images["rootfs-diff.tar"] = rootfs_diff.getvalue()
+
+    partial = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.partial")
+    with tarfile.open(partial, "w") as tar:
+        for name, data in images.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo("checkpoint/pages-1.img")
+        info.size = pages * 4096
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BufferedReader(SyntheticPages(info.size, argv), buffer_size=1024 * 1024))
+    # The kubelet answers once the archive is complete, never expose a partial one
+    os.replace(partial, path)
+
+def find_pod(node: str, namespace: str, name: str) -> Optional[dict]:
+    for (_, prefix, pod_namespace, plural), items in objects.items():
+        if prefix == "api/v1" and plural == "pods" and pod_namespace == namespace and name in items:
+            if items[name]["spec"].get("nodeName") == node:
+                return items[name]
+    return None
+
+@app.post("/nodes/{node}/checkpoint/{namespace}/{pod_name}/{container}")
+async def checkpoint(node: str, namespace: str, pod_name: str, container: str):
+    pod = find_pod(node, namespace, pod_name)
+    if pod is None or container not in (entry["name"] for entry in pod["spec"].get("containers", [])):
+        return Response(f"pod {namespace}/{pod_name} with container {container} not found on {node}", status_code=404)
+    await asyncio.sleep(settings["checkpoint_delay"])
+    directory = os.path.join(settings["nfs_root"], node)
+    os.makedirs(directory, exist_ok=True)
+    name = f"checkpoint-{pod_name}_{namespace}-{container}-{now_rfc3339()}.tar"
+    await asyncio.to_thread(write_checkpoint, os.path.join(directory, name), pod, container, int(settings["checkpoint_mb"] * 1024 * 1024))
+    state["checkpoints"] += 1
+    state["checkpoint_bytes"] += os.path.getsize(os.path.join(directory, name))
+    return {"items": [os.path.join(KUBELET_CHECKPOINT_DIR, name)]}
+
+# --- OCI distribution API ---
+
+@app.api_route("/v2/{repository:path}/blobs/uploads/", methods=["POST"])
+async def start_upload(repository: str):
+    upload_id = uuid.uuid4().hex
+    uploads[upload_id] = {"sha256": hashlib.sha256(), "size": 0}
+    return Response(status_code=202, headers={"Location": f"/v2/{repository}/blobs/uploads/{upload_id}", "Docker-Upload-UUID": upload_id,
+                                              "Range": "0-0"})
+
+async def receive(request: Request, upload: dict):
+    async for chunk in request.stream():
+        upload["sha256"].update(chunk)
+        upload["size"] += len(chunk)
+
+@app.patch("/v2/{repository:path}/blobs/uploads/{upload_id}")
+async def patch_upload(request: Request, repository: str, upload_id: str):
+    if upload_id not in uploads:
+        return JSONResponse({"errors": [{"code": "BLOB_UPLOAD_UNKNOWN"}]}, status_code=404)
+    await receive(request, uploads[upload_id])
+    return Response(status_code=202, headers={"Location": f"/v2/{repository}/blobs/uploads/{upload_id}",
+                                              "Range": f"0-{max(uploads[upload_id]['size'] - 1, 0)}"})
+
+@app.put("/v2/{repository:path}/blobs/uploads/{upload_id}")
+async def finish_upload(request: Request, repository: str, upload_id: str, digest: str):
+    upload = uploads.pop(upload_id, None)
+    if upload is None:
+        return JSONResponse({"errors": [{"code": "BLOB_UPLOAD_UNKNOWN"}]}, status_code=404)
+    await receive(request, upload)
+    if digest != f"sha256:{upload['sha256'].hexdigest()}":
+        return JSONResponse({"errors": [{"code": "DIGEST_INVALID", "message": f"content does not match {digest}"}]}, status_code=400)
+    blobs[digest] = upload["size"]
+    state["blobs"] += 1
+    state["blob_bytes"] += upload["size"]
+    return Response(status_code=201, headers={"Location": f"/v2/{repository}/blobs/{digest}", "Docker-Content-Digest": digest})
+
+@app.head("/v2/{repository:path}/blobs/{digest}")
+async def blob_exists(repository: str, digest: str):
+    if digest not in blobs:
+        return Response(status_code=404)
+    return Response(status_code=200, headers={"Content-Length": str(blobs[digest]), "Docker-Content-Digest": digest})
+
+@app.put("/v2/{repository:path}/manifests/{reference}")
+async def put_manifest(request: Request, repository: str, reference: str):
+    manifest = await request.body()
+    digest = f"sha256:{hashlib.sha256(manifest).hexdigest()}"
+    media_type = request.headers.get("content-type", "application/vnd.oci.image.manifest.v1+json")
+    manifests[(repository, reference)] = manifests[(repository, digest)] = (manifest, media_type)
+    state["manifests"] += 1
+    return Response(status_code=201, headers={"Location": f"/v2/{repository}/manifests/{digest}", "Docker-Content-Digest": digest})
+
+@app.api_route("/v2/{repository:path}/manifests/{reference}", methods=["GET", "HEAD"])
+async def get_manifest(repository: str, reference: str):
+    if (repository, reference) not in manifests:
+        return JSONResponse({"errors": [{"code": "MANIFEST_UNKNOWN"}]}, status_code=404)
+    manifest, media_type = manifests[(repository, reference)]
+    return Response(manifest, media_type=media_type, headers={"Docker-Content-Digest": f"sha256:{hashlib.sha256(manifest).hexdigest()}"})
+
+# --- simulator control ---
+
+@app.post("/simulator/pods")
+async def add_pod(request: Request):
+    """Create a running source pod: {"name", "cluster", "namespace", "app", "container", "node", "image"}; only name is required"""
+    body = await request.json()
+    container = body.get("container", "vuln-spring")
+    document = pod_object(body.get("namespace", "default"), body["name"], body.get("app", container), container,
+                          body.get("node") or random.choice(settings["nodes"]), body.get("image", f"localhost/{container}:latest"))
+    pods = objects.get((body.get("cluster", CLUSTER_1), "api/v1", document["metadata"]["namespace"], "pods"), {})
+    if body["name"] in pods:
+        return status(409, "AlreadyExists", f"pods \"{body['name']}\" already exists")
+    document = store(body.get("cluster", CLUSTER_1), "api/v1", document["metadata"]["namespace"], "pods", document)
+    document["_ready_at"] = 0
+    return JSONResponse(public(document), status_code=201)
+
+@app.get("/simulator/stats")
+async def get_stats():
+    pods: Dict[str, Dict[str, int]] = {}
+    for (cluster, prefix, _, plural), items in objects.items():
+        if prefix == "api/v1" and plural == "pods":
+            for document in items.values():
+                phase = public(document)["status"]["phase"]
+                pods.setdefault(cluster, {}).setdefault(phase, 0)
+                pods[cluster][phase] += 1
+    return {**state, "pods": pods, "pending_uploads": len(uploads)}
+
+def seed(count: int, cluster: str, namespace: str, container: str):
+    for index in range(count):
+        document = pod_object(namespace, f"{container}-{index}", container, container, settings["nodes"][index % len(settings["nodes"])],
+                              f"localhost/{container}:latest")
+        store(cluster, "api/v1", namespace, "pods", document)["_ready_at"] = 0
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="Simulated clusters, kubelets and registry for the migration backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--nodes", default="worker1,worker2", help="Comma-separated node names pods are spread over")
+    parser.add_argument("--pods", type=int, default=4, help="Running source pods <container>-<i> to start with")
+    parser.add_argument("--cluster", default=CLUSTER_1, help="Cluster of the initial pods")
+    parser.add_argument("--namespace", default="default", help="Namespace of the initial pods")
+    parser.add_argument("--container", default="vuln-spring", help="Container of the initial pods, needs a restore_<container>.yaml")
+    parser.add_argument("--checkpoint-mb", type=float, default=settings["checkpoint_mb"], help="Size of each synthetic checkpoint archive")
+    parser.add_argument("--checkpoint-ms", type=float, default=settings["checkpoint_delay"] * 1000, help="Dump time before the archive is written")
+    parser.add_argument("--pod-ready-ms", type=float, default=settings["pod_ready"] * 1000, help="Time from pod creation to Running")
+    parser.add_argument("--pod-ready-jitter-ms", type=float, default=0, help="Uniform random extra time to Running")
+    parser.add_argument("--api-latency-ms", type=float, default=settings["api_latency"] * 1000, help="Latency of every kube API call")
+    parser.add_argument("--nfs-root", default=settings["nfs_root"], help="Checkpoints go to <nfs root>/<node>, like CUBEMIG_CHECKPOINT_NFS_ROOT")
+    args = parser.parse_args()
+    settings.update(nodes=[node for node in args.nodes.split(",") if node], checkpoint_mb=args.checkpoint_mb,
+                    checkpoint_delay=args.checkpoint_ms / 1000, pod_ready=args.pod_ready_ms / 1000,
+                    pod_ready_jitter=args.pod_ready_jitter_ms / 1000, api_latency=args.api_latency_ms / 1000, nfs_root=args.nfs_root)
+    seed(args.pods, args.cluster, args.namespace, args.container)
+    uvicorn.run(app, host=args.host, port=args.port)
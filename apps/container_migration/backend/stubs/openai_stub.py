@@ -0,0 +1,108 @@
+"""Local OpenAI-compatible chat completions server for exercising the AI suggestion service.
+
+Streams a canned assessment token by token with Groq's timing fields, and can
+be told to fail requests to exercise the retries:
+
+    python -m stubs.openai_stub --port 8088 --tokens-per-second 200 --fail-first 2
+    CUBEMIG_AI_URL=http://localhost:8088/v1/chat/completions python main.py
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ASSESSMENT = """1. Issue: The process tree shows a shell spawned by the Java process, which a Spring Boot application does not need.
+   Action: Restrict process execution with a seccomp or AppArmor profile and remove shells from the image.
+2. Issue: Files outside the expected paths were changed in the container file system.
+   Action: Run the container with a read-only root file system and mount writable volumes only where required.
+3. Hypothesis: An attacker used a remote code execution vulnerability to start a shell and read sensitive files."""
+
+settings = {
+    "latency": 0.05,
+    "tokens_per_second": 500.0,
+    "fail_first": 0,
+    "fail_status": 503,
+}
+state = {"requests": 0, "failed": 0, "active": 0, "max_active": 0}
+
+app = FastAPI()
+
+def usage(prompt: str, completion_tokens: int, queue_time: float, prompt_time: float, completion_time: float) -> dict:
+    prompt_tokens = len(prompt.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "queue_time": queue_time,
+        "prompt_time": prompt_time,
+        "completion_time": completion_time,
+        "total_time": prompt_time + completion_time,
+    }
+
+@app.get("/stats")
+async def get_stats():
+    return state
+
+@app.post("/v1/chat/completions")
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    state["requests"] += 1
+    if state["failed"] < settings["fail_first"]:
+        state["failed"] += 1
+        return JSONResponse({"error": {"message": "stub failure", "type": "server_error"}}, status_code=settings["fail_status"])
+
+    started = time.monotonic()
+    prompt = "\n".join(message.get("content") or "" for message in body.get("messages", []))
+    model = body.get("model", "stub-model")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+    tokens = [word + " " for word in ASSESSMENT.split(" ")][:body.get("max_tokens") or None]
+
+    async def generate():
+        state["active"] += 1
+        state["max_active"] = max(state["max_active"], state["active"])
+        try:
+            await asyncio.sleep(settings["latency"])
+            prompt_time = time.monotonic() - started
+            for token in tokens:
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(1 / settings["tokens_per_second"])
+            completion_time = time.monotonic() - started - prompt_time
+            final = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                     "x_groq": {"usage": usage(prompt, len(tokens), 0.0, prompt_time, completion_time)}}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            state["active"] -= 1
+
+    if body.get("stream"):
+        return StreamingResponse(generate(), media_type="text/event-stream")
+    await asyncio.sleep(settings["latency"] + len(tokens) / settings["tokens_per_second"])
+    elapsed = time.monotonic() - started
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+        "usage": usage(prompt, len(tokens), 0.0, settings["latency"], elapsed - settings["latency"]),
+    }
+
+if __name__ == "__main__":
+    import uvicorn
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub for the AI suggestion service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--latency", type=float, default=settings["latency"], help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=settings["tokens_per_second"])
+    parser.add_argument("--fail-first", type=int, default=0, help="Answer the first N requests with --fail-status")
+    parser.add_argument("--fail-status", type=int, default=settings["fail_status"])
+    args = parser.parse_args()
+    settings.update(latency=args.latency, tokens_per_second=args.tokens_per_second,
+                    fail_first=args.fail_first, fail_status=args.fail_status)
+    uvicorn.run(app, host=args.host, port=args.port)
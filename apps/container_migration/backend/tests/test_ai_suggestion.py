@@ -0,0 +1,116 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import pytest
+from stubs.openai_stub import ASSESSMENT
+from utils.ai_suggestion import AISuggestionError, AISuggestionService
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORENSIC_REPORT = """Displaying container checkpoint tree view from checkpoint: /var/lib/kubelet/checkpoints/checkpoint-vuln-spring.tar
+
+vuln-spring
+├── Image: localhost/vuln-spring:latest
+├── Process tree
+│   └── [1]  java
+│       └── [42]  sh
+"""
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def openai_stub():
+    """Start stubs/openai_stub.py with the given arguments, returns its chat completions URL"""
+    processes = []
+
+    def start(*args: str) -> str:
+        port = free_port()
+        process = subprocess.Popen([sys.executable, "-m", "stubs.openai_stub", "--port", str(port), *args], cwd=BACKEND_DIR,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        processes.append(process)
+        deadline = time.monotonic() + 15
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/stats").raise_for_status()
+                return f"http://127.0.0.1:{port}/v1/chat/completions"
+            except httpx.HTTPError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError("openai_stub did not start")
+                time.sleep(0.1)
+
+    yield start
+    for process in processes:
+        process.terminate()
+        process.wait(timeout=10)
+
+def stub_stats(url: str) -> dict:
+    return httpx.get(url.replace("/v1/chat/completions", "/stats")).json()
+
+@pytest.fixture
+def log_dir(tmp_path):
+    (tmp_path / "forensic_report.txt").write_text(FORENSIC_REPORT)
+    return str(tmp_path)
+
+def generate(service: AISuggestionService, *log_dirs: str):
+    async def run():
+        try:
+            return await asyncio.gather(*(service.generate(log_dir) for log_dir in log_dirs))
+        finally:
+            await service.close()
+    return asyncio.run(run())
+
+def test_generate_streams_the_suggestion_to_a_file(openai_stub, log_dir):
+    url = openai_stub("--latency", "0.05", "--tokens-per-second", "2000")
+    [timings] = generate(AISuggestionService(url=url), log_dir)
+
+    with open(os.path.join(log_dir, "ai_suggestion.txt")) as file:
+        suggestion = file.read()
+    assert suggestion.startswith("Model: ")
+    assert suggestion.split("AI Suggestion: ", 1)[1].strip() == ASSESSMENT
+    assert os.path.exists(os.path.join(log_dir, "forensic_report_compact.txt"))
+    assert timings["attempts"] == 1
+    # Groq's usage fields of the stub's last chunk
+    assert timings["prompt_time"] > 0 and timings["completion_time"] > 0
+    assert timings["first_token_time"] > 0
+    assert stub_stats(url)["requests"] == 1
+
+def test_server_errors_are_retried(openai_stub, log_dir):
+    url = openai_stub("--fail-first", "2", "--fail-status", "503", "--latency", "0", "--tokens-per-second", "5000")
+    [timings] = generate(AISuggestionService(url=url, max_retries=3), log_dir)
+
+    assert timings["attempts"] == 3
+    stats = stub_stats(url)
+    assert (stats["requests"], stats["failed"]) == (3, 2)
+    with open(os.path.join(log_dir, "ai_suggestion.txt")) as file:
+        assert ASSESSMENT in file.read()
+
+def test_client_errors_are_not_retried(openai_stub, log_dir):
+    url = openai_stub("--fail-first", "1", "--fail-status", "400")
+    with pytest.raises(AISuggestionError) as error:
+        generate(AISuggestionService(url=url, max_retries=3), log_dir)
+
+    assert not error.value.retryable
+    assert "400" in str(error.value)
+    assert stub_stats(url)["requests"] == 1
+
+def test_concurrency_is_capped(openai_stub, tmp_path):
+    url = openai_stub("--latency", "0.2", "--tokens-per-second", "2000")
+    log_dirs = []
+    for index in range(6):
+        directory = tmp_path / str(index)
+        directory.mkdir()
+        (directory / "forensic_report.txt").write_text(FORENSIC_REPORT)
+        log_dirs.append(str(directory))
+    results = generate(AISuggestionService(url=url, max_concurrency=2), *log_dirs)
+
+    stats = stub_stats(url)
+    assert stats["requests"] == 6
+    assert stats["max_active"] == 2
+    # Requests past the cap waited for a slot before they were sent
+    assert max(timings["local_wait_time"] for timings in results) > 0
@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import json
+import os
+import httpx
+import pytest
+from stubs import cluster_simulator
+from utils.compression import get_codec
+from utils.oci_image import (CHECKPOINT_ANNOTATION, OCI_LAYER, RegistryClient, push_checkpoint_image,
+                             push_checkpoint_layer, push_checkpoint_manifest, with_digest)
+
+def registry() -> RegistryClient:
+    """Client for the simulator's registry, served in-process"""
+    transport = httpx.ASGITransport(app=cluster_simulator.app)
+    return RegistryClient("http://registry.test", httpx.AsyncClient(transport=transport))
+
+@pytest.fixture
+def checkpoint_file(tmp_path):
+    path = tmp_path / "checkpoint.tar"
+    # More than one chunk, so the layer is streamed in several parts
+    path.write_bytes(os.urandom(1024) * 5000)
+    return str(path)
+
+def test_layer_upload_streams_the_checkpoint_tar(checkpoint_file):
+    async def run():
+        client = registry()
+        try:
+            layer = await push_checkpoint_layer(client, "checkpoint/layer", checkpoint_file)
+            exists = await client.blob_exists("checkpoint/layer", layer["digest"])
+        finally:
+            await client.close()
+        return layer, exists
+
+    layer, exists = asyncio.run(run())
+    with open(checkpoint_file, "rb") as file:
+        data = file.read()
+    digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+    assert layer == {"digest": digest, "diff_id": digest, "size": len(data), "media_type": OCI_LAYER}
+    assert exists
+    assert cluster_simulator.blobs[digest] == len(data)
+
+def test_compressed_layer_keeps_the_uncompressed_diff_id(checkpoint_file):
+    async def run():
+        client = registry()
+        try:
+            return await push_checkpoint_layer(client, "checkpoint/zstd", checkpoint_file, get_codec("zstd:1"))
+        finally:
+            await client.close()
+
+    layer = asyncio.run(run())
+    with open(checkpoint_file, "rb") as file:
+        data = file.read()
+    assert layer["diff_id"] == f"sha256:{hashlib.sha256(data).hexdigest()}"
+    assert layer["digest"] != layer["diff_id"]
+    assert layer["size"] < len(data)
+    assert layer["media_type"] == get_codec("zstd:1").media_type
+
+def test_registry_rejects_a_wrong_digest():
+    async def run():
+        client = registry()
+        try:
+            location = await client._start_upload("checkpoint/digest")
+            wrong = f"sha256:{hashlib.sha256(b'other').hexdigest()}"
+            return await client.http.put(with_digest(location, wrong), content=b"checkpoint")
+        finally:
+            await client.close()
+
+    response = asyncio.run(run())
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["code"] == "DIGEST_INVALID"
+
+def test_small_blob_is_not_uploaded_twice():
+    async def run():
+        client = registry()
+        try:
+            first = await client.upload_blob("checkpoint/blob", b"config")
+            uploaded = cluster_simulator.state["blobs"]
+            second = await client.upload_blob("checkpoint/blob", b"config")
+        finally:
+            await client.close()
+        return first, second, uploaded
+
+    first, second, uploaded = asyncio.run(run())
+    assert first == second == f"sha256:{hashlib.sha256(b'config').hexdigest()}"
+    assert cluster_simulator.state["blobs"] == uploaded
+
+def test_manifest_carries_the_checkpoint_annotation(checkpoint_file):
+    async def run():
+        client = registry()
+        try:
+            layer = await push_checkpoint_layer(client, "checkpoint/image", checkpoint_file)
+            digest = await push_checkpoint_manifest(client, "checkpoint/image", "checkpoint-vuln-spring", layer, "vuln-spring")
+            response = await client.http.get(f"{client.base_url}/v2/checkpoint/image/manifests/checkpoint-vuln-spring")
+            config = await client.blob_exists("checkpoint/image", response.json()["config"]["digest"])
+        finally:
+            await client.close()
+        return layer, digest, response, config
+
+    layer, digest, response, config_exists = asyncio.run(run())
+    manifest = response.json()
+    assert digest == f"sha256:{hashlib.sha256(response.content).hexdigest()}"
+    assert manifest["annotations"][CHECKPOINT_ANNOTATION] == "vuln-spring"
+    assert manifest["layers"] == [{"mediaType": OCI_LAYER, "digest": layer["digest"], "size": layer["size"]}]
+    assert config_exists
+
+def test_push_checkpoint_image_returns_layer_and_manifest(checkpoint_file):
+    async def run():
+        client = registry()
+        try:
+            return await push_checkpoint_image(client, "checkpoint/full", "latest", checkpoint_file, "vuln-spring")
+        finally:
+            await client.close()
+
+    image = asyncio.run(run())
+    manifest, _ = cluster_simulator.manifests[("checkpoint/full", "latest")]
+    assert image["manifest_digest"] == f"sha256:{hashlib.sha256(manifest).hexdigest()}"
+    assert json.loads(manifest)["layers"][0]["digest"] == image["digest"]
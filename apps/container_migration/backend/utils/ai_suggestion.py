@@ -0,0 +1,160 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import Optional
+import httpx
+from utils.constants import AI_API_URL, AI_MODEL, AI_TIMEOUT, AI_MAX_RETRIES, AI_MAX_CONCURRENCY, AI_REPORT_TOKEN_BUDGET
+from utils.report_compactor import BENIGN_PATHS, compact_report
+
+AI_PARAMETERS = {"temperature": 1, "max_tokens": 1024, "top_p": 1}
+# Responses and transport errors worth retrying, anything else is a problem with the request itself
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+RETRY_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+SYSTEM_INSTRUCTION = """You are a professional IT security analyst specializing in container security. Your task is to analyze `checkpointctl` output provided by the user and generate a detailed security assessment. Specifically:
+- Identify and explain any issues, vulnerabilities, or misconfigurations present in the container based on the report.
+- Suggest corrective actions to address each identified issue.
+- Hypothesize potential attacks or threats that could exploit these vulnerabilities and explain the potential impact of these attacks.
+- Make one hypothesis about what attack happened in this container
+
+Your responses should be clear, concise, and professional, aimed at helping the user improve the container's security posture effectively. Use technical language appropriate for IT professionals and provide actionable recommendations.
+
+It is possible that attacks come in a base64 encoded command. Make sure to decrypt the base64 encoded string to get more information about the attack.
+
+
+The running app is a spring boot application.
+The fact that these files are changed is required by the application and should not be considered as an issue:
+""" + "\n".join(f"- {path}" for path in BENIGN_PATHS)
+
+class AISuggestionError(Exception):
+    def __init__(self, message: str, retryable: bool = True, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+class AISuggestionService:
+    """Streams security assessments of forensic reports from an OpenAI-compatible chat completions API.
+
+    One pooled HTTP client is shared by all migrations, at most `max_concurrency`
+    requests run at a time and failed requests are retried with exponential
+    backoff. Tokens are appended to ai_suggestion.txt as they arrive.
+    """
+
+    def __init__(self, url: str = AI_API_URL, timeout: float = AI_TIMEOUT, max_retries: int = AI_MAX_RETRIES,
+                 max_concurrency: int = AI_MAX_CONCURRENCY, http_client: Optional[httpx.AsyncClient] = None):
+        self.url = url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self._http = http_client
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10),
+                limits=httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency),
+            )
+        return self._http
+
+    @property
+    def semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+        self._http = None
+
+    async def generate(self, log_dir: str) -> dict:
+        """Ask the LLM for an assessment of forensic_report.txt, streams it to ai_suggestion.txt and returns the timings in ms"""
+        with open(os.path.join(log_dir, "forensic_report.txt"), "r") as file:
+            forensic_report, compaction = compact_report(file.read(), AI_REPORT_TOKEN_BUDGET)
+        # What the model actually saw
+        with open(os.path.join(log_dir, "forensic_report_compact.txt"), "w") as file:
+            file.write(forensic_report)
+        print(f"Forensic report compacted from {compaction['original_tokens']} to {compaction['compacted_tokens']} tokens "
+              f"({compaction['ratio']}x){', truncated: ' + ', '.join(compaction['truncated_sections']) if compaction['truncated_sections'] else ''}")
+        request = {
+            "messages": [
+                {"role": "system", "content": SYSTEM_INSTRUCTION},
+                {"role": "user", "content": forensic_report},
+            ],
+            "model": AI_MODEL,
+            **AI_PARAMETERS,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+            "stop": None,
+        }
+        requested = time.monotonic()
+        async with self.semaphore:
+            wait_time = (time.monotonic() - requested) * 1000
+            for attempt in range(self.max_retries + 1):
+                try:
+                    timings = await self._stream(request, os.path.join(log_dir, "ai_suggestion.txt"))
+                    timings["local_wait_time"] = round(wait_time, 1)
+                    timings["attempts"] = attempt + 1
+                    timings["report_tokens"] = compaction["original_tokens"]
+                    timings["prompt_report_tokens"] = compaction["compacted_tokens"]
+                    return timings
+                except (*RETRY_ERRORS, AISuggestionError) as e:
+                    retry_after = getattr(e, "retry_after", None)
+                    if attempt == self.max_retries or not getattr(e, "retryable", True):
+                        raise
+                    delay = retry_after if retry_after is not None else min(2 ** attempt, 30) * (0.5 + random.random() / 2)
+                    print(f"AI suggestion attempt {attempt + 1} failed ({str(e) or type(e).__name__}), retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    async def _stream(self, request: dict, output_file: str) -> dict:
+        started = time.monotonic()
+        first_token = None
+        usage = {}
+        model = AI_MODEL
+        api_key = os.environ.get("GROQ_API_KEY")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        async with self.http.stream("POST", self.url, json=request, headers=headers) as response:
+            if response.status_code != 200:
+                body = (await response.aread()).decode(errors="replace")[:500]
+                retry_after = response.headers.get("retry-after", "")
+                raise AISuggestionError(f"AI API returned {response.status_code}: {body}",
+                                        retryable=response.status_code in RETRY_STATUS_CODES,
+                                        retry_after=float(retry_after) if retry_after.replace(".", "", 1).isdigit() else None)
+            # Rewritten from the start on every attempt, so a retry never leaves half an answer behind
+            with open(output_file, "w") as file:
+                header_written = False
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    model = chunk.get("model") or model
+                    usage = chunk.get("usage") or chunk.get("x_groq", {}).get("usage") or usage
+                    if not header_written:
+                        file.write(f"Model: {model}\nAI Suggestion: ")
+                        header_written = True
+                    for choice in chunk.get("choices") or []:
+                        content = (choice.get("delta") or {}).get("content")
+                        if content:
+                            if first_token is None:
+                                first_token = time.monotonic()
+                            file.write(content)
+                            file.flush()
+                if not header_written:
+                    raise AISuggestionError("AI API closed the stream without a response")
+                file.write("\n")
+        finished = time.monotonic()
+        timings = {name: round((usage.get(name) or 0) * 1000, 3) for name in ("queue_time", "prompt_time", "completion_time", "total_time")}
+        if not timings["total_time"]:
+            # APIs without Groq's timing fields: fall back to what was measured here
+            timings["total_time"] = round((finished - started) * 1000, 1)
+        timings["first_token_time"] = round(((first_token or finished) - started) * 1000, 1)
+        return timings
+
+ai_suggestion_service = AISuggestionService()
@@ -0,0 +1,327 @@
+"""Load test the /alert endpoint with synthetic or recorded Falco alerts.
+
+Usage: python -m utils.alert_bench [--url http://127.0.0.1:8000] [--rates 100,500,1000] [--duration 10]
+                                   [--mix ptrace=0.9,log=0.05,migrate=0.05] [--replay alerts.jsonl]
+                                   [--json results.json] [--baseline previous.json]
+
+Alerts are sent at a fixed rate whether or not earlier ones were answered, and
+latency is measured from the time a request was due, so a slow backend shows up
+as latency instead of a lower send rate. Run it against a backend with
+CUBEMIG_CLUSTER_BACKEND=simulated, migrate alerts queue real migrations.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import httpx
+from utils.loop_monitor import percentile
+from utils.migration_util import load_config
+from utils.rule_matcher import RuleIndex
+
+DEFAULT_RATES = "100,250,500,1000"
+DEFAULT_MIX = "ptrace=0.9,log=0.05,migrate=0.05"
+# The noisy rule the backend does not even log
+PTRACE_RULE = "PTRACE attached to process"
+PRIORITIES = {"ptrace": "Warning", "log": "Notice", "migrate": "Critical"}
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        if kind.strip() not in PRIORITIES:
+            raise ValueError(f"Unknown alert kind {kind!r}, expected one of {', '.join(PRIORITIES)}")
+        weights[kind.strip()] = float(weight or 1)
+    return weights
+
+def synthetic_alert(kind: str, rule: str, pod_name: str, namespace: str, container: str) -> dict:
+    """A Falco alert as sent by its http_output, shaped like models.alert_model.Alert"""
+    now = datetime.now(timezone.utc)
+    fields = {
+        "container.id": f"{random.getrandbits(48):012x}",
+        "container.image.repository": f"localhost/{container}",
+        "container.image.tag": "latest",
+        "container.name": container,
+        "evt.time": time.time_ns(),
+        "evt.type": "ptrace" if kind == "ptrace" else "openat",
+        "k8s.ns.name": namespace,
+        "k8s.pod.name": pod_name,
+        "proc.cmdline": "java -jar /app/app.jar" if kind == "ptrace" else "sh -c cat /etc/shadow",
+        "proc.exepath": "/usr/bin/java" if kind == "ptrace" else "/bin/sh",
+        "proc.name": "java" if kind == "ptrace" else "sh",
+        "proc.pcmdline": "java -jar /app/app.jar",
+        "proc.pname": "java",
+        "proc.tty": 0,
+        "user.loginuid": -1,
+        "user.name": "root",
+        "user.uid": 0,
+    }
+    return {
+        "hostname": "worker1",
+        "output": f"{now.strftime('%H:%M:%S.%f')}: {PRIORITIES[kind]} {rule} (pod={pod_name} ns={namespace})",
+        "output_fields": fields,
+        "priority": PRIORITIES[kind],
+        "rule": rule,
+        "source": "syscall",
+        "tags": ["container", "benchmark"],
+        "time": now.isoformat().replace("+00:00", "Z"),
+    }
+
+def alert_source(args, rule_index: RuleIndex) -> Callable[[], Tuple[str, dict]]:
+    """Returns a function yielding (action the backend will take, alert payload)"""
+    def action(alert: dict) -> str:
+        rule_config = rule_index.match(alert.get("rule"), alert.get("output_fields"))
+        return rule_config.action if rule_config else "none"
+
+    if args.replay:
+        with open(args.replay, "r") as file:
+            alerts = [json.loads(line) for line in file if line.strip()]
+        if not alerts:
+            raise ValueError(f"No alerts in {args.replay}")
+        actions = [action(alert) for alert in alerts]
+        position = 0
+
+        def next_recorded():
+            nonlocal position
+            index = position % len(alerts)
+            position += 1
+            return actions[index], alerts[index]
+        return next_recorded
+
+    config = load_config()
+    rules = {"ptrace": [PTRACE_RULE],
+             "log": [rule.rule for rule in config.config if rule.action == "log" and rule.match == "exact"],
+             "migrate": [rule.rule for rule in config.config if rule.action == "migrate" and rule.match == "exact"]}
+    weights = parse_mix(args.mix)
+    for kind in weights:
+        if not rules[kind]:
+            raise ValueError(f"config.json has no exact-match rule with action {kind}")
+    kinds, kind_weights = list(weights), list(weights.values())
+
+    def next_synthetic():
+        kind = random.choices(kinds, kind_weights)[0]
+        alert = synthetic_alert(kind, random.choice(rules[kind]), f"{args.container}-{random.randrange(args.pods)}",
+                                args.namespace, args.container)
+        return action(alert), alert
+    return next_synthetic
+
+def summarize(latencies: List[float]) -> dict:
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) or 0, 2),
+        "p95_ms": round(percentile(latencies, 95) or 0, 2),
+        "p99_ms": round(percentile(latencies, 99) or 0, 2),
+        "max_ms": round(max(latencies, default=0), 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0,
+    }
+
+async def get_json(client: httpx.AsyncClient, url: str) -> Optional[dict]:
+    """An optional stats endpoint of the backend, None on older versions without it"""
+    try:
+        response = await client.get(url)
+        return response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError):
+        return None
+
+class AlertConnection:
+    """Keep-alive HTTP/1.1 connection that posts pre-encoded alerts.
+
+    httpx spends more CPU per request than the backend needs to answer an
+    unmatched alert, so with both on one machine it would measure itself.
+    """
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def post(self, path: str, body: bytes) -> Tuple[int, bytes]:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(f"POST {path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\nContent-Type: application/json\r\n"
+                          f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status = int(head.split(b" ", 2)[1])
+        headers = dict(line.split(b":", 1) for line in head.split(b"\r\n")[1:] if b":" in line)
+        headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+        if headers.get(b"transfer-encoding", b"").lower() == b"chunked":
+            payload = b""
+            while True:
+                size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if not size:
+                    break
+                payload += chunk[:-2]
+        else:
+            payload = await self.reader.readexactly(int(headers.get(b"content-length", b"0")))
+        if headers.get(b"connection", b"").lower() == b"close":
+            await self.close()
+        return status, payload
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        self.reader = self.writer = None
+
+async def run_step(client: httpx.AsyncClient, url: str, rate: float, duration: float, next_alert, connections: int, timeout: float) -> dict:
+    """Send alerts at `rate` per second for `duration` seconds, returns the latency and throughput of that step"""
+    loop = asyncio.get_running_loop()
+    target = urlsplit(url)
+    if target.scheme != "http":
+        raise ValueError(f"Only plain HTTP backends are supported, got {url}")
+    path = f"{target.path.rstrip('/')}/alert"
+    total = int(rate * duration)
+    # Encoded up front so the send loop keeps to its schedule
+    alerts = [next_alert() for _ in range(total)]
+    alerts = [(action, json.dumps(alert).encode()) for action, alert in alerts]
+    queue: asyncio.Queue = asyncio.Queue()
+    results: List[Tuple[str, float, int, str]] = []
+
+    async def sender():
+        connection = AlertConnection(target.hostname, target.port or 80)
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            due, action, body = item
+            try:
+                status, payload = await asyncio.wait_for(connection.post(path, body), timeout)
+                message = json.loads(payload).get("message", "") if status == 200 else ""
+            except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError) as e:
+                await connection.close()
+                status, message = 0, type(e).__name__
+            results.append((action, (loop.time() - due) * 1000, status, message))
+        await connection.close()
+
+    await get_json(client, f"{url}/event-loop?reset=true")
+    senders = [asyncio.create_task(sender()) for _ in range(connections)]
+    started = loop.time()
+    for index, (action, body) in enumerate(alerts):
+        due = started + index / rate
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        queue.put_nowait((due, action, body))
+    for _ in senders:
+        queue.put_nowait(None)
+    await asyncio.gather(*senders)
+    elapsed = loop.time() - started
+    event_loop = await get_json(client, f"{url}/event-loop")
+    queue_stats = await get_json(client, f"{url}/migration-queue")
+
+    ok = [latency for _, latency, status, _ in results if status == 200]
+    per_action = {action: summarize([latency for result_action, latency, status, _ in results if result_action == action and status == 200])
+                  for action in sorted({result[0] for result in results})}
+    return {
+        "rate": rate,
+        "duration_s": duration,
+        "sent": total,
+        "completed": len(ok),
+        "errors": len(results) - len(ok),
+        "throughput_rps": round(len(ok) / elapsed, 1) if elapsed else None,
+        "latency_ms": summarize(ok),
+        "per_action": per_action,
+        "responses": dict(Counter(message for _, _, status, message in results if status == 200)),
+        "status_codes": dict(Counter(str(status) for _, _, status, _ in results)),
+        "event_loop_lag_ms": event_loop,
+        "migration_queue": {name: queue_stats.get(name) for name in ("queue_depth", "running", "completed", "failed")} if queue_stats else None,
+    }
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Steps whose p99 latency or throughput got worse than the baseline by more than max_regression (e.g. 1.2 = 20%)"""
+    regressions = []
+    previous = {step["rate"]: step for step in baseline.get("steps", [])}
+    for step in results["steps"]:
+        before = previous.get(step["rate"])
+        if before is None:
+            continue
+        p99, p99_before = step["latency_ms"]["p99_ms"], before["latency_ms"]["p99_ms"]
+        print(f"{step['rate']:>8g}/s  p99 {p99_before:>8.2f} -> {p99:>8.2f} ms  throughput {before['throughput_rps']:>8.1f} -> {step['throughput_rps']:>8.1f}/s")
+        if p99_before and p99 > p99_before * max_regression:
+            regressions.append(f"p99 at {step['rate']:g}/s: {p99_before} -> {p99} ms")
+        if before["throughput_rps"] and (step["throughput_rps"] or 0) * max_regression < before["throughput_rps"]:
+            regressions.append(f"throughput at {step['rate']:g}/s: {before['throughput_rps']} -> {step['throughput_rps']}/s")
+    return regressions
+
+async def run(args) -> dict:
+    rule_index = RuleIndex(load_config())
+    next_alert = alert_source(args, rule_index)
+    steps = []
+    async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout)) as client:
+        rates = [float(rate) for rate in args.rates.split(",")]
+        if args.warmup:
+            # First requests pay for imports, connection set-up and the first migrations
+            await run_step(client, args.url.rstrip("/"), rates[0], args.warmup, next_alert, args.connections, args.timeout)
+        print(f"{'rate/s':>8} {'sent':>7} {'ok':>7} {'err':>5} {'tput/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'lag p99':>8} {'lag max':>8}")
+        for rate in rates:
+            step = await run_step(client, args.url.rstrip("/"), rate, args.duration, next_alert, args.connections, args.timeout)
+            steps.append(step)
+            latency, lag = step["latency_ms"], step["event_loop_lag_ms"] or {}
+            print(f"{rate:>8g} {step['sent']:>7} {step['completed']:>7} {step['errors']:>5} {step['throughput_rps'] or 0:>8.1f} "
+                  f"{latency['p50_ms']:>8.2f} {latency['p95_ms']:>8.2f} {latency['p99_ms']:>8.2f} {latency['max_ms']:>8.2f} "
+                  f"{lag.get('p99_ms', float('nan')):>8.2f} {lag.get('max_ms', float('nan')):>8.2f}")
+            if args.pause:
+                await asyncio.sleep(args.pause)
+    return {
+        "benchmark": "alert",
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "revision": git_revision(),
+        "url": args.url,
+        "source": args.replay or f"synthetic ({args.mix})",
+        "connections": args.connections,
+        "steps": steps,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the /alert endpoint with synthetic or recorded Falco alerts")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="backend base URL")
+    parser.add_argument("--rates", default=DEFAULT_RATES, help=f"comma separated alerts per second, one step each (default: {DEFAULT_RATES})")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per rate step")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds at the first rate before measuring")
+    parser.add_argument("--pause", type=float, default=1, help="seconds between steps")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"weights of ptrace, log and migrate alerts (default: {DEFAULT_MIX})")
+    parser.add_argument("--replay", help="JSON lines file of recorded Falco alerts, sent in order instead of synthetic ones")
+    parser.add_argument("--pods", type=int, default=4, help="distinct pods synthetic alerts are spread over")
+    parser.add_argument("--container", default="vuln-spring", help="container name of synthetic alerts, pods are <container>-<i>")
+    parser.add_argument("--namespace", default="default")
+    parser.add_argument("--connections", type=int, default=64, help="keep-alive connections to the backend, one request in flight on each")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds before a request counts as failed")
+    parser.add_argument("--seed", type=int, help="random seed of the synthetic alert mix")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    parser.add_argument("--baseline", help="results file of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=1.2, help="exit with 1 if p99 or throughput is this factor worse than the baseline")
+    args = parser.parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    results = asyncio.run(run(args))
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            regressions = compare(results, json.load(file), args.max_regression)
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
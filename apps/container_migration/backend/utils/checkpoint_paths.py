@@ -0,0 +1,40 @@
+import asyncio
+import os
+import time
+from typing import Optional
+from utils.constants import CHECKPOINT_NFS_ROOT, CHECKPOINT_MOUNTS, KUBELET_CHECKPOINT_DIR
+
+def mount_for_node(node_name: str) -> str:
+    return CHECKPOINT_MOUNTS.get(node_name, os.path.join(CHECKPOINT_NFS_ROOT, node_name))
+
+def checkpoint_path_from_response(response, node_name: str) -> Optional[str]:
+    """Map the path in a kubelet checkpoint response ({"items": ["/var/lib/kubelet/checkpoints/..."]}) to the NFS mount.
+
+    Returns None for a response of any other shape, so the caller falls back to looking for the archive.
+    """
+    items = response.get("items") if isinstance(response, dict) else None
+    if not isinstance(items, list) or not items or not isinstance(items[0], str) or not items[0]:
+        return None
+    item = items[0]
+    mount = mount_for_node(node_name)
+    relative = os.path.relpath(item, KUBELET_CHECKPOINT_DIR)
+    if relative.startswith(".."):
+        relative = os.path.basename(item)
+    return os.path.join(mount, relative)
+
+async def wait_for_file(path: str, timeout: float, initial_delay: float = 0.005, max_delay: float = 0.25) -> bool:
+    """Wait until a file shows up, with an exponential stat backoff.
+
+    The kubelet answers once the archive is written on the node, but the NFS
+    client may still serve a cached directory listing for a moment. inotify
+    does not see writes from other NFS clients, so this polls.
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if await asyncio.to_thread(os.path.exists, path):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+        delay = min(delay * 2, max_delay)
@@ -0,0 +1,271 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+from utils.constants import (CHECKPOINT_NFS_ROOT, CHECKPOINT_MOUNTS, CHECKPOINT_RETENTION_INTERVAL, CHECKPOINT_KEEP_PER_APP,
+                             CHECKPOINT_MAX_AGE_HOURS, CHECKPOINT_MAX_GB)
+
+# checkpoint-<pod>_<namespace>-<container>-<RFC 3339 time>.tar, as written by the kubelet
+CHECKPOINT_NAME = re.compile(r"^checkpoint-(?P<pod>[^_]+)_(?P<rest>.+?)(?:-(?P<time>\d{4}-\d{2}-\d{2}T[0-9:.]+Z))?\.tar$")
+
+def base_app_name(name: str) -> str:
+    """Strip replica and pod-template suffixes, same as `sed 's/-[0-9].*$//'` in the migration script"""
+    return re.sub(r"-[0-9].*$", "", name)
+
+@dataclass
+class CheckpointEntry:
+    path: str
+    node: str
+    pod: str
+    namespace: str
+    container: str
+    app: str
+    timestamp: float
+    size: int
+    mtime: float
+
+def parse_checkpoint(path: str, node: str, size: int, mtime: float) -> Optional[CheckpointEntry]:
+    match = CHECKPOINT_NAME.match(os.path.basename(path))
+    if match is None:
+        return None
+    pod, rest = match.group("pod"), match.group("rest")
+    # "<namespace>-<container>" is ambiguous when the namespace contains dashes,
+    # the container name normally starts with the app name taken from the pod
+    app = base_app_name(pod)
+    split = rest.rfind(f"-{app}")
+    if split > 0:
+        namespace, container = rest[:split], rest[split + 1:]
+    else:
+        namespace, _, container = rest.partition("-")
+    timestamp = mtime
+    if match.group("time"):
+        try:
+            timestamp = datetime.fromisoformat(match.group("time").replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return CheckpointEntry(path=path, node=node, pod=pod, namespace=namespace, container=container,
+                           app=base_app_name(container), timestamp=timestamp, size=size, mtime=mtime)
+
+class CheckpointRetention:
+    """Background retention of the checkpoint archives on NFS.
+
+    Keeps an index of all checkpoints by node, app, namespace and time and
+    periodically enforces the policies across all nodes: newest N per app and
+    node, a maximum age and a total size budget. Checkpoints that a running
+    migration still reads are pinned and never deleted.
+    """
+
+    def __init__(self, root: str = CHECKPOINT_NFS_ROOT, interval: float = CHECKPOINT_RETENTION_INTERVAL,
+                 keep_per_app: int = CHECKPOINT_KEEP_PER_APP, max_age_hours: float = CHECKPOINT_MAX_AGE_HOURS,
+                 max_gb: float = CHECKPOINT_MAX_GB):
+        self.root = root
+        self.interval = interval
+        self.keep_per_app = keep_per_app
+        self.max_age = max_age_hours * 3600
+        self.max_bytes = int(max_gb * 1024 ** 3)
+        self._index: Dict[str, CheckpointEntry] = {}
+        self._pinned: Set[str] = set()
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self.sweeps = 0
+        self.deleted_files = 0
+        self.reclaimed_bytes = 0
+        self.errors = 0
+        self.last_sweep: Optional[dict] = None
+        self.recent_deletions = deque(maxlen=100)
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                self.errors += 1
+                print(f"Checkpoint retention sweep failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def trigger(self):
+        """Run a sweep now instead of waiting for the interval"""
+        self._wakeup.set()
+
+    def register(self, path: str):
+        """Add a new checkpoint to the index without waiting for the next scan"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return
+        directory = os.path.dirname(path)
+        node_name = next((node for node, mount in CHECKPOINT_MOUNTS.items() if mount.rstrip("/") == directory), os.path.basename(directory))
+        entry = parse_checkpoint(path, node_name, stat.st_size, stat.st_mtime)
+        if entry is not None:
+            with self._lock:
+                self._index[path] = entry
+
+    def pin(self, path: Optional[str]):
+        if path:
+            with self._lock:
+                self._pinned.add(path)
+
+    def unpin(self, path: Optional[str]):
+        if path:
+            with self._lock:
+                self._pinned.discard(path)
+
+    def scan(self):
+        """Rebuild the index from the checkpoint directories, reusing entries whose file did not change"""
+        index = {}
+        try:
+            nodes = {entry.name: entry.path for entry in os.scandir(self.root) if entry.is_dir()}
+        except FileNotFoundError:
+            nodes = {}
+        nodes.update(CHECKPOINT_MOUNTS)
+        with self._lock:
+            previous = dict(self._index)
+        for node_name, directory in nodes.items():
+            try:
+                files = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for file in files:
+                if not file.name.startswith("checkpoint-") or not file.name.endswith(".tar"):
+                    continue
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                entry = previous.get(file.path)
+                if entry is None or entry.mtime != stat.st_mtime or entry.size != stat.st_size:
+                    entry = parse_checkpoint(file.path, node_name, stat.st_size, stat.st_mtime)
+                if entry is not None:
+                    index[file.path] = entry
+        with self._lock:
+            self._index = index
+
+    def select_expired(self, now: Optional[float] = None) -> List[tuple]:
+        """Pick the checkpoints to delete as (entry, reason), without touching the file system"""
+        now = time.time() if now is None else now
+        with self._lock:
+            entries = [entry for entry in self._index.values() if entry.path not in self._pinned]
+        groups: Dict[tuple, List[CheckpointEntry]] = {}
+        for entry in entries:
+            groups.setdefault((entry.node, entry.namespace, entry.app), []).append(entry)
+        newest = set()
+        expired = {}
+        for group in groups.values():
+            group.sort(key=lambda entry: entry.timestamp, reverse=True)
+            newest.add(group[0].path)
+            if self.keep_per_app > 0:
+                for entry in group[self.keep_per_app:]:
+                    expired[entry.path] = (entry, "count")
+        if self.max_age > 0:
+            for entry in entries:
+                if entry.path not in newest and entry.path not in expired and now - entry.timestamp > self.max_age:
+                    expired[entry.path] = (entry, "age")
+        if self.max_bytes > 0:
+            with self._lock:
+                total = sum(entry.size for entry in self._index.values()) - sum(entry.size for entry, _ in expired.values())
+            # The newest checkpoint of every app stays, it is the one a restore would use
+            for entry in sorted(entries, key=lambda entry: entry.timestamp):
+                if total <= self.max_bytes:
+                    break
+                if entry.path in newest or entry.path in expired:
+                    continue
+                expired[entry.path] = (entry, "size")
+                total -= entry.size
+        return list(expired.values())
+
+    def sweep(self) -> dict:
+        """Rescan the index and delete what the policies select, returns a summary of the sweep"""
+        started = time.monotonic()
+        self.scan()
+        deleted = 0
+        reclaimed = 0
+        for entry, reason in self.select_expired():
+            with self._lock:
+                if entry.path in self._pinned:
+                    continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.errors += 1
+                print(f"Could not delete checkpoint {entry.path}: {str(e)}")
+                continue
+            with self._lock:
+                self._index.pop(entry.path, None)
+            deleted += 1
+            reclaimed += entry.size
+            self.recent_deletions.append({"path": entry.path, "bytes": entry.size, "reason": reason, "deleted_at": time.time()})
+        self.sweeps += 1
+        self.deleted_files += deleted
+        self.reclaimed_bytes += reclaimed
+        self.last_sweep = {
+            "finished_at": time.time(),
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "deleted_files": deleted,
+            "reclaimed_bytes": reclaimed,
+        }
+        if deleted:
+            print(f"Checkpoint retention deleted {deleted} checkpoints, reclaimed {reclaimed / 1024 ** 2:.1f} MiB")
+        return self.last_sweep
+
+    def list(self, node: Optional[str] = None, app: Optional[str] = None, namespace: Optional[str] = None) -> List[dict]:
+        with self._lock:
+            entries = list(self._index.values())
+        entries = [entry for entry in entries
+                   if (node is None or entry.node == node) and (app is None or entry.app == app)
+                   and (namespace is None or entry.namespace == namespace)]
+        return [asdict(entry) for entry in sorted(entries, key=lambda entry: entry.timestamp, reverse=True)]
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = list(self._index.values())
+            pinned = len(self._pinned)
+        nodes = {}
+        for entry in entries:
+            node = nodes.setdefault(entry.node, {"files": 0, "bytes": 0})
+            node["files"] += 1
+            node["bytes"] += entry.size
+        return {
+            "policy": {
+                "keep_per_app": self.keep_per_app,
+                "max_age_hours": self.max_age / 3600,
+                "max_bytes": self.max_bytes,
+                "interval_seconds": self.interval,
+            },
+            "indexed_files": len(entries),
+            "indexed_bytes": sum(entry.size for entry in entries),
+            "pinned": pinned,
+            "nodes": nodes,
+            "sweeps": self.sweeps,
+            "deleted_files": self.deleted_files,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "errors": self.errors,
+            "last_sweep": self.last_sweep,
+            "recent_deletions": list(self.recent_deletions),
+        }
+
+checkpoint_retention = CheckpointRetention()
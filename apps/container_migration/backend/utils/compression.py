@@ -0,0 +1,131 @@
+import zlib
+from typing import Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+# OCI layer media types; lz4 is not an allowed layer compression, so lz4 checkpoints cannot become image layers
+OCI_LAYER_MEDIA_TYPES = {
+    "none": "application/vnd.oci.image.layer.v1.tar",
+    "gzip": "application/vnd.oci.image.layer.v1.tar+gzip",
+    "zstd": "application/vnd.oci.image.layer.v1.tar+zstd",
+}
+EXTENSIONS = {"none": "tar", "gzip": "tar.gz", "zstd": "tar.zst", "lz4": "tar.lz4"}
+DEFAULT_LEVELS = {"none": None, "gzip": 6, "zstd": 3, "lz4": 0}
+
+class _Identity:
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+    def flush(self) -> bytes:
+        return b""
+
+class _Lz4Compressor:
+    """Streaming lz4 frame compressor with the same interface as zlib's compressobj"""
+
+    def __init__(self, level: int):
+        self._compressor = lz4_frame.LZ4FrameCompressor(compression_level=level)
+        self._started = False
+
+    def _begin(self) -> bytes:
+        if self._started:
+            return b""
+        self._started = True
+        return self._compressor.begin()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._begin() + self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        return self._begin() + self._compressor.flush()
+
+class _Lz4Decompressor:
+    def __init__(self):
+        self._decompressor = lz4_frame.LZ4FrameDecompressor()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+class _ZstdDecompressor:
+    def __init__(self):
+        self._decompressor = zstandard.ZstdDecompressor().decompressobj()
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._decompressor.decompress(data)
+
+    def flush(self) -> bytes:
+        return b""
+
+class Codec:
+    """A checkpoint compression codec, created from a spec like "gzip", "zstd:19" or "lz4"."""
+
+    def __init__(self, name: str, level: Optional[int] = None):
+        self.name = name
+        self.level = DEFAULT_LEVELS[name] if level is None else level
+
+    @property
+    def spec(self) -> str:
+        return self.name if self.level is None else f"{self.name}:{self.level}"
+
+    @property
+    def extension(self) -> str:
+        return EXTENSIONS[self.name]
+
+    @property
+    def media_type(self) -> Optional[str]:
+        return OCI_LAYER_MEDIA_TYPES.get(self.name)
+
+    def compressor(self):
+        """Streaming compressor with compress(data) and flush()"""
+        if self.name == "gzip":
+            return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        if self.name == "zstd":
+            return zstandard.ZstdCompressor(level=self.level, threads=-1).compressobj()
+        if self.name == "lz4":
+            return _Lz4Compressor(self.level)
+        return _Identity()
+
+    def decompressor(self):
+        """Streaming decompressor with decompress(data) and flush()"""
+        if self.name == "gzip":
+            return zlib.decompressobj(31)
+        if self.name == "zstd":
+            return _ZstdDecompressor()
+        if self.name == "lz4":
+            return _Lz4Decompressor()
+        return _Identity()
+
+    def __repr__(self):
+        return f"Codec({self.spec})"
+
+def get_codec(spec: Optional[str]) -> Codec:
+    """Parse a codec spec, raises ValueError for unknown codecs or ones whose library is not installed"""
+    name, _, level = (spec or "none").strip().lower().partition(":")
+    if name not in EXTENSIONS:
+        raise ValueError(f"Unknown compression '{spec}', use one of {', '.join(EXTENSIONS)}")
+    if name == "zstd" and zstandard is None:
+        raise ValueError("zstd compression needs the zstandard package")
+    if name == "lz4" and lz4_frame is None:
+        raise ValueError("lz4 compression needs the lz4 package")
+    if name == "none" and level:
+        raise ValueError("Compression 'none' takes no level")
+    try:
+        return Codec(name, int(level) if level else None)
+    except ValueError:
+        raise ValueError(f"Invalid compression level in '{spec}'")
+
+def available_codecs() -> list:
+    return [name for name in EXTENSIONS if not (name == "zstd" and zstandard is None) and not (name == "lz4" and lz4_frame is None)]
@@ -0,0 +1,103 @@
+"""Benchmark checkpoint compression codecs on real checkpoint files.
+
+Usage: python -m utils.compression_bench <checkpoint.tar>... [--codecs none,gzip:6,zstd:3,lz4]
+                                         [--bandwidth-mbps 1000] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from utils.compression import get_codec
+
+DEFAULT_CODECS = "none,gzip:1,gzip:6,zstd:1,zstd:3,zstd:9,zstd:19,lz4"
+CHUNK_SIZE = 4 * 1024 * 1024
+
+def _pipe(source, destination, transform, flush) -> int:
+    """Copy source through transform into destination (None discards), returns the bytes produced"""
+    produced = 0
+    while True:
+        chunk = source.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        data = transform(chunk)
+        produced += len(data)
+        if destination is not None:
+            destination.write(data)
+    tail = flush()
+    produced += len(tail)
+    if destination is not None:
+        destination.write(tail)
+    return produced
+
+def benchmark_file(path: str, spec: str, bandwidth_mbps: float) -> dict:
+    """Compress a file to a temporary file and decompress it again, returns timings in ms and sizes in bytes"""
+    codec = get_codec(spec)
+    original_size = os.path.getsize(path)
+    with tempfile.NamedTemporaryFile(suffix=f".{codec.extension}", dir=os.path.dirname(path) or ".") as compressed:
+        compressor = codec.compressor()
+        start = time.perf_counter()
+        with open(path, "rb") as source:
+            _pipe(source, compressed, compressor.compress, compressor.flush)
+        compressed.flush()
+        compress_ms = (time.perf_counter() - start) * 1000
+        compressed_size = os.path.getsize(compressed.name)
+
+        decompressor = codec.decompressor()
+        start = time.perf_counter()
+        with open(compressed.name, "rb") as source:
+            restored_size = _pipe(source, None, decompressor.decompress, decompressor.flush)
+        decompress_ms = (time.perf_counter() - start) * 1000
+        if restored_size != original_size:
+            raise RuntimeError(f"{codec.spec} round trip of {path} returned {restored_size} of {original_size} bytes")
+
+    transfer_ms = compressed_size * 8 / (bandwidth_mbps * 1e6) * 1000
+    return {
+        "file": path,
+        "codec": codec.spec,
+        "original_bytes": original_size,
+        "compressed_bytes": compressed_size,
+        "ratio": round(original_size / compressed_size, 3) if compressed_size else None,
+        "compress_ms": round(compress_ms, 1),
+        "decompress_ms": round(decompress_ms, 1),
+        "compress_mb_s": round(original_size / 1e6 / (compress_ms / 1000), 1) if compress_ms else None,
+        "transfer_ms": round(transfer_ms, 1),
+        # What the codec adds to the migration downtime at the given link speed
+        "total_ms": round(compress_ms + transfer_ms + decompress_ms, 1),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark checkpoint compression codecs")
+    parser.add_argument("files", nargs="+", help="checkpoint archives, e.g. /home/ubuntu/nfs/checkpoints/<node>/checkpoint-*.tar")
+    parser.add_argument("--codecs", default=DEFAULT_CODECS, help=f"comma separated codec specs (default: {DEFAULT_CODECS})")
+    parser.add_argument("--bandwidth-mbps", type=float, default=1000, help="link speed used for the transfer estimate")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'file':<40} {'codec':<8} {'size MB':>9} {'ratio':>6} {'comp ms':>9} {'MB/s':>7} {'xfer ms':>9} {'decomp ms':>9} {'total ms':>9}")
+    for path in args.files:
+        for spec in args.codecs.split(","):
+            try:
+                result = benchmark_file(path, spec, args.bandwidth_mbps)
+            except ValueError as e:
+                print(f"Skipping {spec}: {e}", file=sys.stderr)
+                continue
+            results.append(result)
+            print(f"{os.path.basename(path)[-40:]:<40} {result['codec']:<8} {result['compressed_bytes'] / 1e6:>9.1f} "
+                  f"{result['ratio'] or 0:>6.2f} {result['compress_ms']:>9.1f} {result['compress_mb_s'] or 0:>7.1f} "
+                  f"{result['transfer_ms']:>9.1f} {result['decompress_ms']:>9.1f} {result['total_ms']:>9.1f}")
+
+    for path in args.files:
+        candidates = [result for result in results if result["file"] == path]
+        if candidates:
+            best = min(candidates, key=lambda result: result["total_ms"])
+            print(f"Fastest end to end for {os.path.basename(path)}: {best['codec']} ({best['total_ms']} ms)")
+
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump({"bandwidth_mbps": args.bandwidth_mbps, "results": results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,104 @@
+import json
+import os
+from pathlib import Path
+
 CLUSTER_1 = 'cluster1'
 CLUSTER_2 = 'cluster2'
-CLUSTER_SEV_SNP = 'cluster-sev-snp'
\ No newline at end of file
+CLUSTER_SEV_SNP = 'cluster-sev-snp'
+
+# "kubernetes" talks to the real clusters, "simulated" to the local stand-ins of stubs/cluster_simulator.py
+CLUSTER_BACKEND = os.environ.get("CUBEMIG_CLUSTER_BACKEND", "kubernetes")
+SIMULATOR_URL = os.environ.get("CUBEMIG_SIMULATOR_URL", "http://127.0.0.1:8089")
+SIMULATED = CLUSTER_BACKEND == "simulated"
+
+# Migration logs, one directory per container and migration
+LOG_DIR = os.environ.get("CUBEMIG_LOG_DIR", "/home/ubuntu/contMigration_logs")
+
+# Migration worker pool
+MIGRATION_WORKERS = int(os.environ.get("CUBEMIG_MIGRATION_WORKERS", "2"))
+MAX_MIGRATIONS_PER_CLUSTER = int(os.environ.get("CUBEMIG_MAX_MIGRATIONS_PER_CLUSTER", "2"))
+MAX_MIGRATIONS_PER_NODE = int(os.environ.get("CUBEMIG_MAX_MIGRATIONS_PER_NODE", "1"))
+# Queued migrations run by Falco priority; every this many seconds of waiting raise a job by one priority level
+MIGRATION_AGING_SECONDS = float(os.environ.get("CUBEMIG_MIGRATION_AGING_SECONDS", "60"))
+# Falco priorities, most urgent first
+FALCO_PRIORITIES = ("emergency", "alert", "critical", "error", "warning", "notice", "informational", "debug")
+PRIORITY_ALIASES = {"info": "informational", "warn": "warning", "err": "error", "crit": "critical", "emerg": "emergency"}
+# Priority of manual migrations and of alerts without one
+MIGRATION_DEFAULT_PRIORITY = os.environ.get("CUBEMIG_MIGRATION_DEFAULT_PRIORITY", "Warning")
+if PRIORITY_ALIASES.get(MIGRATION_DEFAULT_PRIORITY.strip().lower(), MIGRATION_DEFAULT_PRIORITY.strip().lower()) not in FALCO_PRIORITIES:
+    print(f"Warning: CUBEMIG_MIGRATION_DEFAULT_PRIORITY '{MIGRATION_DEFAULT_PRIORITY}' is not a Falco priority, using 'Warning'")
+    MIGRATION_DEFAULT_PRIORITY = "Warning"
+
+# Seconds a pod stays suppressed after an alert triggered its migration
+ALERT_SUPPRESSION_WINDOW = int(os.environ.get("CUBEMIG_ALERT_SUPPRESSION_SECONDS", "900"))
+
+# Batched writer for alert.txt / event_log.txt
+LOG_SINK_BATCH_SIZE = int(os.environ.get("CUBEMIG_LOG_SINK_BATCH_SIZE", "256"))
+LOG_SINK_FLUSH_INTERVAL = float(os.environ.get("CUBEMIG_LOG_SINK_FLUSH_INTERVAL", "0.5"))
+LOG_SINK_MAX_OPEN_FILES = 64
+LOG_SINK_QUEUE_SIZE = 10000
+
+# Seconds between event loop lag probes, 0 disables them
+EVENT_LOOP_PROBE_INTERVAL = float(os.environ.get("CUBEMIG_EVENT_LOOP_PROBE_INTERVAL", "0.05"))
+
+# Traces of migration incidents in OTLP/JSON: a file, one export request per line, or an OTLP/HTTP
+# collector URL such as http://otel-collector:4318/v1/traces; empty only keeps them with the migration logs
+TRACE_EXPORT = os.environ.get("CUBEMIG_TRACE_EXPORT", "")
+TRACE_SERVICE_NAME = os.environ.get("CUBEMIG_TRACE_SERVICE_NAME", "cubemig-backend")
+
+# Parquet dataset of per-migration performance records (needs pyarrow), empty disables it
+PERF_STORE_DIR = os.environ.get("CUBEMIG_PERF_STORE_DIR", str(Path(__file__).parent.parent / "perf-store"))
+PERF_STORE_FLUSH_ROWS = int(os.environ.get("CUBEMIG_PERF_STORE_FLUSH_ROWS", "64"))
+PERF_STORE_FLUSH_INTERVAL = float(os.environ.get("CUBEMIG_PERF_STORE_FLUSH_INTERVAL", "30"))
+# Part files per partition before they are merged into one
+PERF_STORE_COMPACT_FILES = 16
+
+# Relative error of the percentiles of the analytics API. Each rollup row keeps the accuracy it was created with,
+# queries that merge rows of different accuracy re-bucket them and report the larger error bound
+ANALYTICS_RELATIVE_ACCURACY = float(os.environ.get("CUBEMIG_ANALYTICS_RELATIVE_ACCURACY", "0.01"))
+
+# SQLite registry of migration jobs, keep it on local disk (WAL does not work on NFS)
+MIGRATION_DB_PATH = os.environ.get("CUBEMIG_DB_PATH", str(Path(__file__).parent.parent / "migrations.db"))
+
+# Migration engine: "native" runs the in-process pipeline, "script" shells out to single-migration.sh
+MIGRATION_ENGINE = os.environ.get("CUBEMIG_MIGRATION_ENGINE", "native")
+KUBE_PKI_DIR = "/home/ubuntu/.kube/pki"
+KUBELET_PORT = 10250
+CHECKPOINT_NFS_ROOT = os.environ.get("CUBEMIG_CHECKPOINT_NFS_ROOT", "/home/ubuntu/nfs/checkpoints")
+# Where the kubelet writes checkpoints on the node; every node's directory is mounted at CHECKPOINT_NFS_ROOT/<node>
+KUBELET_CHECKPOINT_DIR = "/var/lib/kubelet/checkpoints"
+# JSON object of node name to mount directory for nodes that do not follow that layout
+CHECKPOINT_MOUNTS = json.loads(os.environ.get("CUBEMIG_CHECKPOINT_MOUNTS", "{}"))
+# Seconds to wait for a new checkpoint to become visible on NFS
+CHECKPOINT_WAIT_TIMEOUT = float(os.environ.get("CUBEMIG_CHECKPOINT_WAIT_TIMEOUT", "10"))
+# The simulator serves the registry API next to the kube API
+REGISTRY = os.environ.get("CUBEMIG_REGISTRY", SIMULATOR_URL if SIMULATED else "10.0.0.180:5000")
+# Checkpoint images: "stream" pushes the checkpoint tar as an OCI layer directly, "buildah" uses local image storage
+IMAGE_BUILDER = os.environ.get("CUBEMIG_IMAGE_BUILDER", "stream")
+# Default compression of the checkpoint image layer: none, gzip[:level] or zstd[:level]
+CHECKPOINT_COMPRESSION = os.environ.get("CUBEMIG_CHECKPOINT_COMPRESSION", "none")
+# Without a configured compression the buildah pipeline keeps buildah's default (gzip)
+CHECKPOINT_COMPRESSION_CONFIGURED = "CUBEMIG_CHECKPOINT_COMPRESSION" in os.environ
+RESTORE_YAML_DIR = os.environ.get("CUBEMIG_RESTORE_YAML_DIR", str(Path(__file__).parents[4] / "scripts" / "migration" / "yaml")
+                                  if SIMULATED else "/home/ubuntu/meierm78/CubeMig/scripts/migration/yaml")
+FORENSIC_SCRIPT = "/home/ubuntu/meierm78/CubeMig/scripts/utils/forensic_analysis/forensic_analysis.sh"
+POD_READY_TIMEOUT = 300
+
+# OpenAI-compatible chat completions API for AI suggestions, point it at stubs/openai_stub.py for local runs
+AI_API_URL = os.environ.get("CUBEMIG_AI_URL", "https://api.groq.com/openai/v1/chat/completions")
+AI_MODEL = os.environ.get("CUBEMIG_AI_MODEL", "llama-3.3-70b-versatile")
+AI_TIMEOUT = float(os.environ.get("CUBEMIG_AI_TIMEOUT", "120"))
+AI_MAX_RETRIES = int(os.environ.get("CUBEMIG_AI_MAX_RETRIES", "3"))
+AI_MAX_CONCURRENCY = int(os.environ.get("CUBEMIG_AI_MAX_CONCURRENCY", "4"))
+# Estimated tokens of the forensic report sent to the model, 0 sends it without trimming
+AI_REPORT_TOKEN_BUDGET = int(os.environ.get("CUBEMIG_AI_REPORT_TOKEN_BUDGET", "6000"))
+
+# Checkpoint retention on NFS, enforced in the background; 0 disables a policy
+CHECKPOINT_RETENTION_INTERVAL = float(os.environ.get("CUBEMIG_CHECKPOINT_RETENTION_INTERVAL", "60"))
+CHECKPOINT_KEEP_PER_APP = int(os.environ.get("CUBEMIG_CHECKPOINT_KEEP_PER_APP", "5"))
+CHECKPOINT_MAX_AGE_HOURS = float(os.environ.get("CUBEMIG_CHECKPOINT_MAX_AGE_HOURS", "0"))
+CHECKPOINT_MAX_GB = float(os.environ.get("CUBEMIG_CHECKPOINT_MAX_GB", "0"))
+
+# Content-addressed cache of forensic reports and AI suggestions; a size of 0 disables it
+RESULT_CACHE_DIR = os.environ.get("CUBEMIG_RESULT_CACHE_DIR", str(Path(__file__).parent.parent / "result-cache"))
+RESULT_CACHE_MAX_MB = float(os.environ.get("CUBEMIG_RESULT_CACHE_MAX_MB", "512"))
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+from utils.constants import ALERT_SUPPRESSION_WINDOW
+
+DedupKey = Tuple[str, str, str]  # (cluster, namespace, pod)
+
+@dataclass
+class DedupEntry:
+    claimed_at: float
+    expires_at: float
+    coalesced: int = 0
+
+class AlertDedupStore:
+    """Suppresses repeated migration triggers for the same pod.
+
+    A key stays claimed until the migration releases it or the suppression
+    window runs out, whichever comes first. Entries are kept in claim order,
+    so stale ones are purged from the front without scanning the rest.
+    """
+
+    def __init__(self, window_seconds: float = ALERT_SUPPRESSION_WINDOW):
+        self.window_seconds = window_seconds
+        self._entries: "OrderedDict[DedupKey, DedupEntry]" = OrderedDict()
+        self.claimed = 0
+        self.coalesced = 0
+        self.expired = 0
+
+    def claim(self, key: DedupKey) -> bool:
+        """Claim a key; returns False and counts the alert as coalesced if it is already claimed"""
+        now = time.monotonic()
+        self.purge_expired(now)
+        entry = self._entries.get(key)
+        if entry is not None:
+            entry.coalesced += 1
+            self.coalesced += 1
+            return False
+        self._entries[key] = DedupEntry(claimed_at=now, expires_at=now + self.window_seconds)
+        self.claimed += 1
+        return True
+
+    def release(self, key: DedupKey) -> Optional[DedupEntry]:
+        """Clear a key once its migration has finished or failed"""
+        return self._entries.pop(key, None)
+
+    def is_claimed(self, key: DedupKey) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry.expires_at > time.monotonic()
+
+    def purge_expired(self, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            self._entries.popitem(last=False)
+            self.expired += 1
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        self.purge_expired(now)
+        return {
+            "window_seconds": self.window_seconds,
+            "active": len(self._entries),
+            "claimed": self.claimed,
+            "coalesced": self.coalesced,
+            "expired": self.expired,
+            "entries": [
+                {
+                    "cluster": key[0],
+                    "namespace": key[1],
+                    "pod": key[2],
+                    "age_seconds": round(now - entry.claimed_at, 1),
+                    "coalesced": entry.coalesced,
+                }
+                for key, entry in self._entries.items()
+            ],
+        }
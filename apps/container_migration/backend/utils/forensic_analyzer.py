@@ -0,0 +1,417 @@
+"""Forensic analysis of CRI-O checkpoint archives in a single pass.
+
+Replaces the four checkpointctl runs and the full extraction done by
+forensic_analysis.sh. The archive's headers are read once, then only the
+small CRIU images (pstree, core, mm, pagemap, files, fdinfo, stats) and the
+memory pages holding the process arguments are read, by seeking into the
+uncompressed tar. rootfs-diff.tar is listed in place without extracting it.
+
+Usage: python -m utils.forensic_analyzer <checkpoint.tar> <output_dir>
+"""
+import json
+import os
+import socket
+import struct
+import sys
+import tarfile
+import time
+from typing import Dict, List, Optional
+
+# Bumped whenever the report changes, cached reports of older versions are not reused
+FORENSIC_ANALYZER_VERSION = 1
+
+IMG_COMMON_MAGIC = 0x54564319
+IMG_SERVICE_MAGIC = 0x55105940
+PAGE_SIZE = 4096
+
+# pagemap_entry.flags
+PE_PRESENT = 1 << 2
+
+# file_entry.type (fd_types)
+FD_TYPES = {1: "REG", 2: "PIPE", 3: "FIFO", 4: "INETSK", 5: "UNIXSK", 6: "EVENTFD", 7: "EVENTPOLL", 8: "INOTIFY",
+            9: "SIGNALFD", 10: "PACKETSK", 11: "TTY", 12: "FANOTIFY", 13: "NETLINKSK", 14: "NS", 15: "TUNF",
+            16: "EXT", 17: "TIMERFD", 18: "MEMFD", 19: "BPFMAP"}
+TCP_STATES = {1: "ESTABLISHED", 2: "SYN_SENT", 3: "SYN_RECV", 4: "FIN_WAIT1", 5: "FIN_WAIT2", 6: "TIME_WAIT",
+              7: "CLOSE", 8: "CLOSE_WAIT", 9: "LAST_ACK", 10: "LISTEN", 11: "CLOSING"}
+PROTOCOLS = {6: "TCP", 17: "UDP", 136: "UDPLITE"}
+SOCKET_TYPES = {1: "STREAM", 2: "DGRAM", 5: "SEQPACKET"}
+
+class ProtobufMessage:
+    """Decoded protobuf wire data: field number to the list of raw values (ints for varint/fixed, bytes otherwise)"""
+
+    def __init__(self, data: bytes):
+        self.fields: Dict[int, list] = {}
+        offset = 0
+        while offset < len(data):
+            key, offset = _varint(data, offset)
+            number, wire_type = key >> 3, key & 7
+            if wire_type == 0:
+                value, offset = _varint(data, offset)
+            elif wire_type == 1:
+                value = struct.unpack_from("<Q", data, offset)[0]
+                offset += 8
+            elif wire_type == 2:
+                length, offset = _varint(data, offset)
+                value = data[offset:offset + length]
+                offset += length
+            elif wire_type == 5:
+                value = struct.unpack_from("<I", data, offset)[0]
+                offset += 4
+            else:
+                raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+            self.fields.setdefault(number, []).append(value)
+
+    def get(self, number: int, default=None):
+        values = self.fields.get(number)
+        return values[-1] if values else default
+
+    def string(self, number: int, default: str = "") -> str:
+        value = self.get(number)
+        return value.decode(errors="replace") if isinstance(value, bytes) else default
+
+    def message(self, number: int) -> Optional["ProtobufMessage"]:
+        value = self.get(number)
+        return ProtobufMessage(value) if isinstance(value, bytes) else None
+
+    def messages(self, number: int) -> List["ProtobufMessage"]:
+        return [ProtobufMessage(value) for value in self.fields.get(number, [])]
+
+    def ints(self, number: int) -> List[int]:
+        """Repeated scalar field, packed or not"""
+        values = []
+        for value in self.fields.get(number, []):
+            if isinstance(value, bytes):
+                offset = 0
+                while offset < len(value):
+                    item, offset = _varint(value, offset)
+                    values.append(item)
+            else:
+                values.append(value)
+        return values
+
+def _varint(data: bytes, offset: int):
+    result = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return result, offset
+        shift += 7
+
+def read_image(data: bytes) -> List[ProtobufMessage]:
+    """Split a CRIU image into its entries: magic(s), then a u32 size before every protobuf message"""
+    magic = struct.unpack_from("<I", data, 0)[0]
+    offset = 8 if magic in (IMG_COMMON_MAGIC, IMG_SERVICE_MAGIC) else 4
+    entries = []
+    while offset + 4 <= len(data):
+        size = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        entries.append(ProtobufMessage(data[offset:offset + size]))
+        offset += size
+    return entries
+
+def human_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_address(family: int, words: List[int]) -> str:
+    if not words:
+        return "*"
+    packed = struct.pack(f"<{len(words)}I", *words)
+    try:
+        return socket.inet_ntop(socket.AF_INET6 if family == socket.AF_INET6 else socket.AF_INET, packed)
+    except ValueError:
+        return packed.hex()
+
+class CheckpointArchive:
+    """Random access to the members of an uncompressed checkpoint tar"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tar = tarfile.open(path, "r:")
+        # Reading the headers seeks over the member data, memory pages are never read here
+        self.members = {member.name[2:] if member.name.startswith("./") else member.name: member
+                        for member in self._tar.getmembers()}
+
+    def close(self):
+        self._tar.close()
+
+    def has(self, name: str) -> bool:
+        return name in self.members
+
+    def read(self, name: str) -> bytes:
+        return self._tar.extractfile(self.members[name]).read()
+
+    def read_at(self, name: str, offset: int, length: int) -> bytes:
+        file = self._tar.extractfile(self.members[name])
+        file.seek(offset)
+        return file.read(length)
+
+    def image(self, name: str) -> List[ProtobufMessage]:
+        return read_image(self.read(f"checkpoint/{name}")) if self.has(f"checkpoint/{name}") else []
+
+    def json(self, name: str) -> dict:
+        return json.loads(self.read(name)) if self.has(name) else {}
+
+    def size(self, prefix: str = "") -> int:
+        return sum(member.size for name, member in self.members.items() if name.startswith(prefix))
+
+class ForensicAnalyzer:
+    def __init__(self, checkpoint_file: str):
+        self.archive = CheckpointArchive(checkpoint_file)
+        self.checkpoint_file = checkpoint_file
+
+    def close(self):
+        self.archive.close()
+
+    def analyze(self) -> dict:
+        processes = self._processes()
+        return {
+            "checkpoint": self._container_info(),
+            "processes": processes,
+            "changed_files": self._changed_files(),
+            "stats": self.dump_stats(),
+        }
+
+    def _container_info(self) -> dict:
+        config = self.archive.json("config.dump")
+        spec = self.archive.json("spec.dump")
+        annotations = spec.get("annotations", {})
+        pages = sum(member.size for name, member in self.archive.members.items()
+                    if name.startswith("checkpoint/pages-") and name.endswith(".img"))
+        return {
+            "name": annotations.get("io.kubernetes.container.name") or config.get("name"),
+            "pod": annotations.get("io.kubernetes.pod.name"),
+            "namespace": annotations.get("io.kubernetes.pod.namespace"),
+            "image": config.get("rootfsImageName") or config.get("rootfsImage"),
+            "image_ref": config.get("rootfsImageRef"),
+            "id": config.get("id"),
+            "runtime": config.get("ociRuntime") or config.get("runtime"),
+            "created": config.get("createdTime"),
+            "checkpointed": config.get("checkpointedTime"),
+            "engine": "CRI-O" if annotations.get("io.container.manager") == "cri-o" or "io.kubernetes.cri-o.Created" in annotations else annotations.get("io.container.manager", "unknown"),
+            "ip": annotations.get("io.kubernetes.cri-o.IP.0"),
+            "checkpoint_size": self.archive.size("checkpoint/"),
+            "memory_pages_size": pages,
+            "rootfs_diff_size": self.archive.members["rootfs-diff.tar"].size if self.archive.has("rootfs-diff.tar") else 0,
+        }
+
+    def _processes(self) -> List[dict]:
+        files = self._files()
+        processes = []
+        for entry in self.archive.image("pstree.img"):
+            pid = entry.get(1)
+            core = (self.archive.image(f"core-{pid}.img") or [None])[0]
+            task_core = core.message(3) if core else None
+            ids = core.message(4) if core else None
+            # CRIU names mm images by pid, not by the vm id of the task's ids
+            mm = (self.archive.image(f"mm-{pid}.img") or [None])[0]
+            pagemap = self.archive.image(f"pagemap-{pid}.img")
+            process = {
+                "pid": pid,
+                "ppid": entry.get(2),
+                "pgid": entry.get(3),
+                "sid": entry.get(4),
+                "threads": entry.ints(5),
+                "comm": task_core.string(6) if task_core else "",
+                "cmdline": self._cmdline(mm, pagemap) if mm else "",
+                "memory_size": self._memory_size(pagemap),
+                "files": [],
+                "sockets": [],
+            }
+            fd_entries = self.archive.image(f"fdinfo-{ids.get(2)}.img") if ids and ids.get(2) is not None else []
+            for fd_entry in fd_entries:
+                file = files.get(fd_entry.get(1))
+                if file is None:
+                    continue
+                opened = {"fd": fd_entry.get(4), **file}
+                if file["type"] in ("INETSK", "UNIXSK"):
+                    process["sockets"].append(opened)
+                else:
+                    process["files"].append(opened)
+            processes.append(process)
+        return processes
+
+    def _files(self) -> Dict[int, dict]:
+        """File id to a description; files.img since CRIU 3.15, separate per-type images before"""
+        files = {}
+        for entry in self.archive.image("files.img"):
+            file_type = FD_TYPES.get(entry.get(1), str(entry.get(1)))
+            description = {"type": file_type}
+            if file_type == "REG" and entry.message(3):
+                description["path"] = entry.message(3).string(6)
+            elif file_type == "INETSK" and entry.message(4):
+                description.update(self._inet_socket(entry.message(4)))
+            elif file_type == "UNIXSK" and entry.message(16):
+                description.update(self._unix_socket(entry.message(16)))
+            elif file_type == "PIPE" and entry.message(18):
+                description["pipe_id"] = entry.message(18).get(2)
+            files[entry.get(2)] = description
+        for entry in self.archive.image("reg-files.img"):
+            files.setdefault(entry.get(1), {"type": "REG", "path": entry.string(6)})
+        for entry in self.archive.image("inetsk.img"):
+            files.setdefault(entry.get(1), {"type": "INETSK", **self._inet_socket(entry)})
+        for entry in self.archive.image("unixsk.img"):
+            files.setdefault(entry.get(1), {"type": "UNIXSK", **self._unix_socket(entry)})
+        return files
+
+    def _inet_socket(self, entry: ProtobufMessage) -> dict:
+        family = entry.get(3)
+        protocol = PROTOCOLS.get(entry.get(5), str(entry.get(5)))
+        state = TCP_STATES.get(entry.get(6), str(entry.get(6))) if protocol == "TCP" else ("UNCONN" if entry.get(6) == 7 else TCP_STATES.get(entry.get(6), str(entry.get(6))))
+        return {
+            "protocol": protocol,
+            "family": "IPv6" if family == socket.AF_INET6 else "IPv4",
+            "state": state,
+            "source": f"{format_address(family, entry.ints(11))}:{entry.get(7)}",
+            "destination": f"{format_address(family, entry.ints(12))}:{entry.get(8)}",
+        }
+
+    def _unix_socket(self, entry: ProtobufMessage) -> dict:
+        name = entry.get(11) or b""
+        return {
+            "protocol": "UNIX",
+            "socket_type": SOCKET_TYPES.get(entry.get(3), str(entry.get(3))),
+            "state": TCP_STATES.get(entry.get(4), str(entry.get(4))),
+            "name": name.replace(b"\0", b"@").decode(errors="replace"),
+        }
+
+    def _present_pages(self, pagemap: List[ProtobufMessage]):
+        """Yield (vaddr, nr_pages, index of the first page in pages-<id>.img) for pages stored in this dump"""
+        index = 0
+        for entry in pagemap[1:]:
+            flags = entry.get(4)
+            present = bool(flags & PE_PRESENT) if flags is not None else not entry.get(3)
+            if present:
+                yield entry.get(1), entry.get(2), index
+                index += entry.get(2)
+
+    def _memory_size(self, pagemap: List[ProtobufMessage]) -> int:
+        return sum(nr_pages for _, nr_pages, _ in self._present_pages(pagemap)) * PAGE_SIZE
+
+    def _read_memory(self, pagemap: List[ProtobufMessage], address: int, length: int) -> bytes:
+        if not pagemap:
+            return b""
+        pages_file = f"checkpoint/pages-{pagemap[0].get(1)}.img"
+        if not self.archive.has(pages_file):
+            return b""
+        regions = list(self._present_pages(pagemap))
+        data = b""
+        while length > 0:
+            for vaddr, nr_pages, index in regions:
+                if vaddr <= address < vaddr + nr_pages * PAGE_SIZE:
+                    chunk = min(length, vaddr + nr_pages * PAGE_SIZE - address)
+                    data += self.archive.read_at(pages_file, index * PAGE_SIZE + address - vaddr, chunk)
+                    address += chunk
+                    length -= chunk
+                    break
+            else:
+                break
+        return data
+
+    def _cmdline(self, mm: ProtobufMessage, pagemap: List[ProtobufMessage]) -> str:
+        arg_start, arg_end = mm.get(8) or 0, mm.get(9) or 0
+        if not arg_start or arg_end <= arg_start or arg_end - arg_start > 128 * 1024:
+            return ""
+        argv = self._read_memory(pagemap, arg_start, arg_end - arg_start)
+        return " ".join(arg.decode(errors="replace") for arg in argv.split(b"\0") if arg)
+
+    def _changed_files(self) -> List[str]:
+        if not self.archive.has("rootfs-diff.tar"):
+            return []
+        with self.archive._tar.extractfile(self.archive.members["rootfs-diff.tar"]) as file:
+            with tarfile.open(fileobj=file, mode="r:") as diff:
+                return [member.name for member in diff]
+
+    def dump_stats(self) -> dict:
+        """CRIU dump statistics from stats-dump, times in microseconds"""
+        name = "stats-dump" if self.archive.has("stats-dump") else "checkpoint/stats-dump"
+        if not self.archive.has(name):
+            return {}
+        entries = read_image(self.archive.read(name))
+        dump = entries[0].message(1) if entries else None
+        if dump is None:
+            return {}
+        return {
+            "freezing_time": dump.get(1), "frozen_time": dump.get(2), "memdump_time": dump.get(3), "memwrite_time": dump.get(4),
+            "pages_scanned": dump.get(5), "pages_skipped_parent": dump.get(6), "pages_written": dump.get(7),
+        }
+
+def render_report(checkpoint_file: str, analysis: dict) -> str:
+    """Text report with the sections of forensic_analysis.sh"""
+    info = analysis["checkpoint"]
+    processes = analysis["processes"]
+    lines = ["----- Checkpoint information -----",
+             f"Displaying container checkpoint tree view from {checkpoint_file}", "",
+             info["name"] or "container"]
+    details = [("Image", info["image"]), ("ID", info["id"]), ("Runtime", info["runtime"]), ("Created", info["created"]),
+               ("Checkpointed", info["checkpointed"]), ("Engine", info["engine"]), ("IP", info["ip"])]
+    for label, value in details:
+        if value:
+            lines.append(f"├── {label}: {value}")
+    lines.append(f"├── Checkpoint size: {human_size(info['checkpoint_size'])}")
+    lines.append(f"│   └── Memory pages size: {human_size(info['memory_pages_size'])}")
+    lines.append(f"└── Root FS diff size: {human_size(info['rootfs_diff_size'])}")
+
+    lines.append("----- Process tree -----")
+    lines.append("Process tree")
+    children: Dict[int, List[dict]] = {}
+    pids = {process["pid"] for process in processes}
+    for process in processes:
+        children.setdefault(process["ppid"] if process["ppid"] in pids else None, []).append(process)
+
+    def tree(parent, prefix):
+        nodes = children.get(parent, [])
+        for i, process in enumerate(nodes):
+            last = i == len(nodes) - 1
+            lines.append(f"{prefix}{'└── ' if last else '├── '}[{process['pid']}]  {process['cmdline'] or process['comm']}")
+            tree(process["pid"], prefix + ("    " if last else "│   "))
+    tree(None, "")
+
+    lines.append("----- Open sockets -----")
+    for process in processes:
+        if not process["sockets"]:
+            continue
+        lines.append(f"[{process['pid']}]  {process['comm']}")
+        for i, sock in enumerate(process["sockets"]):
+            branch = "└── " if i == len(process["sockets"]) - 1 else "├── "
+            if sock["protocol"] == "UNIX":
+                lines.append(f"    {branch}[UNIX ({sock['state']})] {sock['name'] or '(unnamed)'}")
+            else:
+                lines.append(f"    {branch}[{sock['protocol']} ({sock['state']})] {sock['source']} -> {sock['destination']}")
+
+    lines.append("----- Memory size -----")
+    lines.append(f"{'PID':>6} | {'PROCESS NAME':<20} | MEMORY SIZE")
+    for process in processes:
+        lines.append(f"{process['pid']:>6} | {process['comm']:<20} | {human_size(process['memory_size'])}")
+
+    lines.append("----- Changed files -----")
+    lines.extend(analysis["changed_files"])
+    return "\n".join(lines) + "\n"
+
+def analyze_checkpoint(checkpoint_file: str, output_dir: str) -> dict:
+    """Write forensic_report.txt and forensic_report.json to output_dir, returns the analysis"""
+    started = time.monotonic()
+    analyzer = ForensicAnalyzer(checkpoint_file)
+    try:
+        analysis = analyzer.analyze()
+    finally:
+        analyzer.close()
+    analysis["analysis_time_ms"] = round((time.monotonic() - started) * 1000, 1)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "forensic_report.txt"), "a") as file:
+        file.write(render_report(checkpoint_file, analysis))
+    with open(os.path.join(output_dir, "forensic_report.json"), "w") as file:
+        json.dump(analysis, file, indent=2)
+    return analysis
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(f"Usage: {sys.argv[0]} <path_to_checkpoint_file> <output_dir>")
+        sys.exit(1)
+    result = analyze_checkpoint(sys.argv[1], sys.argv[2])
+    print(f"Forensic report written to {sys.argv[2]} in {result['analysis_time_ms']} ms")
@@ -1,17 +1,23 @@
+from typing import Optional
 from kubernetes import client, config
-from utils.constants import CLUSTER_1, CLUSTER_2, CLUSTER_SEV_SNP
+from utils.constants import CLUSTER_1, CLUSTER_2, CLUSTER_SEV_SNP, SIMULATED, SIMULATOR_URL
 
 class K8sClient:
-    def __init__(self, kube_config_path: str):
-        config.load_kube_config(config_file=kube_config_path)
-        self.client1 = client.CoreV1Api(
-            api_client=config.new_client_from_config(context=CLUSTER_1))
-        self.client2 = client.CoreV1Api(
-            api_client=config.new_client_from_config(context=CLUSTER_2))
-        self.client_sev_snp = client.CoreV1Api(
-            api_client=config.new_client_from_config(context=CLUSTER_SEV_SNP))
+    def __init__(self, kube_config_path: str, simulator_url: Optional[str] = None):
+        self.simulator_url = simulator_url
+        if simulator_url is None:
+            config.load_kube_config(config_file=kube_config_path)
+        self.client1 = client.CoreV1Api(api_client=self._new_api_client(CLUSTER_1))
+        self.client2 = client.CoreV1Api(api_client=self._new_api_client(CLUSTER_2))
+        self.client_sev_snp = client.CoreV1Api(api_client=self._new_api_client(CLUSTER_SEV_SNP))
         self.active_client = self.client1
 
+    def _new_api_client(self, context: str) -> client.ApiClient:
+        if self.simulator_url is None:
+            return config.new_client_from_config(context=context)
+        # stubs/cluster_simulator.py serves the API of every cluster below /clusters/<name>
+        return client.ApiClient(client.Configuration(host=f"{self.simulator_url}/clusters/{context}"))
+
     def get_client(self, target_cluster: str):
         if target_cluster == CLUSTER_1:
             return self.client1
@@ -22,4 +28,8 @@ class K8sClient:
         else:
             raise ValueError(f"Invalid cluster choice: {target_cluster}")
 
-k8s_client = K8sClient('/home/ubuntu/.kube/config')
\ No newline at end of file
+    def get_api_client(self, target_cluster: str):
+        """Shared ApiClient of a cluster, for APIs other than CoreV1"""
+        return self.get_client(target_cluster).api_client
+
+k8s_client = K8sClient('/home/ubuntu/.kube/config', SIMULATOR_URL if SIMULATED else None)
@@ -0,0 +1,120 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from utils.constants import LOG_SINK_BATCH_SIZE, LOG_SINK_FLUSH_INTERVAL, LOG_SINK_MAX_OPEN_FILES, LOG_SINK_QUEUE_SIZE
+
+# (path, text, header written first when the file is new)
+LogRecord = Tuple[str, str, Optional[str]]
+
+class LogSink:
+    """Background writer for the Falco alert and event logs.
+
+    Request handlers only enqueue records. A single task collects them into
+    batches, flushed when the batch is full or the flush interval has passed,
+    and writes each batch in a worker thread through cached file handles, so
+    disk or NFS latency never blocks the event loop.
+    """
+
+    def __init__(self, batch_size: int = LOG_SINK_BATCH_SIZE, flush_interval: float = LOG_SINK_FLUSH_INTERVAL,
+                 max_open_files: int = LOG_SINK_MAX_OPEN_FILES, queue_size: int = LOG_SINK_QUEUE_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_open_files = max_open_files
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._handles: "OrderedDict[str, object]" = OrderedDict()
+        self._known_dirs = set()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued and close the file handles"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        batch = []
+        while not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        if batch:
+            await asyncio.to_thread(self._write_batch, batch)
+        await asyncio.to_thread(self._close_all)
+
+    def write(self, path: str, text: str, header: Optional[str] = None):
+        """Queue a line for `path` without blocking; drops the record if the queue is full"""
+        try:
+            self._queue.put_nowait((path, text, header))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                print(f"Error writing log batch: {str(e)}")
+
+    def _write_batch(self, batch: List[LogRecord]):
+        grouped: "OrderedDict[str, list]" = OrderedDict()
+        headers = {}
+        for path, text, header in batch:
+            grouped.setdefault(path, []).append(text)
+            if header is not None:
+                headers.setdefault(path, header)
+        for path, lines in grouped.items():
+            handle = self._handle(path)
+            if path in headers and handle.tell() == 0:
+                handle.write(headers[path])
+            handle.write("".join(lines))
+            handle.flush()
+        self.written += len(batch)
+        self.batches += 1
+
+    def _handle(self, path: str):
+        handle = self._handles.get(path)
+        if handle is not None:
+            self._handles.move_to_end(path)
+            return handle
+        directory = os.path.dirname(path)
+        if directory not in self._known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+        handle = open(path, "a")
+        self._handles[path] = handle
+        if len(self._handles) > self.max_open_files:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        return handle
+
+    def _close_all(self):
+        while self._handles:
+            _, handle = self._handles.popitem()
+            handle.close()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "open_files": len(self._handles),
+        }
+
+log_sink = LogSink()
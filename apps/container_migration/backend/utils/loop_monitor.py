@@ -0,0 +1,64 @@
+import asyncio
+import math
+from collections import deque
+from typing import Deque, List, Optional
+from utils.constants import EVENT_LOOP_PROBE_INTERVAL
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of unsorted values, None when there are none"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)) - 1, 0)]
+
+class EventLoopMonitor:
+    """Measures event loop lag, how much later than scheduled a periodic timer wakes up.
+
+    Anything that blocks the loop (file I/O, JSON parsing of large bodies,
+    CPU-bound work outside to_thread) delays every request by that much.
+    """
+
+    def __init__(self, interval: float = EVENT_LOOP_PROBE_INTERVAL, window: int = 4096):
+        self.interval = interval
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._max = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - expected, 0) * 1000
+            self._samples.append(lag)
+            self._max = max(self._max, lag)
+
+    def reset(self):
+        self._samples.clear()
+        self._max = 0.0
+
+    def stats(self) -> dict:
+        samples = list(self._samples)
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": len(samples),
+            "p50_ms": round(percentile(samples, 50) or 0, 2),
+            "p95_ms": round(percentile(samples, 95) or 0, 2),
+            "p99_ms": round(percentile(samples, 99) or 0, 2),
+            "max_ms": round(self._max, 2),
+        }
+
+event_loop_monitor = EventLoopMonitor()
@@ -0,0 +1,170 @@
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.constants import CLUSTER_1, CLUSTER_2
+from utils.migration_store import migration_store
+from utils.migration_util import parse_performance_summary
+
+STEP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+CRIU_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+AI_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+MIGRATION_LABELS = ("app", "source_cluster", "target_cluster", "namespace")
+
+# performance_summary.txt line -> phase label, as written by the engine and single-migration.sh
+CRIU_FIELDS = {"Freezing Time": "freezing", "Frozen Time": "frozen", "Memdump Time": "memdump", "Memwrite Time": "memwrite"}
+AI_FIELDS = {"Queue Time": "queue", "Prompt Time": "prompt", "Completion Time": "completion", "Total Time": "total"}
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{escape_label(str(value))}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues: Tuple[str, ...]) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {labelvalues}")
+        return tuple("" if value is None else str(value) for value in labelvalues)
+
+    def lines(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        return "".join(f"{line}\n" for line in [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.lines()])
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def lines(self) -> List[str]:
+        with self._lock:
+            return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in self._values.items()]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labelvalues: str):
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = STEP_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # label values -> (count per bucket, sum)
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], float]] = {}
+
+    def observe(self, value: float, *labelvalues: str):
+        key = self._key(labelvalues)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * len(self.buckets), 0.0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    def lines(self) -> List[str]:
+        lines = []
+        with self._lock:
+            for key, (counts, total) in self._values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{format_labels((*self.labelnames, 'le'), (*key, format_value(bound)))} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+                lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class MigrationMetrics:
+    """Alert and migration metrics for Prometheus.
+
+    Step durations are taken from report_step, so both the native engine and
+    single-migration.sh are covered. CRIU and AI timings are read from
+    performance_summary.txt when a migration finishes.
+    """
+
+    def __init__(self):
+        self.alerts = Counter("cubemig_alerts_total", "Falco alerts received by outcome", ("result",))
+        self.migrations = Counter("cubemig_migrations_total", "Finished migrations by result", ("result", *MIGRATION_LABELS))
+        self.steps = Histogram("cubemig_migration_step_duration_seconds", "Duration of migration steps",
+                               ("step", *MIGRATION_LABELS), STEP_BUCKETS)
+        self.criu = Histogram("cubemig_criu_dump_duration_seconds", "CRIU dump times reported by checkpointctl",
+                              ("phase", *MIGRATION_LABELS), CRIU_BUCKETS)
+        self.ai = Histogram("cubemig_ai_suggestion_duration_seconds", "AI suggestion times reported by the LLM API",
+                            ("phase", *MIGRATION_LABELS), AI_BUCKETS)
+        self.queue_depth = Gauge("cubemig_migration_queue_depth", "Migrations waiting for a worker")
+        self.running = Gauge("cubemig_migrations_running", "Migrations being run by a worker")
+        self.metrics = [self.alerts, self.migrations, self.steps, self.criu, self.ai, self.queue_depth, self.running]
+        self._started: Dict[Tuple[int, str], float] = {}
+        self._labels: Dict[int, Tuple[str, ...]] = {}
+
+    def labels(self, migration_id: int) -> Tuple[str, ...]:
+        """app, source and target cluster and namespace of a migration, read from the registry once"""
+        if migration_id not in self._labels:
+            migration = migration_store.get(migration_id) or {}
+            self._labels[migration_id] = (migration.get("app") or "", migration.get("source_cluster") or CLUSTER_1,
+                                          migration.get("target_cluster") or CLUSTER_2, migration.get("namespace") or "default")
+        return self._labels[migration_id]
+
+    def step(self, migration_id: int, step: str, phase: str, timestamp: float):
+        if phase == "start":
+            self._started[(migration_id, step)] = timestamp
+            return
+        started = self._started.pop((migration_id, step), None)
+        if started is not None:
+            self.steps.observe(max(timestamp - started, 0), step, *self.labels(migration_id))
+
+    def migration_finished(self, migration_id: int, log_path: Optional[str], success: bool):
+        labels = self.labels(migration_id)
+        self.migrations.inc("done" if success else "failed", *labels)
+        if log_path:
+            self._observe_summary(os.path.join(log_path, "performance_summary.txt"), labels)
+        self._labels.pop(migration_id, None)
+        for key in [key for key in self._started if key[0] == migration_id]:
+            del self._started[key]
+
+    def _observe_summary(self, path: str, labels: Tuple[str, ...]):
+        try:
+            with open(path, "r") as file:
+                sections = parse_performance_summary(file.read())
+        except OSError:
+            return
+        for histogram, section, fields in ((self.criu, "CRIU dump performance", CRIU_FIELDS), (self.ai, "AI generation performance", AI_FIELDS)):
+            for name, milliseconds in sections.get(section, {}).items():
+                # Not measured, e.g. an AI suggestion taken from the cache
+                if name in fields and milliseconds > 0:
+                    histogram.observe(milliseconds / 1000, fields[name], *labels)
+
+    def render(self, queue_stats: Optional[dict] = None) -> str:
+        if queue_stats is not None:
+            self.queue_depth.set(queue_stats.get("queue_depth", 0))
+            self.running.set(queue_stats.get("running", 0))
+        return "".join(metric.render() for metric in self.metrics)
+
+migration_metrics = MigrationMetrics()
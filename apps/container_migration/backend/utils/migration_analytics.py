@@ -0,0 +1,267 @@
+import json
+import math
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from utils.constants import MIGRATION_DB_PATH, ANALYTICS_RELATIVE_ACCURACY
+from utils.migration_store import MIGRATION_STEPS, migration_store, step_durations
+
+# Step names of the rollups: the migration steps, plus the wait for a worker and the checkpoint-to-ready total
+ANALYTICS_STEPS = ("wait", *MIGRATION_STEPS, "total")
+GROUP_COLUMNS = {"app": ("app",), "cluster_pair": ("source_cluster", "target_cluster"), "namespace": ("namespace",)}
+GRANULARITIES = {"hour": 3600, "day": 86400}
+# Ranges longer than this are answered from the daily rollups
+HOURLY_RANGE_LIMIT = 31 * 86400
+# Durations below 1 µs are counted as 1 µs
+MIN_DURATION_MS = 0.001
+# Accuracy of rollup rows written before it was stored per row
+LEGACY_RELATIVE_ACCURACY = 0.01
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS migration_rollups (
+    granularity TEXT NOT NULL,
+    bucket_start REAL NOT NULL,
+    app TEXT NOT NULL,
+    source_cluster TEXT NOT NULL,
+    target_cluster TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    result TEXT NOT NULL,
+    step TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    sum_ms REAL NOT NULL,
+    min_ms REAL NOT NULL,
+    max_ms REAL NOT NULL,
+    histogram TEXT NOT NULL,
+    relative_accuracy REAL NOT NULL DEFAULT 0.01,
+    PRIMARY KEY (granularity, bucket_start, app, source_cluster, target_cluster, namespace, result, step)
+);
+CREATE INDEX IF NOT EXISTS idx_rollups_step ON migration_rollups (granularity, step, bucket_start);
+CREATE TABLE IF NOT EXISTS migration_rollups_applied (
+    migration_id INTEGER PRIMARY KEY
+);
+"""
+
+class LogHistogram:
+    """Histogram with logarithmic buckets, mergeable and with a bounded relative error.
+
+    A value v > 0 lands in bucket ceil(log_gamma(v)), and every value in a
+    bucket is estimated by the same representative. Any quantile is then
+    within `relative_accuracy` of the true value. Memory depends only on the
+    spread of the values, not their number. Bucket indices only mean
+    something together with the accuracy they were computed with, so both
+    are stored. `error` is the bound of the quantiles, which grows beyond
+    `relative_accuracy` once histograms of different accuracy are merged.
+    """
+
+    def __init__(self, relative_accuracy: float = ANALYTICS_RELATIVE_ACCURACY, buckets: Optional[Dict[int, int]] = None):
+        self.relative_accuracy = relative_accuracy
+        self.error = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = dict(buckets or {})
+
+    @classmethod
+    def from_json(cls, text: str, relative_accuracy: float = ANALYTICS_RELATIVE_ACCURACY) -> "LogHistogram":
+        return cls(relative_accuracy, {int(index): count for index, count in json.loads(text).items()})
+
+    def to_json(self) -> str:
+        return json.dumps({str(index): count for index, count in sorted(self.buckets.items())}, separators=(",", ":"))
+
+    def add(self, value: float, count: int = 1):
+        index = math.ceil(math.log(max(value, MIN_DURATION_MS)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + count
+
+    def merge(self, other: "LogHistogram"):
+        if other.relative_accuracy == self.relative_accuracy:
+            for index, count in other.buckets.items():
+                self.buckets[index] = self.buckets.get(index, 0) + count
+            self.error = max(self.error, other.error)
+            return
+        # Indices of another accuracy are different buckets, re-bucket their representatives
+        for index, count in other.buckets.items():
+            self.add(other.value(index), count)
+        self.error = max(self.error, (1 + self.relative_accuracy) * (1 + other.error) - 1)
+
+    def value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Nearest-rank quantile, q in 0..100"""
+        total = sum(self.buckets.values())
+        if not total:
+            return None
+        rank = max(math.ceil(q / 100 * total), 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return self.value(index)
+        return self.value(max(self.buckets))
+
+def step_order(step: str) -> int:
+    return ANALYTICS_STEPS.index(step) if step in ANALYTICS_STEPS else len(ANALYTICS_STEPS)
+
+def summarize(count: int, sum_ms: float, min_ms: float, max_ms: float, histogram: LogHistogram, percentiles: Iterable[float]) -> dict:
+    stats = {"count": count, "mean_ms": round(sum_ms / count, 3) if count else None,
+             "min_ms": round(min_ms, 3), "max_ms": round(max_ms, 3)}
+    for q in percentiles:
+        value = histogram.quantile(q)
+        # The bucket representative may lie outside the observed range
+        stats[f"p{q:g}_ms"] = round(min(max(value, min_ms), max_ms), 3) if value is not None else None
+    return stats
+
+class MigrationAnalytics:
+    """Pre-aggregated step durations of finished migrations for the analytics API.
+
+    Each finished migration is added to hourly and daily rollup rows per app,
+    cluster pair, namespace, result and step. A row holds count, sum, min,
+    max and a LogHistogram. Queries merge rollup rows instead of scanning
+    migrations, so their cost depends on the time range and number of groups,
+    not on how many migrations have run. Migrations are applied exactly once,
+    tracked in migration_rollups_applied, so catch_up() can fill in whatever
+    finished while the rollups were not updated (e.g. history from before
+    they existed).
+    """
+
+    def __init__(self, db_path: str = MIGRATION_DB_PATH, relative_accuracy: float = ANALYTICS_RELATIVE_ACCURACY):
+        self.relative_accuracy = relative_accuracy
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(migration_rollups)")}
+        if "relative_accuracy" not in columns:
+            self._conn.execute("ALTER TABLE migration_rollups ADD COLUMN relative_accuracy REAL NOT NULL "
+                               f"DEFAULT {LEGACY_RELATIVE_ACCURACY}")
+
+    def record(self, migration: Optional[dict]) -> bool:
+        """Add a finished migration to the rollups; returns False if it was already applied or is not finished"""
+        if migration is None or migration.get("state") not in ("done", "failed"):
+            return False
+        finished_at = migration.get("finished_at") or time.time()
+        key = (migration.get("app") or "", migration.get("source_cluster") or "", migration.get("target_cluster") or "",
+               migration.get("namespace") or "default", migration["state"])
+        durations = step_durations(migration)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if self._conn.execute("INSERT OR IGNORE INTO migration_rollups_applied (migration_id) VALUES (?)",
+                                      (migration["id"],)).rowcount == 0:
+                    self._conn.execute("ROLLBACK")
+                    return False
+                for granularity, seconds in GRANULARITIES.items():
+                    bucket_start = finished_at // seconds * seconds
+                    for step, duration in durations.items():
+                        self._add(granularity, bucket_start, key, step, max(duration, 0))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def _add(self, granularity: str, bucket_start: float, key: tuple, step: str, duration: float):
+        params = (granularity, bucket_start, *key, step)
+        row = self._conn.execute(
+            "SELECT count, sum_ms, min_ms, max_ms, histogram, relative_accuracy FROM migration_rollups WHERE granularity = ? AND bucket_start = ? "
+            "AND app = ? AND source_cluster = ? AND target_cluster = ? AND namespace = ? AND result = ? AND step = ?",
+            params,
+        ).fetchone()
+        if row is None:
+            histogram = LogHistogram(self.relative_accuracy)
+            count, sum_ms, min_ms, max_ms = 0, 0.0, duration, duration
+        else:
+            # A row keeps the accuracy it was created with, a changed setting applies to new rows
+            histogram = LogHistogram.from_json(row["histogram"], row["relative_accuracy"])
+            count, sum_ms, min_ms, max_ms = row["count"], row["sum_ms"], row["min_ms"], row["max_ms"]
+        histogram.add(duration)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO migration_rollups (granularity, bucket_start, app, source_cluster, target_cluster, namespace, "
+            "result, step, count, sum_ms, min_ms, max_ms, histogram, relative_accuracy) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (*params, count + 1, sum_ms + duration, min(min_ms, duration), max(max_ms, duration), histogram.to_json(),
+             histogram.relative_accuracy),
+        )
+
+    def catch_up(self) -> int:
+        """Roll up finished migrations that are not in the rollups yet, returns how many were added"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM migrations WHERE state IN ('done', 'failed') "
+                "AND id NOT IN (SELECT migration_id FROM migration_rollups_applied) ORDER BY id"
+            ).fetchall()
+        return sum(self.record(migration_store.get(row["id"])) for row in rows)
+
+    def _rows(self, granularity: str, steps: List[str], since: Optional[float], until: Optional[float],
+              filters: Dict[str, Optional[str]], result: Optional[str]) -> List[sqlite3.Row]:
+        clauses = ["granularity = ?", f"step IN ({', '.join('?' for _ in steps)})"]
+        params: list = [granularity, *steps]
+        seconds = GRANULARITIES[granularity]
+        if since is not None:
+            # Buckets that start before `since` are included if `since` falls inside them
+            clauses.append("bucket_start > ?")
+            params.append(since - seconds)
+        if until is not None:
+            clauses.append("bucket_start < ?")
+            params.append(until)
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if result is not None:
+            clauses.append("result = ?")
+            params.append(result)
+        with self._lock:
+            return self._conn.execute(f"SELECT * FROM migration_rollups WHERE {' AND '.join(clauses)}", params).fetchall()
+
+    def _aggregate(self, rows: Iterable[sqlite3.Row], key) -> Dict[tuple, dict]:
+        groups: Dict[tuple, dict] = {}
+        for row in rows:
+            group = groups.get(key(row))
+            histogram = LogHistogram.from_json(row["histogram"], row["relative_accuracy"])
+            if group is None:
+                groups[key(row)] = {"count": row["count"], "sum_ms": row["sum_ms"], "min_ms": row["min_ms"],
+                                    "max_ms": row["max_ms"], "histogram": histogram}
+                continue
+            group["count"] += row["count"]
+            group["sum_ms"] += row["sum_ms"]
+            group["min_ms"] = min(group["min_ms"], row["min_ms"])
+            group["max_ms"] = max(group["max_ms"], row["max_ms"])
+            group["histogram"].merge(histogram)
+        return groups
+
+    def summary(self, steps: Optional[List[str]] = None, group_by: Tuple[str, ...] = ("app", "cluster_pair"),
+                since: Optional[float] = None, until: Optional[float] = None, filters: Optional[Dict[str, Optional[str]]] = None,
+                result: Optional[str] = "done", percentiles: Tuple[float, ...] = (50, 90, 95, 99)) -> dict:
+        """Count, mean, min, max and percentiles per group and step"""
+        steps = list(steps or ANALYTICS_STEPS)
+        columns = [column for name in group_by for column in GROUP_COLUMNS[name]]
+        granularity = "hour" if since is not None and (until or time.time()) - since <= HOURLY_RANGE_LIMIT else "day"
+        rows = self._rows(granularity, steps, since, until, filters or {}, result)
+        aggregated = self._aggregate(rows, lambda row: (*(row[column] for column in columns), row["step"]))
+        groups: Dict[tuple, dict] = {}
+        for (*values, step), group in sorted(aggregated.items(), key=lambda item: (item[0][:-1], step_order(item[0][-1]))):
+            entry = groups.setdefault(tuple(values), {**dict(zip(columns, values)), "steps": {}})
+            entry["steps"][step] = summarize(group["count"], group["sum_ms"], group["min_ms"], group["max_ms"], group["histogram"], percentiles)
+        accuracy = max((group["histogram"].error for group in aggregated.values()), default=self.relative_accuracy)
+        return {"granularity": granularity, "relative_accuracy": round(accuracy, 6), "groups": list(groups.values())}
+
+    def trend(self, step: str, interval: str = "day", group_by: Tuple[str, ...] = (), since: Optional[float] = None,
+              until: Optional[float] = None, filters: Optional[Dict[str, Optional[str]]] = None, result: Optional[str] = "done",
+              percentiles: Tuple[float, ...] = (50, 95)) -> dict:
+        """Per-interval statistics of one step, per group"""
+        if interval not in GRANULARITIES:
+            raise ValueError(f"Invalid interval '{interval}', use one of {', '.join(GRANULARITIES)}")
+        columns = [column for name in group_by for column in GROUP_COLUMNS[name]]
+        rows = self._rows(interval, [step], since, until, filters or {}, result)
+        aggregated = self._aggregate(rows, lambda row: (*(row[column] for column in columns), row["bucket_start"]))
+        series: Dict[tuple, dict] = {}
+        for (*values, bucket_start), group in sorted(aggregated.items(), key=lambda item: item[0]):
+            entry = series.setdefault(tuple(values), {**dict(zip(columns, values)), "points": []})
+            entry["points"].append({"bucket_start": bucket_start, **summarize(group["count"], group["sum_ms"], group["min_ms"],
+                                                                               group["max_ms"], group["histogram"], percentiles)})
+        accuracy = max((group["histogram"].error for group in aggregated.values()), default=self.relative_accuracy)
+        return {"step": step, "interval": interval, "relative_accuracy": round(accuracy, 6), "series": list(series.values())}
+
+migration_analytics = MigrationAnalytics()
@@ -0,0 +1,534 @@
+import asyncio
+import glob
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional
+import httpx
+import pytz
+import yaml
+from kubernetes import client, utils as k8s_utils
+from kubernetes.client.rest import ApiException
+from models.migration_info import MigrationInfo
+from utils.ai_suggestion import AI_MODEL, AI_PARAMETERS, SYSTEM_INSTRUCTION, ai_suggestion_service
+from utils.checkpoint_paths import checkpoint_path_from_response, wait_for_file
+from utils.checkpoint_retention import checkpoint_retention
+from utils.compression import Codec, get_codec
+from utils.constants import (CLUSTER_1, CLUSTER_2, KUBE_PKI_DIR, KUBELET_PORT, CHECKPOINT_NFS_ROOT, REGISTRY,
+                             IMAGE_BUILDER, CHECKPOINT_COMPRESSION, CHECKPOINT_COMPRESSION_CONFIGURED, AI_REPORT_TOKEN_BUDGET, RESTORE_YAML_DIR, FORENSIC_SCRIPT, POD_READY_TIMEOUT,
+                             CHECKPOINT_WAIT_TIMEOUT, SIMULATED, SIMULATOR_URL)
+from utils.forensic_analyzer import FORENSIC_ANALYZER_VERSION, ForensicAnalyzer, analyze_checkpoint
+from utils.k8s_client import k8s_client
+from utils.perf_store import performance_store
+from utils.oci_image import RegistryClient, push_checkpoint_layer, push_checkpoint_manifest
+from utils.migration_progress import report_step
+from utils.migration_store import migration_store
+from utils.migration_util import to_ms
+from utils.report_compactor import COMPACTOR_VERSION
+from utils.result_cache import cache_key, result_cache
+from utils.tracing import incident_tracer
+
+timezone = pytz.timezone('Europe/Berlin')
+
+class MigrationStepError(Exception):
+    def __init__(self, step: str, message: str):
+        super().__init__(f"{step}: {message}")
+        self.step = step
+
+@dataclass
+class MigrationContext:
+    migration_id: int
+    info: MigrationInfo
+    log_path: str
+    source_cluster: str
+    target_cluster: str
+    namespace: str
+    pod_name: str
+    app_name: Optional[str] = None
+    container_name: Optional[str] = None
+    node_name: Optional[str] = None
+    image: Optional[str] = None
+    checkpoint_file: Optional[str] = None
+    # sha256 of the checkpoint archive, known once the layer was streamed
+    checkpoint_digest: Optional[str] = None
+    restore_pod_name: Optional[str] = None
+    # Batches may hold several replicas of one container, each gets its own image tag and restore pod
+    image_tag: str = "checkpoint"
+    # Step durations in ms, keyed like the STEP names
+    timings: Dict[str, float] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.monotonic)
+
+    def log(self, message: str):
+        with open(os.path.join(self.log_path, "migration_log.txt"), "a") as file:
+            file.write(f"{message}\n")
+
+class MigrationEngine:
+    """In-process replacement for single-migration.sh.
+
+    Runs the same steps as the script, but talks to the clusters through the
+    shared K8sClient objects and to the kubelet through pooled HTTP clients,
+    so no step pays for a kubectl/curl start-up. Step timings are recorded
+    directly in the migration registry.
+    """
+
+    def __init__(self):
+        self._kubelet_clients: Dict[str, httpx.AsyncClient] = {}
+        self._registry: Optional[RegistryClient] = None
+
+    def kubelet_cert(self, cluster: str):
+        return (f"{KUBE_PKI_DIR}/{cluster}-apiserver-kubelet-client.crt",
+                f"{KUBE_PKI_DIR}/{cluster}-apiserver-kubelet-client.key")
+
+    def available(self, cluster: str) -> bool:
+        """The engine needs the kubelet client certificate of the source cluster"""
+        return SIMULATED or all(os.path.exists(path) for path in self.kubelet_cert(cluster))
+
+    def kubelet_client(self, cluster: str) -> httpx.AsyncClient:
+        if cluster not in self._kubelet_clients:
+            if SIMULATED:
+                self._kubelet_clients[cluster] = httpx.AsyncClient(timeout=httpx.Timeout(POD_READY_TIMEOUT, connect=10))
+            else:
+                # Same as `curl -k` in the script: kubelet serving certs are self-signed
+                self._kubelet_clients[cluster] = httpx.AsyncClient(
+                    cert=self.kubelet_cert(cluster),
+                    verify=False,
+                    timeout=httpx.Timeout(POD_READY_TIMEOUT, connect=10),
+                )
+        return self._kubelet_clients[cluster]
+
+    def kubelet_url(self, node_name: str) -> str:
+        if SIMULATED:
+            return f"{SIMULATOR_URL}/nodes/{node_name}"
+        return f"https://{node_name}:{KUBELET_PORT}"
+
+    @property
+    def registry(self) -> RegistryClient:
+        if self._registry is None:
+            self._registry = RegistryClient(REGISTRY)
+        return self._registry
+
+    async def close(self):
+        for http_client in list(self._kubelet_clients.values()):
+            if http_client is not None:
+                await http_client.aclose()
+        if self._registry is not None:
+            await self._registry.close()
+        self._kubelet_clients = {}
+        self._registry = None
+
+    @asynccontextmanager
+    async def step(self, ctx: MigrationContext, name: str):
+        started = time.time()
+        report_step(ctx.migration_id, ctx.pod_name, name, "start", started)
+        try:
+            yield
+        except MigrationStepError:
+            raise
+        except Exception as e:
+            raise MigrationStepError(name, str(e)) from e
+        finished = time.time()
+        ctx.timings[name] = round((finished - started) * 1000)
+        report_step(ctx.migration_id, ctx.pod_name, name, "end", finished)
+
+    async def run(self, migration_id: int, info: MigrationInfo, log_path: str) -> bool:
+        """Run a migration end to end, returns True on success"""
+        ctx = MigrationContext(
+            migration_id=migration_id,
+            info=info,
+            log_path=log_path,
+            source_cluster=info.source_cluster or CLUSTER_1,
+            target_cluster=info.target_cluster or CLUSTER_2,
+            namespace=info.namespace or "default",
+            pod_name=info.k8s_pod_name,
+        )
+        try:
+            # Not a migration step, but part of the reaction time
+            incident_tracer.start_span(migration_id, "prepare")
+            await self._prepare(ctx)
+            incident_tracer.end_span(migration_id, "prepare")
+            ctx.log(f"Starting migration for {ctx.pod_name}")
+            ctx.log(f"Source cluster: {ctx.source_cluster}")
+            ctx.log(f"Target cluster: {ctx.target_cluster}")
+            ctx.log(f"Forensic analysis: {bool(info.forensic_analysis)}")
+            ctx.log(f"AI suggestion: {bool(info.AI_suggestion)}")
+            migration_start = time.monotonic()
+
+            ctx.log(f"-- Creating checkpoint for {ctx.pod_name} on {ctx.node_name} --")
+            async with self.step(ctx, "checkpoint"):
+                await self._checkpoint(ctx)
+            async with self.step(ctx, "locate"):
+                await self._locate_checkpoint(ctx)
+            async with self.step(ctx, "chmod"):
+                await self._change_permissions(ctx)
+            if IMAGE_BUILDER == "buildah":
+                async with self.step(ctx, "image_build"):
+                    new_container = await self._build_image(ctx)
+                async with self.step(ctx, "push"):
+                    await self._push_image(ctx, new_container)
+            else:
+                # The layer upload is where the image is built, the manifest push makes it visible
+                async with self.step(ctx, "image_build"):
+                    layer = await self._stream_layer(ctx)
+                async with self.step(ctx, "push"):
+                    await self._push_manifest(ctx, layer)
+            async with self.step(ctx, "pod_ready"):
+                await self._restore(ctx)
+            ctx.timings["total"] = round((time.monotonic() - migration_start) * 1000)
+
+            # Deletion + summary and forensics + AI are independent branches
+            results = await asyncio.gather(self._cleanup_branch(ctx), self._analysis_branch(ctx), return_exceptions=True)
+            if results[1] and not isinstance(results[1], Exception):
+                self._write_ai_performance(ctx, results[1])
+            for result in results:
+                if isinstance(result, Exception):
+                    raise result
+
+            ctx.log("-- Migration complete --")
+            self._write_result(ctx, 0)
+            migration_store.set_state(migration_id, "done", returncode=0)
+            print(f"Migration of {ctx.pod_name} completed successfully")
+            return True
+        except Exception as e:
+            ctx.log(f"Error: {str(e)}")
+            self._write_result(ctx, 1, error=str(e))
+            migration_store.set_state(migration_id, "failed", returncode=1, error=str(e))
+            print(f"Migration of {ctx.pod_name} failed: {str(e)}")
+            return False
+        finally:
+            checkpoint_retention.unpin(ctx.checkpoint_file)
+
+    async def _cleanup_branch(self, ctx: MigrationContext):
+        ctx.log("--- Deleting old pod ---")
+        async with self.step(ctx, "source_delete"):
+            await asyncio.to_thread(k8s_client.get_client(ctx.source_cluster).delete_namespaced_pod,
+                                    name=ctx.pod_name, namespace=ctx.namespace)
+        ctx.log(f"-- Old pod \"{ctx.pod_name}\" deleted --")
+
+        ctx.log("-- Summarizing migration performance --")
+        await self._summarize_performance(ctx)
+
+    async def _analysis_branch(self, ctx: MigrationContext) -> Optional[dict]:
+        """Forensics, then the AI suggestion on its report; returns the AI timings if one was generated"""
+        if not ctx.info.forensic_analysis:
+            return None
+        ctx.log("-- Performing forensic analysis --")
+        async with self.step(ctx, "forensics"):
+            if ctx.checkpoint_digest is None:
+                ctx.checkpoint_digest = await asyncio.to_thread(result_cache.checkpoint_digest, ctx.checkpoint_file)
+            analyzer = FORENSIC_ANALYZER_VERSION
+            forensic_key = cache_key("forensics", ctx.checkpoint_digest, analyzer=analyzer)
+            cached = await asyncio.to_thread(result_cache.get, forensic_key, ctx.log_path) is not None
+            incident_tracer.annotate(ctx.migration_id, "forensics", {"cubemig.cache_hit": cached})
+            if cached:
+                ctx.log(f"Forensic report for {ctx.checkpoint_digest} taken from the cache")
+            else:
+                analyzer = await self._forensic_analysis(ctx)
+                # Reports of the fallback script are not cached, a later run should get the native analyzer's report
+                if analyzer == FORENSIC_ANALYZER_VERSION:
+                    files = [name for name in ("forensic_report.txt", "forensic_report.json") if os.path.exists(os.path.join(ctx.log_path, name))]
+                    await asyncio.to_thread(result_cache.put, forensic_key, ctx.log_path, files)
+        ctx.log("-- Forensic analysis complete --")
+
+        if not ctx.info.AI_suggestion:
+            return None
+        ctx.log("-- Asking AI for suggestion --")
+        async with self.step(ctx, "ai"):
+            ai_key = cache_key("ai", ctx.checkpoint_digest, analyzer=analyzer, prompt=SYSTEM_INSTRUCTION,
+                               model=AI_MODEL, parameters=AI_PARAMETERS, compactor=COMPACTOR_VERSION, token_budget=AI_REPORT_TOKEN_BUDGET)
+            cached = await asyncio.to_thread(result_cache.get, ai_key, ctx.log_path)
+            if cached is not None:
+                ctx.log(f"AI suggestion taken from the cache, originally generated in {cached['timings']['total_time']:g} ms")
+                ai_timings = {name: 0 for name in cached["timings"]}
+                incident_tracer.annotate(ctx.migration_id, "ai", {"cubemig.cache_hit": True})
+                performance_store.annotate(ctx.migration_id, ai_cache_hit=True)
+            else:
+                ai_timings = await ai_suggestion_service.generate(ctx.log_path)
+                ctx.log(f"Forensic report compacted from {ai_timings['report_tokens']} to {ai_timings['prompt_report_tokens']} tokens")
+                ctx.log(f"First token after {ai_timings['first_token_time']:g} ms, {ai_timings['attempts']} attempt(s)")
+                await asyncio.to_thread(result_cache.put, ai_key, ctx.log_path, ["ai_suggestion.txt"], {"timings": ai_timings})
+                # Queue, prompt and completion times are reported by the LLM API, not measured here
+                incident_tracer.annotate(ctx.migration_id, "ai", {
+                    "cubemig.cache_hit": False,
+                    "gen_ai.request.model": AI_MODEL,
+                    "cubemig.ai.report_tokens": ai_timings["prompt_report_tokens"],
+                    **{f"cubemig.ai.{name}_ms": float(ai_timings[name]) for name in
+                       ("queue_time", "prompt_time", "completion_time", "total_time", "first_token_time", "local_wait_time")
+                       if ai_timings.get(name) is not None},
+                    "cubemig.ai.attempts": ai_timings["attempts"],
+                })
+                performance_store.annotate(ctx.migration_id, ai_cache_hit=False, ai_attempts=ai_timings["attempts"],
+                                           **{f"ai_{name[:-len('_time')]}_ms": float(ai_timings[name]) for name in
+                                              ("queue_time", "prompt_time", "completion_time", "total_time", "first_token_time")})
+        ctx.log("-- AI suggestion generated --")
+        return ai_timings
+
+    async def _forensic_analysis(self, ctx: MigrationContext) -> str:
+        """Write the forensic report, returns what produced it: the native analyzer's version or 'script'"""
+        try:
+            analysis = await asyncio.to_thread(analyze_checkpoint, ctx.checkpoint_file, ctx.log_path)
+            ctx.log(f"Analyzed {len(analysis['processes'])} processes in {analysis['analysis_time_ms']} ms")
+            return FORENSIC_ANALYZER_VERSION
+        except Exception as e:
+            ctx.log(f"-- Warning: native forensic analysis failed ({str(e)}), running {FORENSIC_SCRIPT} --")
+            await self._exec(FORENSIC_SCRIPT, ctx.checkpoint_file, ctx.log_path)
+            return "script"
+
+    async def _prepare(self, ctx: MigrationContext):
+        pod = await asyncio.to_thread(k8s_client.get_client(ctx.source_cluster).read_namespaced_pod,
+                                      name=ctx.pod_name, namespace=ctx.namespace)
+        ctx.app_name = (pod.metadata.labels or {}).get("app")
+        ctx.container_name = pod.spec.containers[0].name
+        ctx.image = pod.spec.containers[0].image
+        ctx.node_name = pod.spec.node_name
+        if ctx.info.batch_id is not None:
+            ctx.image_tag = f"checkpoint-{ctx.pod_name}"[:128]
+
+    async def _checkpoint(self, ctx: MigrationContext):
+        url = f"{self.kubelet_url(ctx.node_name)}/checkpoint/{ctx.namespace}/{ctx.pod_name}/{ctx.container_name}"
+        response = await self.kubelet_client(ctx.source_cluster).post(url)
+        response.raise_for_status()
+        # The kubelet checkpoint API only takes full checkpoints
+        performance_store.annotate(ctx.migration_id, checkpoint_mode="full", pre_copy_rounds=0)
+        ctx.log(f"checkpoint output: {response.text}")
+        try:
+            ctx.checkpoint_file = checkpoint_path_from_response(response.json(), ctx.node_name)
+        except ValueError:
+            ctx.checkpoint_file = None
+        # Keep retention away from it until the migration is done
+        checkpoint_retention.pin(ctx.checkpoint_file)
+        ctx.log("-- Checkpoint created --")
+
+    async def _locate_checkpoint(self, ctx: MigrationContext):
+        """Wait for the archive the kubelet reported to show up on NFS; without a reported path fall back to the newest match"""
+        if ctx.checkpoint_file is None:
+            pattern = f"{CHECKPOINT_NFS_ROOT}/{ctx.node_name}/checkpoint-{ctx.pod_name}_{ctx.namespace}-{ctx.container_name}-*.tar"
+            files = await asyncio.to_thread(glob.glob, pattern)
+            if not files:
+                raise RuntimeError(f"No checkpoint found matching {pattern}")
+            ctx.checkpoint_file = max(files, key=os.path.getmtime)
+            checkpoint_retention.pin(ctx.checkpoint_file)
+        elif not await wait_for_file(ctx.checkpoint_file, CHECKPOINT_WAIT_TIMEOUT):
+            raise RuntimeError(f"Checkpoint {ctx.checkpoint_file} did not appear within {CHECKPOINT_WAIT_TIMEOUT:g} seconds")
+        checkpoint_retention.register(ctx.checkpoint_file)
+        ctx.log(f"Checkpoint file: {ctx.checkpoint_file}")
+
+    async def _change_permissions(self, ctx: MigrationContext):
+        try:
+            await asyncio.to_thread(os.chmod, ctx.checkpoint_file, 0o777)
+        except PermissionError:
+            await self._exec("sudo", "chmod", "a+rwx", ctx.checkpoint_file)
+
+    def checkpoint_image_name(self, ctx: MigrationContext) -> str:
+        return ctx.image.split("/")[-1].split(":")[0]
+
+    def layer_codec(self, ctx: MigrationContext) -> Codec:
+        """Compression of the checkpoint image layer; falls back to none when the codec cannot be used for a layer"""
+        spec = ctx.info.compression or CHECKPOINT_COMPRESSION
+        try:
+            codec = get_codec(spec)
+        except ValueError as e:
+            ctx.log(f"-- Warning: {str(e)}, pushing the checkpoint uncompressed --")
+            return get_codec("none")
+        if codec.media_type is None:
+            ctx.log(f"-- Warning: {codec.name} is not a valid OCI layer compression, pushing the checkpoint uncompressed --")
+            return get_codec("none")
+        return codec
+
+    async def _build_image(self, ctx: MigrationContext) -> str:
+        ctx.log(f"Checkpoint image name: {ctx.image}")
+        new_container = (await self._exec("buildah", "from", ctx.image)).strip().splitlines()[-1]
+        await self._exec("buildah", "add", new_container, ctx.checkpoint_file, "/")
+        await self._exec("buildah", "config", f"--annotation=io.kubernetes.cri-o.annotations.checkpoint.name={ctx.container_name}", new_container)
+        await self._exec("buildah", "config", "--annotation=io.container.manager=crio", new_container)
+        return new_container
+
+    async def _push_image(self, ctx: MigrationContext, new_container: str):
+        image_name = self.checkpoint_image_name(ctx)
+        await self._exec("buildah", "commit", new_container, f"{image_name}:{ctx.image_tag}")
+        await self._exec("buildah", "rm", new_container)
+        ctx.log(f"-- Pushing image \"{image_name}:{ctx.image_tag}\" to local registry --")
+        codec = self.layer_codec(ctx)
+        if ctx.info.compression is None and not CHECKPOINT_COMPRESSION_CONFIGURED:
+            # Like single-migration.sh: nothing configured, buildah's default
+            compression = []
+        elif codec.name == "none":
+            compression = ["--disable-compression"]
+        else:
+            compression = ["--compression-format", codec.name, "--compression-level", str(codec.level)]
+        await self._exec("buildah", "push", "--tls-verify=false", *compression, f"localhost/{image_name}:{ctx.image_tag}", f"{REGISTRY}/{image_name}:{ctx.image_tag}")
+
+    async def _stream_layer(self, ctx: MigrationContext) -> dict:
+        image_name = self.checkpoint_image_name(ctx)
+        codec = self.layer_codec(ctx)
+        ctx.log(f"-- Streaming checkpoint layer to {REGISTRY}/{image_name} (compression: {codec.spec}) --")
+        layer = await push_checkpoint_layer(self.registry, image_name, ctx.checkpoint_file, codec)
+        checkpoint_bytes = os.path.getsize(ctx.checkpoint_file)
+        ctx.log(f"Layer digest: {layer['digest']} ({layer['size']} of {checkpoint_bytes} bytes)")
+        performance_store.annotate(ctx.migration_id, checkpoint_bytes=checkpoint_bytes, layer_bytes=layer["size"])
+        ctx.checkpoint_digest = layer["diff_id"]
+        return layer
+
+    async def _push_manifest(self, ctx: MigrationContext, layer: dict):
+        image_name = self.checkpoint_image_name(ctx)
+        ctx.log(f"-- Pushing image \"{image_name}:{ctx.image_tag}\" to local registry --")
+        digest = await push_checkpoint_manifest(self.registry, image_name, ctx.image_tag, layer, ctx.container_name)
+        ctx.log(f"Manifest digest: {digest}")
+
+    async def _restore(self, ctx: MigrationContext):
+        ctx.log("-- Applying restore yaml file --")
+        api_client = k8s_client.get_api_client(ctx.target_cluster)
+        with open(f"{RESTORE_YAML_DIR}/restore_{ctx.container_name}.yaml", "r") as file:
+            documents = [document for document in yaml.safe_load_all(file) if document]
+        ctx.restore_pod_name = f"{ctx.container_name}-restore"
+        if ctx.info.batch_id is not None:
+            ctx.restore_pod_name = f"{ctx.pod_name}-restore"[:63]
+            documents = [self._batch_restore_document(ctx, document) for document in documents]
+        for document in documents:
+            await asyncio.to_thread(self._apply, api_client, document, ctx.namespace)
+
+        ctx.log(f"-- Waiting for the new pod \"{ctx.restore_pod_name}\" to be ready --")
+        if await self._wait_for_running(ctx.target_cluster, ctx.restore_pod_name, ctx.namespace):
+            ctx.log(f"-- {ctx.restore_pod_name} is running --")
+            await self._switch_traffic(ctx)
+        else:
+            ctx.log(f"-- Warning: {ctx.restore_pod_name} did not start within {POD_READY_TIMEOUT // 60} minutes, but migration artifacts are in place --")
+            ctx.log("-- You may need to check the pod status manually --")
+
+    def _batch_restore_document(self, ctx: MigrationContext, document: dict) -> dict:
+        """Point the restore pod at this pod's image tag and name it after the pod; other objects are shared by the batch"""
+        if document.get("kind") != "Pod":
+            return document
+        document["metadata"]["name"] = ctx.restore_pod_name
+        for container in document.get("spec", {}).get("containers", []):
+            if container.get("image", "").endswith(":checkpoint"):
+                container["image"] = f"{container['image'].rsplit(':', 1)[0]}:{ctx.image_tag}"
+        return document
+
+    def _apply(self, api_client, document: dict, namespace: str):
+        """Create a restore object; an object that already exists is left as it is, like `kubectl apply` with an unchanged manifest"""
+        try:
+            k8s_utils.create_from_dict(api_client, document, namespace=namespace)
+        except k8s_utils.FailToCreateError as e:
+            if not all(isinstance(cause, ApiException) and cause.status == 409 for cause in e.api_exceptions):
+                raise
+
+    async def _wait_for_running(self, cluster: str, pod_name: str, namespace: str) -> bool:
+        core = k8s_client.get_client(cluster)
+        deadline = time.monotonic() + POD_READY_TIMEOUT
+        while time.monotonic() < deadline:
+            try:
+                pod = await asyncio.to_thread(core.read_namespaced_pod, name=pod_name, namespace=namespace)
+                if pod.status.phase == "Running":
+                    return True
+            except ApiException as e:
+                if e.status != 404:
+                    raise
+            await asyncio.sleep(0.25)
+        return False
+
+    async def _switch_traffic(self, ctx: MigrationContext):
+        if ctx.container_name == "mmt-probe":
+            ctx.log("-- Detected mmt-probe container, switching mirroring rule --")
+            path = "/spec/http/0/mirror/subset"
+            value = "v2-monitor"
+        elif ctx.namespace == "istio-enabled":
+            ctx.log("-- Switching traffic to the new pod --")
+            path = "/spec/http/0/route/0/destination/subset"
+            value = "v2"
+        else:
+            return
+        custom_objects = client.CustomObjectsApi(k8s_client.get_api_client(ctx.source_cluster))
+        await asyncio.to_thread(
+            custom_objects.patch_namespaced_custom_object,
+            group="networking.istio.io", version="v1beta1", namespace=ctx.namespace,
+            plural="virtualservices", name=ctx.app_name,
+            body=[{"op": "replace", "path": path, "value": value}],
+        )
+
+    async def _summarize_performance(self, ctx: MigrationContext):
+        stats = {}
+        try:
+            output = await self._exec("checkpointctl", "inspect", ctx.checkpoint_file, "--stats")
+            for line in output.splitlines():
+                for name in ("Freezing time", "Frozen time", "Memdump time", "Memwrite time"):
+                    if f"── {name}:" in line:
+                        stats[name] = line.split(": ", 1)[1].strip()
+        except Exception as e:
+            try:
+                stats = await asyncio.to_thread(self._criu_stats, ctx.checkpoint_file)
+            except Exception:
+                stats = {}
+            if not stats:
+                ctx.log(f"-- Warning: could not read CRIU statistics: {str(e)} --")
+        total_dump_ms = sum(to_ms(stats.get(name, "")) for name in ("Freezing time", "Frozen time", "Memdump time", "Memwrite time"))
+        performance_store.annotate(ctx.migration_id, node=ctx.node_name,
+                                   **{f"criu_{name.split()[0].lower()}_ms": to_ms(value) for name, value in stats.items()})
+        with open(os.path.join(ctx.log_path, "performance_summary.txt"), "a") as file:
+            file.write(f"""Performance Summary
+-------------------
+--- CRIU dump performance ---
+Freezing Time: {stats.get("Freezing time", "")}
+Frozen Time: {stats.get("Frozen time", "")}
+Memdump Time: {stats.get("Memdump time", "")}
+Memwrite Time: {stats.get("Memwrite time", "")}
+Total Dump Time: {total_dump_ms:g} ms
+-------------------
+--- Migration performance ---
+Checkpoint Creation: {ctx.timings.get("checkpoint")} ms
+Checkpoint Location: {ctx.timings.get("locate")} ms
+Permission Change: {ctx.timings.get("chmod")} ms
+Image Creation: {ctx.timings.get("image_build")} ms
+Image Push: {ctx.timings.get("push")} ms
+Pod Ready: {ctx.timings.get("pod_ready")} ms
+Total: {ctx.timings.get("total")} ms
+-------------------
+--- Cleanup performance ---
+Source pod deletion time: {ctx.timings.get("source_delete")} ms
+""")
+
+    def _criu_stats(self, checkpoint_file: str) -> dict:
+        """Dump times from the archive's stats-dump in checkpointctl's format, for hosts without checkpointctl"""
+        analyzer = ForensicAnalyzer(checkpoint_file)
+        try:
+            stats = analyzer.dump_stats()
+        finally:
+            analyzer.close()
+        names = {"freezing_time": "Freezing time", "frozen_time": "Frozen time", "memdump_time": "Memdump time", "memwrite_time": "Memwrite time"}
+        return {name: f"{stats[key]} µs" for key, name in names.items() if stats.get(key) is not None}
+
+    def _write_ai_performance(self, ctx: MigrationContext, ai_timings: dict):
+        with open(os.path.join(ctx.log_path, "performance_summary.txt"), "a") as file:
+            file.write(f"""--- AI generation performance ---
+Queue Time: {ai_timings["queue_time"]:g} ms
+Prompt Time: {ai_timings["prompt_time"]:g} ms
+Completion Time: {ai_timings["completion_time"]:g} ms
+Total Time: {ai_timings["total_time"]:g} ms
+-------------------
+""")
+
+    def _write_result(self, ctx: MigrationContext, returncode: int, error: Optional[str] = None):
+        with open(os.path.join(ctx.log_path, "migration_result.txt"), "w") as file:
+            file.write(f"Migration completed at {datetime.now(timezone)}\n")
+            file.write(f"Return code: {returncode}\n")
+            file.write("Engine: native\n")
+            file.write("Checkpoint mode: full\n")
+            if ctx.timings:
+                file.write(f"Step timings (ms): {ctx.timings}\n")
+            if error:
+                file.write(f"Error: {error}\n")
+
+    async def _exec(self, *cmd: str) -> str:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            stdin=asyncio.subprocess.DEVNULL
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"{' '.join(cmd[:2])} failed with return code {process.returncode}: {stderr.decode(errors='replace').strip()}")
+        return stdout.decode(errors="replace")
+
+migration_engine = MigrationEngine()
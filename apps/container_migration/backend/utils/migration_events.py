@@ -0,0 +1,74 @@
+import asyncio
+import json
+import time
+from typing import Optional, Set
+
+class MigrationEventBroker:
+    """Fan-out of migration progress events to server-sent event subscribers.
+
+    Every subscriber gets its own bounded queue. A subscriber that stops
+    reading loses its oldest events instead of slowing down the publisher.
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._started_at = {}
+        self._step_started_at = {}
+        self.published = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, migration_id: int, pod: str, step: str, phase: str, timestamp: Optional[float] = None, **extra):
+        """Send a step event; elapsed_ms is measured from the migration's first event, end events also carry duration_ms"""
+        timestamp = time.time() if timestamp is None else timestamp
+        started_at = self._started_at.setdefault(migration_id, timestamp)
+        event = {
+            "migration_id": migration_id,
+            "pod": pod,
+            "step": step,
+            "phase": phase,
+            "timestamp": timestamp,
+            "elapsed_ms": round((timestamp - started_at) * 1000),
+            **extra,
+        }
+        if phase == "start":
+            self._step_started_at[(migration_id, step)] = timestamp
+        elif phase == "end" and (migration_id, step) in self._step_started_at:
+            event["duration_ms"] = round((timestamp - self._step_started_at.pop((migration_id, step))) * 1000)
+        elif phase in ("done", "failed"):
+            self._started_at.pop(migration_id, None)
+            for key in [key for key in self._step_started_at if key[0] == migration_id]:
+                del self._step_started_at[key]
+        self.published += 1
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def stream(self, migration_id: Optional[int] = None, pod: Optional[str] = None, heartbeat: float = 15.0):
+        """Yield events as SSE frames, optionally only those of one migration or pod"""
+        queue = self.subscribe()
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if migration_id is not None and event["migration_id"] != migration_id:
+                    continue
+                if pod is not None and event["pod"] != pod:
+                    continue
+                yield f"event: {event['phase']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            self.unsubscribe(queue)
+
+migration_events = MigrationEventBroker()
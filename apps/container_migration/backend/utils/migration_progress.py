@@ -0,0 +1,19 @@
+import time
+from typing import Optional
+from utils.metrics import migration_metrics
+from utils.migration_events import migration_events
+from utils.migration_store import migration_store
+from utils.tracing import incident_tracer
+
+def report_step(migration_id: int, pod_name: str, step: str, phase: str, timestamp: Optional[float] = None):
+    """Record the start or end of a migration step in the registry and publish it to event subscribers"""
+    timestamp = time.time() if timestamp is None else timestamp
+    if phase == "start":
+        migration_store.step_started(migration_id, step, timestamp)
+    elif phase == "end":
+        migration_store.step_finished(migration_id, step, timestamp)
+    else:
+        raise ValueError(f"Invalid step phase: {phase}")
+    migration_metrics.step(migration_id, step, phase, timestamp)
+    incident_tracer.step(migration_id, step, phase, timestamp)
+    migration_events.publish(migration_id, pod_name, step, phase, timestamp)
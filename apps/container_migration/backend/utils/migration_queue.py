@@ -0,0 +1,197 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, List, Optional
+from models.migration_info import MigrationInfo
+from utils.constants import (CLUSTER_1, MIGRATION_WORKERS, MAX_MIGRATIONS_PER_CLUSTER, MAX_MIGRATIONS_PER_NODE,
+                             MIGRATION_AGING_SECONDS, MIGRATION_DEFAULT_PRIORITY, FALCO_PRIORITIES, PRIORITY_ALIASES)
+from utils.k8s_client import k8s_client
+
+def priority_rank(priority: Optional[str]) -> int:
+    """0 for Emergency to 7 for Debug; unknown or missing priorities get the default"""
+    name = (priority or MIGRATION_DEFAULT_PRIORITY).strip().lower()
+    name = PRIORITY_ALIASES.get(name, name)
+    if name not in FALCO_PRIORITIES:
+        name = MIGRATION_DEFAULT_PRIORITY.strip().lower()
+        name = PRIORITY_ALIASES.get(name, name)
+    return FALCO_PRIORITIES.index(name)
+
+@dataclass
+class MigrationJob:
+    id: int
+    info: MigrationInfo
+    log_path: str
+    cluster: str
+    node: Optional[str] = None
+    # The node is looked up after the job is queued, until then the job cannot start
+    node_resolved: bool = False
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    # Urgency in priority levels: Emergency is 7, Debug 0, plus the rule's weight
+    urgency: float = 0
+
+    def sort_key(self, aging_seconds: float) -> float:
+        """Lower runs first. Every job ages at the same rate, so the order of two jobs never changes while they wait"""
+        return self.enqueued_at / aging_seconds - self.urgency if aging_seconds > 0 else -self.urgency
+
+class MigrationQueue:
+    """Bounded pool of migration workers with per-cluster and per-node caps.
+
+    Jobs wait in a heap ordered by urgency: the Falco priority of the alert
+    plus the rule's weight, raised by one level for every `aging_seconds` a
+    job waits so low-priority migrations still run. A free worker takes the
+    most urgent job whose source cluster and node are both below their
+    concurrency limit, so a busy node does not block jobs for other nodes.
+    """
+
+    def __init__(self, runner: Callable[[MigrationJob], Awaitable[bool]], workers: int = MIGRATION_WORKERS,
+                 per_cluster: int = MAX_MIGRATIONS_PER_CLUSTER, per_node: int = MAX_MIGRATIONS_PER_NODE,
+                 aging_seconds: float = MIGRATION_AGING_SECONDS):
+        self.runner = runner
+        self.workers = workers
+        self.per_cluster = per_cluster
+        self.per_node = per_node
+        self.aging_seconds = aging_seconds
+        self._pending: List[tuple] = []
+        self._sequence = itertools.count()
+        self._running_clusters = Counter()
+        self._running_nodes = Counter()
+        self._cond: Optional[asyncio.Condition] = None
+        self._tasks = []
+        self._resolving = set()
+        self._next_id = 1
+        self._wait_times_ms = deque(maxlen=200)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._cond = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"Migration queue started with {self.workers} workers")
+
+    async def stop(self):
+        tasks = [*self._tasks, *self._resolving]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._resolving.clear()
+
+    async def submit(self, info: MigrationInfo, log_path: str, job_id: Optional[int] = None) -> MigrationJob:
+        """Queue a migration and return the job without waiting for the API server; the pod's node is resolved in the background for the per-node cap"""
+        if self._cond is None:
+            await self.start()
+        cluster = info.source_cluster or CLUSTER_1
+        async with self._cond:
+            if job_id is None:
+                job_id = self._next_id
+                self._next_id += 1
+            urgency = len(FALCO_PRIORITIES) - 1 - priority_rank(info.priority) + (info.weight or 0)
+            job = MigrationJob(id=job_id, info=info, log_path=log_path, cluster=cluster, urgency=urgency)
+            heapq.heappush(self._pending, (job.sort_key(self.aging_seconds), next(self._sequence), job))
+            self.submitted += 1
+        task = asyncio.create_task(self._resolve_node(job))
+        self._resolving.add(task)
+        task.add_done_callback(self._resolving.discard)
+        return job
+
+    async def _resolve_node(self, job: MigrationJob):
+        node = await asyncio.to_thread(resolve_node, job.cluster, job.info.namespace or "default", job.info.k8s_pod_name)
+        async with self._cond:
+            job.node = node
+            job.node_resolved = True
+            self._cond.notify_all()
+
+    def position(self, job: MigrationJob) -> int:
+        for index, (_, _, pending) in enumerate(sorted(self._pending)):
+            if pending is job:
+                return index + 1
+        return 0
+
+    def _eligible(self, job: MigrationJob) -> bool:
+        if not job.node_resolved:
+            return False
+        if self._running_clusters[job.cluster] >= self.per_cluster:
+            return False
+        return job.node is None or self._running_nodes[job.node] < self.per_node
+
+    def _take(self) -> Optional[MigrationJob]:
+        """Pop the most urgent eligible job, jobs skipped for their node or cluster keep their place"""
+        skipped = []
+        job = None
+        while self._pending:
+            entry = heapq.heappop(self._pending)
+            if self._eligible(entry[2]):
+                job = entry[2]
+                break
+            skipped.append(entry)
+        for entry in skipped:
+            heapq.heappush(self._pending, entry)
+        return job
+
+    async def _worker(self, worker_id: int):
+        while True:
+            async with self._cond:
+                job = self._take()
+                while job is None:
+                    await self._cond.wait()
+                    job = self._take()
+                self._running_clusters[job.cluster] += 1
+                if job.node:
+                    self._running_nodes[job.node] += 1
+            job.started_at = time.monotonic()
+            wait_ms = (job.started_at - job.enqueued_at) * 1000
+            self._wait_times_ms.append(wait_ms)
+            print(f"Worker {worker_id} starting migration job {job.id} for pod {job.info.k8s_pod_name} "
+                  f"(priority {job.info.priority or MIGRATION_DEFAULT_PRIORITY}) after {wait_ms:.0f} ms in queue")
+            try:
+                success = await self.runner(job)
+            except Exception as e:
+                print(f"Migration job {job.id} raised: {str(e)}")
+                success = False
+            finally:
+                async with self._cond:
+                    self._running_clusters[job.cluster] -= 1
+                    if job.node:
+                        self._running_nodes[job.node] -= 1
+                    self._cond.notify_all()
+            if success:
+                self.completed += 1
+            else:
+                self.failed += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        wait_times = list(self._wait_times_ms)
+        return {
+            "workers": self.workers,
+            "per_cluster_limit": self.per_cluster,
+            "per_node_limit": self.per_node,
+            "queue_depth": len(self._pending),
+            "running": sum(self._running_clusters.values()),
+            "running_per_cluster": {k: v for k, v in self._running_clusters.items() if v},
+            "running_per_node": {k: v for k, v in self._running_nodes.items() if v},
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "pending_per_priority": dict(Counter(FALCO_PRIORITIES[priority_rank(job.info.priority)] for _, _, job in self._pending)),
+            "aging_seconds": self.aging_seconds,
+            "oldest_wait_ms": round((now - min(job.enqueued_at for _, _, job in self._pending)) * 1000) if self._pending else 0,
+            "avg_wait_ms": round(sum(wait_times) / len(wait_times)) if wait_times else 0,
+            "max_wait_ms": round(max(wait_times)) if wait_times else 0,
+        }
+
+def resolve_node(cluster: str, namespace: str, pod_name: str) -> Optional[str]:
+    """Look up the node a pod runs on; returns None if the pod cannot be read"""
+    try:
+        pod = k8s_client.get_client(cluster).read_namespaced_pod(name=pod_name, namespace=namespace)
+        return pod.spec.node_name
+    except Exception as e:
+        print(f"Could not resolve node of pod {pod_name} in {cluster}: {str(e)}")
+        return None
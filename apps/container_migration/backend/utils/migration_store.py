@@ -0,0 +1,219 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+from models.migration_info import MigrationInfo
+from utils.constants import MIGRATION_DB_PATH
+
+MIGRATION_STATES = ("queued", "checkpointing", "pushing", "restoring", "done", "failed")
+FINAL_STATES = ("done", "failed")
+
+# Migration steps in pipeline order and the state a migration enters when the step starts
+MIGRATION_STEPS = ("checkpoint", "locate", "chmod", "image_build", "push", "pod_ready", "source_delete", "forensics", "ai")
+STEP_STATES = {
+    "checkpoint": "checkpointing",
+    "image_build": "pushing",
+    "push": "pushing",
+    "pod_ready": "restoring",
+}
+
+def step_durations(migration: dict) -> Dict[str, float]:
+    """Step name -> duration in ms of a migration from get(), plus "wait" (registration to the
+    first step: queueing and preparation) and "total" (checkpoint start to restored pod ready)"""
+    steps = {step["step"]: step for step in migration.get("steps", [])}
+    durations = {name: step["duration_ms"] for name, step in steps.items() if step.get("duration_ms") is not None}
+    started = [step["started_at"] for step in steps.values() if step.get("started_at")]
+    if started:
+        durations["wait"] = (min(started) - migration["created_at"]) * 1000
+    if steps.get("checkpoint", {}).get("started_at") and steps.get("pod_ready", {}).get("finished_at"):
+        durations["total"] = (steps["pod_ready"]["finished_at"] - steps["checkpoint"]["started_at"]) * 1000
+    return durations
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS migrations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pod TEXT NOT NULL,
+    app TEXT,
+    namespace TEXT,
+    source_cluster TEXT,
+    target_cluster TEXT,
+    migration_type TEXT,
+    rule TEXT,
+    state TEXT NOT NULL,
+    log_path TEXT,
+    returncode INTEGER,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    finished_at REAL,
+    batch_id INTEGER REFERENCES batches (id)
+);
+CREATE INDEX IF NOT EXISTS idx_migrations_pod ON migrations (pod, created_at);
+CREATE INDEX IF NOT EXISTS idx_migrations_app ON migrations (app, created_at);
+CREATE INDEX IF NOT EXISTS idx_migrations_cluster ON migrations (source_cluster, created_at);
+CREATE INDEX IF NOT EXISTS idx_migrations_created ON migrations (created_at);
+CREATE INDEX IF NOT EXISTS idx_migrations_state ON migrations (state);
+CREATE TABLE IF NOT EXISTS batches (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_cluster TEXT,
+    target_cluster TEXT,
+    namespace TEXT,
+    selector TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS migration_steps (
+    migration_id INTEGER NOT NULL REFERENCES migrations (id),
+    step TEXT NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    duration_ms REAL,
+    PRIMARY KEY (migration_id, step)
+);
+"""
+
+class MigrationStore:
+    """SQLite (WAL) registry of migration jobs and their per-step timestamps.
+
+    Timestamps are epoch seconds. All lookups go through an index, so the
+    status endpoints stay fast however many migrations have been run.
+    """
+
+    def __init__(self, db_path: str = MIGRATION_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        # Databases created before batches existed
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(migrations)")}
+        if "batch_id" not in columns:
+            self._conn.execute("ALTER TABLE migrations ADD COLUMN batch_id INTEGER REFERENCES batches (id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_migrations_batch ON migrations (batch_id)")
+
+    def _execute(self, sql: str, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _query(self, sql: str, params=()) -> List[dict]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    def create(self, info: MigrationInfo, log_path: str) -> int:
+        now = time.time()
+        cursor = self._execute(
+            "INSERT INTO migrations (pod, app, namespace, source_cluster, target_cluster, migration_type, rule, state, log_path, created_at, updated_at, batch_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+            (info.k8s_pod_name, info.container_name, info.namespace, info.source_cluster, info.target_cluster,
+             info.migration_type, info.rule, log_path, now, now, info.batch_id),
+        )
+        return cursor.lastrowid
+
+    def create_batch(self, source_cluster: Optional[str], target_cluster: Optional[str], namespace: Optional[str],
+                     selector: Optional[str] = None) -> int:
+        cursor = self._execute(
+            "INSERT INTO batches (source_cluster, target_cluster, namespace, selector, created_at) VALUES (?, ?, ?, ?, ?)",
+            (source_cluster, target_cluster, namespace, selector, time.time()),
+        )
+        return cursor.lastrowid
+
+    def batch(self, batch_id: int) -> Optional[dict]:
+        """A batch with the progress of each of its migrations"""
+        rows = self._query("SELECT * FROM batches WHERE id = ?", (batch_id,))
+        if not rows:
+            return None
+        batch = rows[0]
+        migrations = self._query("SELECT * FROM migrations WHERE batch_id = ? ORDER BY id", (batch_id,))
+        for migration in migrations:
+            migration["steps"] = self.steps(migration["id"])
+        states = {}
+        for migration in migrations:
+            states[migration["state"]] = states.get(migration["state"], 0) + 1
+        batch["states"] = states
+        batch["finished"] = bool(migrations) and all(migration["state"] in FINAL_STATES for migration in migrations)
+        finished_at = [migration["finished_at"] for migration in migrations if migration["finished_at"]]
+        batch["finished_at"] = max(finished_at) if batch["finished"] and finished_at else None
+        batch["migrations"] = migrations
+        return batch
+
+    def set_state(self, migration_id: int, state: str, returncode: Optional[int] = None, error: Optional[str] = None):
+        if state not in MIGRATION_STATES:
+            raise ValueError(f"Invalid migration state: {state}")
+        now = time.time()
+        finished_at = now if state in FINAL_STATES else None
+        self._execute(
+            "UPDATE migrations SET state = ?, updated_at = ?, finished_at = COALESCE(?, finished_at), "
+            "returncode = COALESCE(?, returncode), error = COALESCE(?, error) WHERE id = ?",
+            (state, now, finished_at, returncode, error, migration_id),
+        )
+
+    def step_started(self, migration_id: int, step: str, timestamp: Optional[float] = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self._execute(
+            "INSERT INTO migration_steps (migration_id, step, started_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (migration_id, step) DO UPDATE SET started_at = excluded.started_at",
+            (migration_id, step, timestamp),
+        )
+        if step in STEP_STATES:
+            self.set_state(migration_id, STEP_STATES[step])
+
+    def step_finished(self, migration_id: int, step: str, timestamp: Optional[float] = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        self._execute(
+            "INSERT INTO migration_steps (migration_id, step, finished_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (migration_id, step) DO UPDATE SET finished_at = excluded.finished_at, "
+            "duration_ms = (excluded.finished_at - started_at) * 1000",
+            (migration_id, step, timestamp),
+        )
+
+    def fail_interrupted(self) -> int:
+        """Mark migrations left unfinished by a previous backend process as failed"""
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE migrations SET state = 'failed', error = 'Interrupted by backend restart', updated_at = ?, finished_at = ? "
+            "WHERE state NOT IN ('done', 'failed')",
+            (now, now),
+        )
+        return cursor.rowcount
+
+    def steps(self, migration_id: int) -> List[dict]:
+        rows = self._query(
+            "SELECT step, started_at, finished_at, duration_ms FROM migration_steps WHERE migration_id = ?",
+            (migration_id,),
+        )
+        order = {step: index for index, step in enumerate(MIGRATION_STEPS)}
+        return sorted(rows, key=lambda row: (order.get(row["step"], len(order)), row["started_at"] or 0))
+
+    def get(self, migration_id: int) -> Optional[dict]:
+        rows = self._query("SELECT * FROM migrations WHERE id = ?", (migration_id,))
+        if not rows:
+            return None
+        migration = rows[0]
+        migration["steps"] = self.steps(migration_id)
+        return migration
+
+    def latest_for_pod(self, pod_name: str) -> Optional[dict]:
+        rows = self._query("SELECT id FROM migrations WHERE pod = ? ORDER BY created_at DESC LIMIT 1", (pod_name,))
+        return self.get(rows[0]["id"]) if rows else None
+
+    def list(self, pod: Optional[str] = None, app: Optional[str] = None, cluster: Optional[str] = None,
+             state: Optional[str] = None, since: Optional[float] = None, until: Optional[float] = None,
+             limit: int = 50) -> List[dict]:
+        clauses = []
+        params = []
+        for column, value in (("pod", pod), ("app", app), ("source_cluster", cluster), ("state", state)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        params.append(limit)
+        return self._query(f"SELECT * FROM migrations {where} ORDER BY created_at DESC LIMIT ?", params)
+
+migration_store = MigrationStore()
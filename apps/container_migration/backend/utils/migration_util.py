@@ -1,6 +1,7 @@
 import json
 import os
 from pathlib import Path
+from typing import Dict
 from models.config_model import Config
 
 # Get the directory of this script and build path to config.json
@@ -14,4 +15,31 @@ def load_config() -> Config:
     
 def save_config(config: Config):
     with open(config_path, 'w') as config_file:
-        json.dump(config.model_dump(), config_file, indent=4)
\ No newline at end of file
+        json.dump(config.model_dump(), config_file, indent=4)
+
+def to_ms(value: str) -> float:
+    """Convert a checkpointctl duration such as '686 µs' or '114.72 ms' to milliseconds"""
+    parts = value.split()
+    if len(parts) != 2:
+        return 0
+    number, unit = float(parts[0]), parts[1]
+    return {"µs": number / 1000, "ms": number, "s": number * 1000}.get(unit, 0)
+
+def parse_performance_summary(text: str) -> Dict[str, Dict[str, float]]:
+    """Durations of a performance_summary.txt in ms by section and field, e.g. {"CRIU dump performance": {"Freezing Time": 0.5}}.
+    Fields without a value are left out."""
+    sections: Dict[str, Dict[str, float]] = {}
+    section = None
+    for line in text.splitlines():
+        if line.startswith("---"):
+            section = line.strip("- ") or section
+            continue
+        name, _, value = line.partition(":")
+        parts = value.split()
+        if section is None or len(parts) != 2:
+            continue
+        try:
+            sections.setdefault(section, {})[name.strip()] = to_ms(value.strip())
+        except ValueError:
+            continue
+    return sections
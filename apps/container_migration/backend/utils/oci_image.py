@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import json
+import platform
+from datetime import datetime, timezone
+from typing import AsyncIterator, Optional, Tuple
+from urllib.parse import urljoin
+import httpx
+from utils.compression import Codec, get_codec
+
+OCI_MANIFEST = "application/vnd.oci.image.manifest.v1+json"
+OCI_CONFIG = "application/vnd.oci.image.config.v1+json"
+OCI_LAYER = "application/vnd.oci.image.layer.v1.tar"
+CHECKPOINT_ANNOTATION = "io.kubernetes.cri-o.annotations.checkpoint.name"
+CHUNK_SIZE = 4 * 1024 * 1024
+
+ARCHITECTURES = {"x86_64": "amd64", "aarch64": "arm64"}
+
+class RegistryClient:
+    """Minimal OCI distribution API client for pushing blobs and manifests"""
+
+    def __init__(self, registry: str, http_client: Optional[httpx.AsyncClient] = None, scheme: str = "http"):
+        self.base_url = registry if "://" in registry else f"{scheme}://{registry}"
+        self.http = http_client or httpx.AsyncClient(timeout=httpx.Timeout(300, connect=10))
+
+    async def close(self):
+        await self.http.aclose()
+
+    async def blob_exists(self, repository: str, digest: str) -> bool:
+        response = await self.http.head(f"{self.base_url}/v2/{repository}/blobs/{digest}")
+        return response.status_code == 200
+
+    async def _start_upload(self, repository: str) -> str:
+        response = await self.http.post(f"{self.base_url}/v2/{repository}/blobs/uploads/")
+        response.raise_for_status()
+        return urljoin(self.base_url, response.headers["Location"])
+
+    async def upload_blob(self, repository: str, data: bytes) -> str:
+        """Push a small blob in one request, returns its digest"""
+        digest = f"sha256:{hashlib.sha256(data).hexdigest()}"
+        if await self.blob_exists(repository, digest):
+            return digest
+        location = await self._start_upload(repository)
+        response = await self.http.put(with_digest(location, digest), content=data,
+                                       headers={"Content-Type": "application/octet-stream"})
+        response.raise_for_status()
+        return digest
+
+    async def upload_blob_stream(self, repository: str, chunks: AsyncIterator[bytes]) -> Tuple[str, int]:
+        """Stream a blob of unknown digest to the registry, hashing it on the way; returns (digest, size)"""
+        sha256 = hashlib.sha256()
+        size = 0
+
+        async def hashed_chunks():
+            nonlocal size
+            async for chunk in chunks:
+                sha256.update(chunk)
+                size += len(chunk)
+                yield chunk
+
+        location = await self._start_upload(repository)
+        response = await self.http.patch(location, content=hashed_chunks(),
+                                         headers={"Content-Type": "application/octet-stream"})
+        response.raise_for_status()
+        digest = f"sha256:{sha256.hexdigest()}"
+        response = await self.http.put(with_digest(urljoin(self.base_url, response.headers["Location"]), digest))
+        response.raise_for_status()
+        return digest, size
+
+    async def put_manifest(self, repository: str, reference: str, manifest: bytes, media_type: str = OCI_MANIFEST) -> str:
+        response = await self.http.put(f"{self.base_url}/v2/{repository}/manifests/{reference}", content=manifest,
+                                       headers={"Content-Type": media_type})
+        response.raise_for_status()
+        return response.headers.get("Docker-Content-Digest") or f"sha256:{hashlib.sha256(manifest).hexdigest()}"
+
+def with_digest(location: str, digest: str) -> httpx.URL:
+    """Add the digest to an upload URL, keeping the upload state the registry put in its query"""
+    return httpx.URL(location).copy_merge_params({"digest": digest})
+
+async def read_file_chunks(path: str, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read a file in chunks off the event loop"""
+    file = await asyncio.to_thread(open, path, "rb")
+    try:
+        while True:
+            chunk = await asyncio.to_thread(file.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await asyncio.to_thread(file.close)
+
+def image_config(diff_id: str) -> bytes:
+    config = {
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "architecture": ARCHITECTURES.get(platform.machine(), platform.machine()),
+        "os": "linux",
+        "config": {},
+        "rootfs": {"type": "layers", "diff_ids": [diff_id]},
+        "history": [{"created_by": "cubemig checkpoint image"}],
+    }
+    return json.dumps(config, separators=(",", ":")).encode()
+
+def image_manifest(config_digest: str, config_size: int, layer_digest: str, layer_size: int,
+                   layer_media_type: str, container_name: str) -> bytes:
+    manifest = {
+        "schemaVersion": 2,
+        "mediaType": OCI_MANIFEST,
+        "config": {"mediaType": OCI_CONFIG, "digest": config_digest, "size": config_size},
+        "layers": [{"mediaType": layer_media_type, "digest": layer_digest, "size": layer_size}],
+        "annotations": {
+            CHECKPOINT_ANNOTATION: container_name,
+            "io.container.manager": "crio",
+        },
+    }
+    return json.dumps(manifest, separators=(",", ":")).encode()
+
+async def push_checkpoint_layer(registry: RegistryClient, repository: str, checkpoint_file: str, codec: Optional[Codec] = None) -> dict:
+    """Stream the checkpoint tar to the registry as the image's only layer.
+
+    The checkpoint archive already is an uncompressed tar of the files CRI-O
+    expects at the image root, so it is used as the layer as it is, optionally
+    compressed on the fly. Uncompressed, its digest doubles as the diff_id.
+    """
+    codec = codec or get_codec("none")
+    if codec.media_type is None:
+        raise ValueError(f"{codec.name} is not a valid OCI layer compression")
+    if codec.name == "none":
+        digest, size = await registry.upload_blob_stream(repository, read_file_chunks(checkpoint_file))
+        return {"digest": digest, "diff_id": digest, "size": size, "media_type": OCI_LAYER}
+
+    diff_id = hashlib.sha256()
+
+    async def compressed_chunks():
+        compressor = codec.compressor()
+        async for chunk in read_file_chunks(checkpoint_file):
+            diff_id.update(chunk)
+            data = await asyncio.to_thread(compressor.compress, chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    digest, size = await registry.upload_blob_stream(repository, compressed_chunks())
+    return {"digest": digest, "diff_id": f"sha256:{diff_id.hexdigest()}", "size": size, "media_type": codec.media_type}
+
+async def push_checkpoint_manifest(registry: RegistryClient, repository: str, tag: str, layer: dict, container_name: str) -> str:
+    """Push the config and manifest of a checkpoint image whose layer is already in the registry"""
+    config = image_config(layer["diff_id"])
+    config_digest = await registry.upload_blob(repository, config)
+    manifest = image_manifest(config_digest, len(config), layer["digest"], layer["size"], layer["media_type"], container_name)
+    return await registry.put_manifest(repository, tag, manifest)
+
+async def push_checkpoint_image(registry: RegistryClient, repository: str, tag: str, checkpoint_file: str, container_name: str,
+                                codec: Optional[Codec] = None) -> dict:
+    """Build and push a CRI-O checkpoint image straight from the checkpoint tar, without local image storage"""
+    layer = await push_checkpoint_layer(registry, repository, checkpoint_file, codec)
+    manifest_digest = await push_checkpoint_manifest(registry, repository, tag, layer, container_name)
+    return {**layer, "manifest_digest": manifest_digest}
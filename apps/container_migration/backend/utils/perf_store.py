@@ -0,0 +1,376 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+from utils.constants import LOG_DIR, PERF_STORE_DIR, PERF_STORE_FLUSH_INTERVAL, PERF_STORE_FLUSH_ROWS, PERF_STORE_COMPACT_FILES
+from utils.migration_store import MIGRATION_STEPS, step_durations
+from utils.migration_util import parse_performance_summary
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Columns of a migration record. day and app are not stored in the files, they are the
+# hive partition directories (day=2025-01-31/app=vuln-spring) and come back when reading the dataset.
+STEP_COLUMNS = tuple(f"{step}_ms" for step in MIGRATION_STEPS)
+CRIU_COLUMNS = ("criu_freezing_ms", "criu_frozen_ms", "criu_memdump_ms", "criu_memwrite_ms")
+AI_COLUMNS = ("ai_queue_ms", "ai_prompt_ms", "ai_completion_ms", "ai_total_ms", "ai_first_token_ms")
+COLUMNS: Tuple[Tuple[str, str], ...] = (
+    ("migration_id", "int64"),
+    ("created_at", "timestamp"),
+    ("finished_at", "timestamp"),
+    ("pod", "string"),
+    ("namespace", "string"),
+    ("source_cluster", "string"),
+    ("target_cluster", "string"),
+    ("node", "string"),
+    ("migration_type", "string"),
+    ("engine", "string"),
+    ("checkpoint_mode", "string"),
+    ("pre_copy_rounds", "int32"),
+    ("compression", "string"),
+    ("rule", "string"),
+    ("priority", "string"),
+    ("batch_id", "int64"),
+    ("forensic_analysis", "bool"),
+    ("ai_suggestion", "bool"),
+    ("result", "string"),
+    ("error", "string"),
+    # From registration to the first step: queueing and preparation
+    ("wait_ms", "float64"),
+    *((column, "float64") for column in STEP_COLUMNS),
+    # Checkpoint start to restored pod ready
+    ("total_ms", "float64"),
+    ("checkpoint_bytes", "int64"),
+    ("layer_bytes", "int64"),
+    *((column, "float64") for column in CRIU_COLUMNS),
+    *((column, "float64") for column in AI_COLUMNS),
+    ("ai_attempts", "int32"),
+    ("ai_cache_hit", "bool"),
+)
+PARTITION_COLUMNS = ("day", "app")
+DEFAULT_SUMMARY_COLUMNS = ("wait_ms", *STEP_COLUMNS[:6], "total_ms")
+
+# performance_summary.txt section and field -> column, for single-migration.sh runs and old logs
+SUMMARY_FIELDS = {
+    "CRIU dump performance": {"Freezing Time": "criu_freezing_ms", "Frozen Time": "criu_frozen_ms",
+                              "Memdump Time": "criu_memdump_ms", "Memwrite Time": "criu_memwrite_ms"},
+    "Migration performance": {"Checkpoint Creation": "checkpoint_ms", "Checkpoint Location": "locate_ms",
+                              "Permission Change": "chmod_ms", "Image Creation": "image_build_ms", "Image Push": "push_ms",
+                              "Pod Ready": "pod_ready_ms", "Total": "total_ms"},
+    "Cleanup performance": {"Source pod deletion time": "source_delete_ms"},
+    "AI generation performance": {"Queue Time": "ai_queue_ms", "Prompt Time": "ai_prompt_ms",
+                                  "Completion Time": "ai_completion_ms", "Total Time": "ai_total_ms"},
+}
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("The performance store needs the optional 'pyarrow' package")
+
+def schema() -> "pa.Schema":
+    require_pyarrow()
+    types = {"int32": pa.int32(), "int64": pa.int64(), "float64": pa.float64(), "bool": pa.bool_(),
+             "string": pa.string(), "timestamp": pa.timestamp("ms", tz="UTC")}
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+def dataset_schema() -> "pa.Schema":
+    return schema().append(pa.field("day", pa.string())).append(pa.field("app", pa.string()))
+
+def to_datetime(epoch: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc) if epoch else None
+
+def summary_columns(text: str) -> dict:
+    """Record columns found in a performance_summary.txt"""
+    columns = {}
+    for section, values in parse_performance_summary(text).items():
+        fields = SUMMARY_FIELDS.get(section, {})
+        for name, milliseconds in values.items():
+            # AI suggestions taken from the cache are written as 0 ms
+            if name in fields and not (section == "AI generation performance" and milliseconds <= 0):
+                columns[fields[name]] = milliseconds
+    return columns
+
+def build_record(migration: dict, details: dict) -> dict:
+    """Record of a finished migration from its registry entry and the details reported while it ran"""
+    record = {
+        "migration_id": migration["id"],
+        "created_at": to_datetime(migration["created_at"]),
+        "finished_at": to_datetime(migration.get("finished_at") or time.time()),
+        "pod": migration["pod"],
+        "namespace": migration.get("namespace") or "default",
+        "source_cluster": migration.get("source_cluster"),
+        "target_cluster": migration.get("target_cluster"),
+        "migration_type": migration.get("migration_type"),
+        "rule": migration.get("rule"),
+        "batch_id": migration.get("batch_id"),
+        "result": "done" if migration.get("state") == "done" else "failed",
+        "error": migration.get("error"),
+        "app": migration.get("app"),
+    }
+    for step, duration in step_durations(migration).items():
+        if f"{step}_ms" in STEP_COLUMNS + ("wait_ms", "total_ms"):
+            record[f"{step}_ms"] = round(duration, 3)
+    # Step timings of the registry are exact, the details add what only the engine knows
+    for column, value in details.items():
+        record.setdefault(column, value)
+    return record
+
+def partition(record: dict) -> Tuple[str, str]:
+    finished_at = record.get("finished_at") or datetime.now(timezone.utc)
+    return finished_at.strftime("%Y-%m-%d"), record.get("app") or "unknown"
+
+def write_parquet(table: "pa.Table", directory: str) -> str:
+    """Write a part file atomically; files starting with '.' are ignored by readers until the rename"""
+    os.makedirs(directory, exist_ok=True)
+    name = f"part-{int(time.time() * 1000)}-{uuid.uuid4().hex[:8]}.parquet"
+    temporary = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, temporary, compression="zstd")
+    os.replace(temporary, os.path.join(directory, name))
+    return name
+
+def compact_partition(directory: str) -> int:
+    """Merge the part files of one partition into one, returns the number of files merged"""
+    files = sorted(glob.glob(os.path.join(directory, "part-*.parquet")))
+    if len(files) < 2:
+        return 0
+    table = pa.concat_tables([pq.read_table(path, schema=schema()) for path in files])
+    write_parquet(table.sort_by("finished_at"), directory)
+    for path in files:
+        os.remove(path)
+    return len(files)
+
+class PerformanceStore:
+    """Typed performance records of finished migrations in a Parquet dataset.
+
+    One row per migration with every step timing, checkpoint size, CRIU and
+    AI statistics, partitioned by day and app. Records are buffered and
+    written in batches from a background task. A partition with more than
+    `compact_files` part files is merged into one, so the dataset does not
+    degrade into thousands of tiny files. Without pyarrow nothing is stored.
+    """
+
+    def __init__(self, root: str = PERF_STORE_DIR, flush_rows: int = PERF_STORE_FLUSH_ROWS,
+                 flush_interval: float = PERF_STORE_FLUSH_INTERVAL, compact_files: int = PERF_STORE_COMPACT_FILES):
+        self.root = root
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.compact_files = compact_files
+        self.enabled = bool(root) and pa is not None
+        self._details: Dict[int, dict] = {}
+        self._buffer: List[dict] = []
+        self._lock = asyncio.Lock()
+        self._flush_event: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+
+    async def start(self):
+        if self.root and pa is None:
+            print("Performance store disabled: pyarrow is not installed")
+        if self.enabled and self._task is None:
+            self._flush_event = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def annotate(self, migration_id: int, **columns):
+        """Add columns to the record of a running migration"""
+        if self.enabled:
+            self._details.setdefault(migration_id, {}).update({key: value for key, value in columns.items() if value is not None})
+
+    def record(self, migration: Optional[dict], log_path: Optional[str] = None, **columns):
+        """Queue the record of a finished migration; CRIU and AI values missing from the
+        details are taken from performance_summary.txt, as written by single-migration.sh"""
+        if not self.enabled or migration is None:
+            return
+        details = {**self._details.pop(migration["id"], {}), **{key: value for key, value in columns.items() if value is not None}}
+        if log_path and not any(column in details for column in CRIU_COLUMNS):
+            try:
+                with open(os.path.join(log_path, "performance_summary.txt"), "r") as file:
+                    details = {**summary_columns(file.read()), **details}
+            except OSError:
+                pass
+        self._buffer.append(build_record(migration, details))
+        if len(self._buffer) >= self.flush_rows and self._flush_event is not None:
+            self._flush_event.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Error writing performance records: {str(e)}")
+
+    async def flush(self):
+        async with self._lock:
+            if not self._buffer:
+                return
+            records, self._buffer = self._buffer, []
+            try:
+                await asyncio.to_thread(self.write, records)
+            except Exception:
+                # Keep them for the next flush
+                self._buffer = records + self._buffer
+                raise
+
+    def write(self, records: List[dict]):
+        """Write records synchronously, one part file per partition"""
+        require_pyarrow()
+        partitions: Dict[Tuple[str, str], List[dict]] = {}
+        for record in records:
+            partitions.setdefault(partition(record), []).append(record)
+        for (day, app), rows in partitions.items():
+            directory = os.path.join(self.root, f"day={day}", f"app={quote(app, safe='')}")
+            write_parquet(pa.Table.from_pylist(rows, schema=schema()), directory)
+            if len(glob.glob(os.path.join(directory, "part-*.parquet"))) > self.compact_files:
+                compact_partition(directory)
+        self.written += len(records)
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "root": self.root, "buffered": len(self._buffer), "written": self.written}
+
+def load(root: str = PERF_STORE_DIR, since: Optional[str] = None, until: Optional[str] = None,
+         filters: Optional[dict] = None, columns: Optional[List[str]] = None) -> "pa.Table":
+    """Records as a pyarrow Table; since/until are days (YYYY-MM-DD, inclusive) and prune whole partitions.
+
+        table = load(since="2025-01-01", filters={"app": "vuln-spring"})
+        table.to_pandas()
+    """
+    require_pyarrow()
+    dataset = ds.dataset(root, format="parquet", partitioning="hive", schema=dataset_schema(), ignore_prefixes=[".", "_"])
+    expression = None
+    conditions = [ds.field(name) == value for name, value in (filters or {}).items() if value is not None]
+    if since:
+        conditions.append(ds.field("day") >= since)
+    if until:
+        conditions.append(ds.field("day") <= until)
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return dataset.to_table(columns=columns, filter=expression)
+
+def summarize(table: "pa.Table", group_by: List[str], columns: List[str]) -> List[dict]:
+    """Count, mean, p50, p95 and max of each column per group"""
+    aggregations = []
+    for column in columns:
+        aggregations += [(column, "count"), (column, "mean"), (column, "tdigest", pc.TDigestOptions(q=[0.5, 0.95])), (column, "max")]
+    grouped = table.group_by(group_by).aggregate(aggregations).to_pylist()
+    rows = []
+    for group in sorted(grouped, key=lambda group: tuple(str(group[key]) for key in group_by)):
+        row = {key: group[key] for key in group_by}
+        for column in columns:
+            p50, p95 = group[f"{column}_tdigest"] or (None, None)
+            row[column] = {"count": group[f"{column}_count"], "mean": group[f"{column}_mean"], "p50": p50, "p95": p95,
+                           "max": group[f"{column}_max"]}
+        rows.append(row)
+    return rows
+
+LOG_DIRECTORY = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}-\d{2}-\d{2})_(.+)$")
+
+def import_logs(log_dir: str) -> List[dict]:
+    """Records of migrations in the log directory (<container>/<timestamp>_<pod>/performance_summary.txt)"""
+    records = []
+    for path in sorted(glob.glob(os.path.join(log_dir, "*", "*", "performance_summary.txt"))):
+        directory = os.path.dirname(path)
+        match = LOG_DIRECTORY.match(os.path.basename(directory))
+        if not match:
+            continue
+        with open(path, "r") as file:
+            columns = summary_columns(file.read())
+        # Log directories are named in local time
+        created_at = datetime.strptime(match.group(1), "%Y-%m-%d %H-%M-%S").astimezone(timezone.utc)
+        result = None
+        try:
+            with open(os.path.join(directory, "migration_result.txt"), "r") as file:
+                returncode = re.search(r"^Return code: (-?\d+)", file.read(), re.MULTILINE)
+                result = ("done" if returncode.group(1) == "0" else "failed") if returncode else None
+        except OSError:
+            pass
+        records.append({
+            **columns,
+            "created_at": created_at,
+            "finished_at": datetime.fromtimestamp(os.path.getmtime(path), tz=timezone.utc),
+            "pod": match.group(2),
+            "app": os.path.basename(os.path.dirname(directory)),
+            "engine": "imported",
+            "result": result,
+        })
+    return records
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value:.1f}" if value is not None else "-"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query and maintain the migration performance store")
+    parser.add_argument("--root", default=PERF_STORE_DIR, help=f"dataset directory (default: {PERF_STORE_DIR})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary = commands.add_parser("summary", help="count, mean, p50, p95 and max per group")
+    summary.add_argument("--since", help="first day, YYYY-MM-DD")
+    summary.add_argument("--until", help="last day, YYYY-MM-DD")
+    summary.add_argument("--app")
+    summary.add_argument("--source-cluster")
+    summary.add_argument("--target-cluster")
+    summary.add_argument("--result", default="done", help="done, failed or all (default: done)")
+    summary.add_argument("--group-by", default="app,source_cluster,target_cluster")
+    summary.add_argument("--columns", default=",".join(DEFAULT_SUMMARY_COLUMNS))
+    summary.add_argument("--json", dest="json_path", help="also write the summary to this file")
+    commands.add_parser("compact", help="merge the part files of every partition")
+    imported = commands.add_parser("import-logs", help="add the migrations of a log directory, for runs from before the store")
+    imported.add_argument("--log-dir", default=LOG_DIR)
+    args = parser.parse_args(argv)
+    require_pyarrow()
+
+    if args.command == "compact":
+        merged = sum(compact_partition(directory) for directory in glob.glob(os.path.join(args.root, "day=*", "app=*")))
+        print(f"Merged {merged} part files")
+        return
+    if args.command == "import-logs":
+        store = PerformanceStore(args.root)
+        records = import_logs(args.log_dir)
+        store.write(records)
+        print(f"Imported {len(records)} migrations from {args.log_dir}")
+        return
+
+    started = time.perf_counter()
+    group_by = [key for key in args.group_by.split(",") if key]
+    columns = [column for column in args.columns.split(",") if column]
+    filters = {"app": args.app, "source_cluster": args.source_cluster, "target_cluster": args.target_cluster,
+               "result": None if args.result == "all" else args.result}
+    table = load(args.root, args.since, args.until, filters, columns=[*group_by, *columns])
+    rows = summarize(table, group_by, columns)
+    for row in rows:
+        print(" ".join(f"{key}={row[key]}" for key in group_by))
+        print(f"  {'column':<20} {'count':>7} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        for column in columns:
+            stats = row[column]
+            print(f"  {column:<20} {stats['count']:>7} {format_ms(stats['mean']):>10} {format_ms(stats['p50']):>10} "
+                  f"{format_ms(stats['p95']):>10} {format_ms(stats['max']):>10}")
+    print(f"{table.num_rows} migrations in {(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
+    if args.json_path:
+        with open(args.json_path, "w") as file:
+            json.dump({"migrations": table.num_rows, "groups": rows}, file, indent=2)
+
+performance_store = PerformanceStore()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import base64
+import binascii
+import re
+from typing import Dict, List, Tuple
+from utils.constants import AI_REPORT_TOKEN_BUDGET
+
+# Bumped whenever the compaction changes, cached AI suggestions of older versions are not reused
+COMPACTOR_VERSION = 1
+
+# Changed by the application itself, the system instruction tells the model to ignore them
+BENIGN_PATHS = [
+    "etc/mtab",
+    "run/secrets/kubernetes.io/",
+    "run/secrets/kubernetes.io/serviceaccount/",
+    "tmp/hsperfdata_root/1",
+]
+
+# Changed files below these are listed first
+SENSITIVE_PREFIXES = ("etc/", "root/", "home/", "tmp/", "var/tmp/", "dev/shm/", "bin/", "sbin/", "usr/bin/", "usr/sbin/",
+                      "usr/local/bin/", "var/spool/cron/", ".ssh/")
+DIRECTORY_SUMMARY_THRESHOLD = 20
+
+# Most relevant first, sections are emitted in this order and trimmed from the end of it
+SECTION_RANKING = ["Process tree", "Open sockets", "Changed files", "Checkpoint information", "Memory size"]
+
+SECTION_HEADER = re.compile(r"^----- (.+) -----$")
+BASE64_TOKEN = re.compile(r"(?<![A-Za-z0-9+/=])[A-Za-z0-9+/]{16,}={0,2}(?![A-Za-z0-9+/=])")
+TREE_PREFIX = re.compile(r"^[\s│├└─]*")
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token for English and paths"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def split_sections(report: str) -> Dict[str, List[str]]:
+    sections: Dict[str, List[str]] = {}
+    current = sections.setdefault("", [])
+    for line in report.splitlines():
+        match = SECTION_HEADER.match(line.strip())
+        if match:
+            current = sections.setdefault(match.group(1), [])
+        elif line.strip():
+            current.append(line)
+    if not sections[""]:
+        del sections[""]
+    return sections
+
+def is_benign(path: str) -> bool:
+    path = path.strip().lstrip("./")
+    for benign in BENIGN_PATHS:
+        if path == benign.rstrip("/") or path.startswith(benign.rstrip("/") + "/"):
+            return True
+        # Parent directories that only show up because of a benign path below them
+        if benign.startswith(path) and path.endswith("/"):
+            return True
+    return False
+
+def decode_base64(text: str) -> str:
+    """Append the decoded form of base64 tokens that decode to printable text"""
+    decoded = []
+    for token in BASE64_TOKEN.findall(text):
+        try:
+            value = base64.b64decode(token + "=" * (-len(token) % 4), validate=True).decode()
+        except (binascii.Error, UnicodeDecodeError):
+            continue
+        if value and sum(char.isprintable() or char in "\n\t" for char in value) / len(value) > 0.95:
+            decoded.append(value.strip())
+    return f"{text} [base64 decoded: {' | '.join(decoded)}]" if decoded else text
+
+def collapse_repeats(lines: List[str]) -> List[str]:
+    """Merge entries that only differ in their tree drawing, e.g. identical worker processes or sockets"""
+    counts: Dict[str, int] = {}
+    first: Dict[str, str] = {}
+    order = []
+    for line in lines:
+        key = re.sub(r"\[\d+\]", "[*]", TREE_PREFIX.sub("", line))
+        if key not in counts:
+            counts[key] = 0
+            first[key] = line
+            order.append(key)
+        counts[key] += 1
+    return [first[key] if counts[key] == 1 else f"{first[key]} (x{counts[key]})" for key in order]
+
+def compact_changed_files(lines: List[str]) -> List[str]:
+    paths = list(dict.fromkeys(line.strip() for line in lines if not is_benign(line)))
+    # A directory entry adds nothing when files below it are listed
+    parents = {path[:index + 1] for path in paths for index in range(len(path) - 1) if path[index] == "/"}
+    paths = [path for path in paths if path not in parents]
+    # Directories with many changed files (package installs, caches) become one line
+    directories: Dict[str, List[str]] = {}
+    for path in paths:
+        directories.setdefault(path.rstrip("/").rpartition("/")[0] + "/", []).append(path)
+    singles, summaries = [], []
+    for directory, files in directories.items():
+        if len(files) > DIRECTORY_SUMMARY_THRESHOLD:
+            examples = ", ".join(file.rpartition("/")[2] or file for file in files[:3])
+            summaries.append(f"{directory} ({len(files)} changed files, e.g. {examples})")
+        else:
+            singles.extend(files)
+    singles.sort(key=lambda path: not path.startswith(SENSITIVE_PREFIXES))
+    return singles + summaries
+
+MEMORY_SIZE = re.compile(r"([\d.]+)\s*(B|KiB|MiB|GiB|kB|MB|GB)\b")
+SIZE_FACTORS = {"B": 1, "KiB": 1024, "kB": 1000, "MiB": 1024 ** 2, "MB": 1000 ** 2, "GiB": 1024 ** 3, "GB": 1000 ** 3}
+
+def compact_memory(lines: List[str], keep: int = 10) -> List[str]:
+    """Keep the table header and the largest processes of the memory table"""
+    rows = [line for line in lines if MEMORY_SIZE.search(line)]
+    if not rows:
+        return lines
+    first = lines.index(rows[0])
+    header = lines[:first]
+    footer = [line for line in lines[first:] if not MEMORY_SIZE.search(line)]
+
+    def size(line: str) -> float:
+        value, unit = MEMORY_SIZE.findall(line)[-1]
+        return float(value) * SIZE_FACTORS[unit]
+    rows.sort(key=size, reverse=True)
+    omitted = len(rows) - keep
+    return header + rows[:keep] + footer + ([f"... {omitted} smaller processes omitted"] if omitted > 0 else [])
+
+def render(sections: Dict[str, List[str]]) -> str:
+    return "".join(f"----- {name} -----\n" + "".join(f"{line}\n" for line in lines) if name else "".join(f"{line}\n" for line in lines)
+                   for name, lines in sections.items())
+
+def compact_report(report: str, token_budget: int = AI_REPORT_TOKEN_BUDGET) -> Tuple[str, dict]:
+    """Shrink a forensic report for the LLM prompt, returns the compacted report and its statistics"""
+    sections = split_sections(report)
+    compacted: Dict[str, List[str]] = {}
+    for name, lines in sections.items():
+        if name == "Changed files":
+            lines = compact_changed_files(lines)
+        elif name == "Memory size":
+            lines = compact_memory(lines)
+        elif name in ("Process tree", "Open sockets"):
+            lines = collapse_repeats([decode_base64(line) for line in lines])
+        compacted[name] = lines
+    ranking = {name: index for index, name in enumerate(SECTION_RANKING)}
+    compacted = dict(sorted(compacted.items(), key=lambda item: ranking.get(item[0], len(ranking))))
+
+    truncated = []
+    budget_chars = token_budget * CHARS_PER_TOKEN
+    total_chars = len(render(compacted))
+    if token_budget > 0 and total_chars > budget_chars:
+        # Trim the least relevant sections first, line by line from their end
+        for name in reversed(list(compacted)):
+            lines = compacted[name]
+            omitted = 0
+            while lines and total_chars > budget_chars:
+                total_chars -= len(lines.pop()) + 1
+                omitted += 1
+                if omitted == 1:
+                    total_chars += len("... 000000 more lines omitted") + 1
+            if omitted:
+                compacted[name] = lines + [f"... {omitted} more lines omitted"]
+                truncated.append(name)
+            if total_chars <= budget_chars:
+                break
+
+    result = render(compacted)
+    original_tokens, compacted_tokens = estimate_tokens(report), estimate_tokens(result)
+    return result, {
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "ratio": round(original_tokens / compacted_tokens, 2) if compacted_tokens else None,
+        "truncated_sections": truncated,
+    }
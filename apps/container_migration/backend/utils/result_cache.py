@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from utils.constants import RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+def cache_key(kind: str, checkpoint_digest: str, **parameters) -> str:
+    """Key of a result: what produced it, the checkpoint it was produced from and everything else it depends on"""
+    material = json.dumps({"kind": kind, "checkpoint": checkpoint_digest, **parameters}, sort_keys=True)
+    return hashlib.sha256(material.encode()).hexdigest()
+
+class ResultCache:
+    """Content-addressed disk cache for forensic reports and AI suggestions.
+
+    Every entry is a directory named after its key that holds the cached files.
+    The total size is bounded; the least recently used entries are evicted
+    first. Recency survives restarts through the directory mtime.
+    """
+
+    def __init__(self, root: str = RESULT_CACHE_DIR, max_mb: float = RESULT_CACHE_MAX_MB):
+        self.root = root
+        self.max_bytes = int(max_mb * 1024 ** 2)
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._digests: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def _load(self):
+        """Index the entries already on disk, oldest first"""
+        if self._loaded:
+            return
+        entries = []
+        if os.path.isdir(self.root):
+            for prefix in os.scandir(self.root):
+                if not prefix.is_dir():
+                    continue
+                for entry in os.scandir(prefix.path):
+                    if entry.is_dir() and ".tmp-" not in entry.name:
+                        size = sum(file.stat().st_size for file in os.scandir(entry.path) if file.is_file())
+                        entries.append((entry.stat().st_mtime, entry.name, size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+        self._loaded = True
+
+    def checkpoint_digest(self, path: str) -> str:
+        """sha256 of a checkpoint archive, remembered per path, size and mtime"""
+        stat = os.stat(path)
+        identity = (path, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(identity)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as file:
+                while chunk := file.read(HASH_CHUNK_SIZE):
+                    sha256.update(chunk)
+            digest = f"sha256:{sha256.hexdigest()}"
+            with self._lock:
+                self._digests[identity] = digest
+        return digest
+
+    def get(self, key: str, destination: str) -> Optional[dict]:
+        """Copy a cached entry's files to destination and return its metadata, None on a miss"""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self._lock:
+            self._load()
+            hit = key in self._entries and os.path.isdir(path)
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self._entries.pop(key, None)
+                self.misses += 1
+        if not hit:
+            return None
+        metadata = {}
+        os.makedirs(destination, exist_ok=True)
+        for entry in os.scandir(path):
+            if entry.name == "metadata.json":
+                with open(entry.path, "r") as file:
+                    metadata = json.load(file)
+            else:
+                shutil.copyfile(entry.path, os.path.join(destination, entry.name))
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return metadata
+
+    def put(self, key: str, source: str, files: List[str], metadata: Optional[dict] = None):
+        """Store files from source under key, then evict down to the size budget"""
+        if not self.enabled:
+            return
+        path = self._path(key)
+        staging = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        os.makedirs(staging, exist_ok=True)
+        for name in files:
+            shutil.copyfile(os.path.join(source, name), os.path.join(staging, name))
+        with open(os.path.join(staging, "metadata.json"), "w") as file:
+            json.dump({**(metadata or {}), "files": files, "stored_at": time.time()}, file)
+        size = sum(entry.stat().st_size for entry in os.scandir(staging))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(staging, path)
+        with self._lock:
+            self._load()
+            self._entries[key] = size
+            self._entries.move_to_end(key)
+            self.stores += 1
+            evicted = []
+            total = sum(self._entries.values())
+            while total > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                evicted.append(old_key)
+                total -= old_size
+            self.evictions += len(evicted)
+        for old_key in evicted:
+            shutil.rmtree(self._path(old_key), ignore_errors=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load()
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "directory": self.root,
+                "max_bytes": self.max_bytes,
+                "entries": len(self._entries),
+                "bytes": sum(self._entries.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions,
+            }
+
+result_cache = ResultCache()
@@ -0,0 +1,78 @@
+import re
+from typing import Dict, List, Optional, Pattern, Tuple
+from models.config_model import Config, RuleConfig
+
+# RuleConfig predicate field -> Falco output_fields key it is matched against
+PREDICATE_FIELDS = {
+    "namespace": "k8s.ns.name",
+    "image": "container.image.repository",
+    "proc_name": "proc.name",
+}
+
+class CompiledRule:
+    def __init__(self, position: int, rule_config: RuleConfig):
+        self.position = position
+        self.config = rule_config
+        self.pattern: Optional[Pattern] = re.compile(rule_config.rule) if rule_config.match == "regex" else None
+        self.predicates: List[Tuple[str, Pattern]] = [
+            (field, re.compile(getattr(rule_config, name)))
+            for name, field in PREDICATE_FIELDS.items()
+            if getattr(rule_config, name)
+        ]
+
+    def accepts(self, output_fields: dict) -> bool:
+        for field, pattern in self.predicates:
+            value = output_fields.get(field)
+            if field == "container.image.repository" and value and output_fields.get("container.image.tag"):
+                value = f"{value}:{output_fields['container.image.tag']}"
+            if value is None or not pattern.search(str(value)):
+                return False
+        return True
+
+class RuleIndex:
+    """Rule lookup compiled once from config.json.
+
+    Exact rule names are looked up in a dict, prefix and regex rules are
+    checked afterwards. When several rules match, the one listed first in
+    the config wins, same as the previous linear scan.
+    """
+
+    def __init__(self, config: Config):
+        self._exact: Dict[str, List[CompiledRule]] = {}
+        self._prefix: List[CompiledRule] = []
+        self._regex: List[CompiledRule] = []
+        for position, rule_config in enumerate(config.config):
+            compiled = CompiledRule(position, rule_config)
+            if rule_config.match == "prefix":
+                self._prefix.append(compiled)
+            elif rule_config.match == "regex":
+                self._regex.append(compiled)
+            else:
+                self._exact.setdefault(rule_config.rule, []).append(compiled)
+
+    def __len__(self):
+        return sum(len(rules) for rules in self._exact.values()) + len(self._prefix) + len(self._regex)
+
+    def match(self, rule: Optional[str], output_fields: Optional[dict] = None) -> Optional[RuleConfig]:
+        """Return the first rule config that applies to a Falco rule name and its output fields"""
+        if not rule:
+            return None
+        output_fields = output_fields or {}
+        best: Optional[CompiledRule] = None
+        for compiled in self._exact.get(rule, ()):
+            if compiled.accepts(output_fields):
+                best = compiled
+                break
+        for compiled in self._prefix:
+            if best is not None and compiled.position > best.position:
+                break
+            if rule.startswith(compiled.config.rule) and compiled.accepts(output_fields):
+                best = compiled
+                break
+        for compiled in self._regex:
+            if best is not None and compiled.position > best.position:
+                break
+            if compiled.pattern.search(rule) and compiled.accepts(output_fields):
+                best = compiled
+                break
+        return best.config if best else None
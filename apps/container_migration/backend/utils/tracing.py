@@ -0,0 +1,301 @@
+import asyncio
+import json
+import os
+import secrets
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import httpx
+from utils.constants import TRACE_EXPORT, TRACE_SERVICE_NAME
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+# Spans of one incident, written next to its migration log
+TRACE_FILE = "trace.json"
+
+def otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # int64 is a string in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def otlp_attributes(attributes: dict) -> List[dict]:
+    return [{"key": key, "value": otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+def otlp_request(spans: List[dict]) -> dict:
+    """ExportTraceServiceRequest in the OTLP/JSON encoding"""
+    return {"resourceSpans": [{
+        "resource": {"attributes": otlp_attributes({"service.name": TRACE_SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "cubemig"}, "spans": spans}],
+    }]}
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None, start_ns: Optional[int] = None,
+                 attributes: Optional[dict] = None, kind: int = SPAN_KIND_INTERNAL):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.start_ns = time.time_ns() if start_ns is None else start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.events: List[dict] = []
+        self.error: Optional[str] = None
+
+    def add_event(self, name: str, time_ns: int, attributes: Optional[dict] = None):
+        self.events.append({"timeUnixNano": str(time_ns), "name": name, "attributes": otlp_attributes(attributes or {})})
+
+    def end(self, end_ns: Optional[int] = None, error: Optional[str] = None):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns() if end_ns is None else max(end_ns, self.start_ns)
+        if error is not None:
+            self.error = error
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": otlp_attributes(self.attributes),
+            "events": self.events,
+            "status": {"code": STATUS_ERROR, "message": self.error} if self.error else {},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+class Incident:
+    """One trace from alert receipt (or the manual request) to the end of the migration"""
+
+    def __init__(self, name: str, start_ns: Optional[int] = None, attributes: Optional[dict] = None,
+                 falco_time_ns: Optional[int] = None):
+        self.root = Span(name, secrets.token_hex(16), start_ns=start_ns, attributes=attributes, kind=SPAN_KIND_SERVER)
+        self.falco_time_ns = falco_time_ns
+        if falco_time_ns:
+            # Falco does not propagate trace context, the event time is the only link back to the syscall
+            self.root.attributes["falco.evt.time"] = falco_time_ns
+            self.root.add_event("falco.event", falco_time_ns)
+        self.spans: List[Span] = []
+        self._open: Dict[str, Span] = {}
+
+    def add(self, name: str, start_ns: int, end_ns: int, attributes: Optional[dict] = None) -> Span:
+        """Record a span that already finished"""
+        span = Span(name, self.root.trace_id, self.root.span_id, start_ns, attributes)
+        span.end(end_ns)
+        self.spans.append(span)
+        return span
+
+    def start(self, name: str, start_ns: Optional[int] = None, attributes: Optional[dict] = None) -> Span:
+        span = Span(name, self.root.trace_id, self.root.span_id, start_ns, attributes)
+        self._open[name] = span
+        self.spans.append(span)
+        return span
+
+    def end(self, name: str, end_ns: Optional[int] = None):
+        span = self._open.pop(name, None)
+        if span is not None:
+            span.end(end_ns)
+
+    def annotate(self, name: str, attributes: dict):
+        span = self._open.get(name)
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def finish(self, success: bool, end_ns: Optional[int] = None):
+        end_ns = time.time_ns() if end_ns is None else end_ns
+        # Steps still open here are the ones the migration failed in
+        for name in list(self._open):
+            self._open.pop(name).end(end_ns, error="not finished")
+        self.root.attributes["cubemig.result"] = "done" if success else "failed"
+        self.root.end(end_ns, error=None if success else "migration failed")
+
+    def to_otlp(self) -> List[dict]:
+        return [self.root.to_otlp(), *(span.to_otlp() for span in self.spans)]
+
+def nanos(value) -> int:
+    return int(value) if value else 0
+
+def reaction_breakdown(spans: List[dict]) -> dict:
+    """Where the time between the Falco event and the restored pod went, from the OTLP spans of one incident.
+
+    Reaction time runs from the Falco event (or the request, for manual
+    migrations) to the end of `pod_ready`. Phases are the child spans, in
+    order; `untraced_ms` is the part of the reaction time no phase covers.
+    """
+    root = next(span for span in spans if not span.get("parentSpanId"))
+    attributes = {item["key"]: next(iter(item["value"].values())) for item in root.get("attributes", [])}
+    root_start, root_end = nanos(root["startTimeUnixNano"]), nanos(root["endTimeUnixNano"])
+    falco_ns = nanos(attributes.get("falco.evt.time"))
+    children = sorted((span for span in spans if span.get("parentSpanId")), key=lambda span: nanos(span["startTimeUnixNano"]))
+    phases = []
+    if falco_ns:
+        phases.append({"name": "falco_delivery", "start_ms": 0.0, "duration_ms": round((root_start - falco_ns) / 1e6, 3)})
+    origin = falco_ns or root_start
+    for span in children:
+        start, end = nanos(span["startTimeUnixNano"]), nanos(span["endTimeUnixNano"])
+        phase = {"name": span["name"], "start_ms": round((start - origin) / 1e6, 3), "duration_ms": round((end - start) / 1e6, 3)}
+        if span.get("status", {}).get("message"):
+            phase["error"] = span["status"]["message"]
+        phases.append(phase)
+    pod_ready = next((span for span in children if span["name"] == "pod_ready" and not span.get("status", {}).get("message")), None)
+    reaction_end = nanos(pod_ready["endTimeUnixNano"]) if pod_ready else None
+    breakdown = {
+        "trace_id": root["traceId"],
+        "name": root["name"],
+        "migration_id": int(attributes["cubemig.migration_id"]) if "cubemig.migration_id" in attributes else None,
+        "pod": attributes.get("k8s.pod.name"),
+        "result": attributes.get("cubemig.result"),
+        "falco_event_time": falco_ns / 1e9 if falco_ns else None,
+        "received_at": root_start / 1e9,
+        "reaction_ms": round((reaction_end - origin) / 1e6, 3) if reaction_end else None,
+        "total_ms": round((root_end - origin) / 1e6, 3),
+        "phases": phases,
+    }
+    if reaction_end:
+        covered = sum(phase["duration_ms"] for phase in phases
+                      if phase["name"] == "falco_delivery" or phase["start_ms"] + phase["duration_ms"] <= breakdown["reaction_ms"] + 1e-3)
+        breakdown["untraced_ms"] = round(max(breakdown["reaction_ms"] - covered, 0), 3)
+    return breakdown
+
+class IncidentTracer:
+    """Traces of migration incidents, exported as OTLP/JSON.
+
+    Only alerts that trigger a migration and manual migrations get a trace,
+    so unmatched or suppressed alerts cost nothing. Steps reported through
+    report_step become child spans. When a migration finishes its spans go
+    to TRACE_FILE in the migration log directory and, through a background
+    task, to CUBEMIG_TRACE_EXPORT: a file with one export request per line,
+    or the URL of an OTLP/HTTP collector.
+    """
+
+    def __init__(self, export: str = TRACE_EXPORT, keep: int = 500, batch_size: int = 64):
+        self.export = export
+        self.keep = keep
+        self.batch_size = batch_size
+        self._incidents: Dict[int, Incident] = {}
+        self._recent: "OrderedDict[int, List[dict]]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._http: Optional[httpx.AsyncClient] = None
+        self.exported = 0
+        self.export_errors = 0
+
+    async def start(self):
+        if self.export and self._task is None:
+            self._queue = asyncio.Queue(maxsize=10000)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            batch = []
+            while not self._queue.empty():
+                batch.extend(self._queue.get_nowait())
+            if batch:
+                await self._export(batch)
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def bind(self, migration_id: int, incident: Incident):
+        incident.root.attributes["cubemig.migration_id"] = migration_id
+        self._incidents[migration_id] = incident
+
+    def start_span(self, migration_id: int, name: str, start_ns: Optional[int] = None):
+        incident = self._incidents.get(migration_id)
+        if incident is not None:
+            incident.start(name, start_ns)
+
+    def end_span(self, migration_id: int, name: str, end_ns: Optional[int] = None):
+        incident = self._incidents.get(migration_id)
+        if incident is not None:
+            incident.end(name, end_ns)
+
+    def annotate(self, migration_id: int, name: str, attributes: dict):
+        incident = self._incidents.get(migration_id)
+        if incident is not None:
+            incident.annotate(name, attributes)
+
+    def step(self, migration_id: int, step: str, phase: str, timestamp: float):
+        if phase == "start":
+            self.start_span(migration_id, step, int(timestamp * 1e9))
+        else:
+            self.end_span(migration_id, step, int(timestamp * 1e9))
+
+    async def finish(self, migration_id: int, log_path: Optional[str], success: bool):
+        incident = self._incidents.pop(migration_id, None)
+        if incident is None:
+            return
+        incident.finish(success)
+        spans = incident.to_otlp()
+        self._recent[migration_id] = spans
+        while len(self._recent) > self.keep:
+            self._recent.popitem(last=False)
+        if log_path:
+            try:
+                await asyncio.to_thread(write_trace, os.path.join(log_path, TRACE_FILE), spans)
+            except OSError as e:
+                print(f"Could not write trace of migration {migration_id}: {str(e)}")
+        if self._queue is not None:
+            try:
+                self._queue.put_nowait(spans)
+            except asyncio.QueueFull:
+                self.export_errors += 1
+
+    def spans(self, migration_id: int, log_path: Optional[str] = None) -> Optional[List[dict]]:
+        """OTLP spans of a finished incident, from memory or the migration log directory"""
+        if migration_id in self._recent:
+            return self._recent[migration_id]
+        if log_path:
+            try:
+                with open(os.path.join(log_path, TRACE_FILE), "r") as file:
+                    return json.load(file)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+            except (OSError, ValueError, KeyError, IndexError):
+                return None
+        return None
+
+    async def _run(self):
+        while True:
+            traces = [await self._queue.get()]
+            while not self._queue.empty() and len(traces) < self.batch_size:
+                traces.append(self._queue.get_nowait())
+            await self._export([span for spans in traces for span in spans])
+
+    async def _export(self, spans: List[dict]):
+        request = otlp_request(spans)
+        try:
+            if self.export.startswith(("http://", "https://")):
+                if self._http is None:
+                    self._http = httpx.AsyncClient(timeout=10)
+                response = await self._http.post(self.export, json=request)
+                response.raise_for_status()
+            else:
+                await asyncio.to_thread(append_line, self.export, json.dumps(request, separators=(",", ":")))
+            self.exported += len(spans)
+        except Exception as e:
+            self.export_errors += 1
+            print(f"Error exporting {len(spans)} spans to {self.export}: {str(e)}")
+
+def write_trace(path: str, spans: List[dict]):
+    with open(path, "w") as file:
+        json.dump(otlp_request(spans), file, indent=2)
+
+def append_line(path: str, line: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as file:
+        file.write(line + "\n")
+
+incident_tracer = IncidentTracer()
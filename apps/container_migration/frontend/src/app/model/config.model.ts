@@ -5,6 +5,13 @@ export interface RuleConfig {
     targetCluster?: string | null;
     forensic_analysis: boolean;
     AI_suggestion: boolean;
+    match?: 'exact' | 'prefix' | 'regex';
+    namespace?: string | null;
+    image?: string | null;
+    proc_name?: string | null;
+    checkpoint_mode?: 'full' | 'pre-copy';
+    pre_copy_rounds?: number;
+    compression?: string | null;
 }
 
 export interface Config {
@@ -0,0 +1,9 @@
+export interface MigrationEvent {
+    migration_id: number;
+    pod: string;
+    step: string;
+    phase: 'queued' | 'started' | 'start' | 'end' | 'done' | 'failed';
+    timestamp: number;
+    elapsed_ms: number;
+    duration_ms?: number;
+}
@@ -6,4 +6,7 @@ export interface MigrationRequest {
     appName: string;
     forensicAnalysis: boolean;
     AISuggestion: boolean;
+    checkpointMode?: 'full' | 'pre-copy';
+    preCopyRounds?: number;
+    compression?: string;
 }
\ No newline at end of file
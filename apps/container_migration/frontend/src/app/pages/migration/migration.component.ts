@@ -4,6 +4,7 @@ import { K8sService } from '../../service/k8s.service';
 import { catchError, map, of, take, tap } from 'rxjs';
 import { Pod, PodsResponse } from '../../model/k8s.model';
 import { MigrationRequest } from '../../model/migration-request.model';
+import { MigrationEvent } from '../../model/migration-event.model';
 import { ForwardRefHandling } from '@angular/compiler';
 
 @Component({
@@ -96,6 +97,9 @@ export class MigrationComponent implements OnInit{
         this.loading = false;
         this.messageService.add({ key: 'tst', severity: 'success', summary: 'Success', detail: 'Migration started successfully' });
         this.reset();
+        if (response?.job_id) {
+          this.followMigration(response.job_id);
+        }
       }),
       catchError((error: any) => {
         this.messageService.add({ key: 'tst', severity: 'error', summary: 'Error', detail: error.detail });
@@ -103,4 +107,21 @@ export class MigrationComponent implements OnInit{
       })
     ).subscribe();
   }
+
+  private followMigration(migrationId: number): void {
+    this.k8sService.migrationEvents(migrationId).pipe(
+      catchError(() => of(null))
+    ).subscribe((event: MigrationEvent | null) => {
+      if (!event) {
+        return;
+      }
+      if (event.phase === 'end') {
+        this.messageService.add({ key: 'tst', severity: 'info', summary: event.pod, detail: `${event.step} finished in ${event.duration_ms} ms` });
+      } else if (event.phase === 'done') {
+        this.messageService.add({ key: 'tst', severity: 'success', summary: event.pod, detail: `Migration finished after ${event.elapsed_ms} ms` });
+      } else if (event.phase === 'failed') {
+        this.messageService.add({ key: 'tst', severity: 'error', summary: event.pod, detail: `Migration failed after ${event.elapsed_ms} ms` });
+      }
+    });
+  }
 }
@@ -3,6 +3,7 @@ import { Injectable } from '@angular/core';
 import { map, Observable } from 'rxjs';
 import { PodsResponse } from '../model/k8s.model';
 import { MigrationRequest } from '../model/migration-request.model';
+import { MigrationEvent } from '../model/migration-event.model';
 import { TreeNode } from 'primeng/api';
 
 @Injectable({
@@ -35,9 +36,32 @@ export class K8sService {
     return this.http.delete<void>(url);
   }
 
-  migratePod(request: MigrationRequest): Observable<void> {
+  migratePod(request: MigrationRequest): Observable<any> {
     const url = `${this.apiUrl}/migrate`;
-    return this.http.post<void>(url, request);
+    return this.http.post<any>(url, request);
+  }
+
+  /**
+   * Stream the step events of a migration from the backend's server-sent events endpoint.
+   * Completes once the migration is done or failed.
+   * @param migrationId The job id returned by migratePod
+   * @returns Observable emitting one MigrationEvent per step start/end.
+   */
+  migrationEvents(migrationId: number): Observable<MigrationEvent> {
+    const url = `${this.apiUrl}/migration-events?migration_id=${migrationId}`;
+    return new Observable<MigrationEvent>(subscriber => {
+      const source = new EventSource(url);
+      const handler = (message: MessageEvent) => {
+        const event: MigrationEvent = JSON.parse(message.data);
+        subscriber.next(event);
+        if (event.phase === 'done' || event.phase === 'failed') {
+          subscriber.complete();
+        }
+      };
+      ['queued', 'started', 'start', 'end', 'done', 'failed'].forEach(type => source.addEventListener(type, handler as EventListener));
+      source.onerror = () => subscriber.error('Migration event stream closed');
+      return () => source.close();
+    });
   }
 
 }
\ No newline at end of file
@@ -32,11 +32,14 @@ export class TeeEncapsulationService {
     return this.http.get<PodmanContainersResponse>(url);
   }
 
-  performTeeOperation(containerName: string, operation: string): Observable<TeeOperationResponse> {
+  performTeeOperation(containerName: string, operation: string, checkpointMode: 'full' | 'pre-copy' = 'full', preCopyRounds: number = 1, compression?: string): Observable<TeeOperationResponse> {
     const url = `${this.apiUrl}/tee-operation`;
     const body = {
       containerName: containerName,
-      operation: operation
+      operation: operation,
+      checkpointMode: checkpointMode,
+      preCopyRounds: preCopyRounds,
+      compression: compression
     };
     console.log('Sending TEE operation request:', body);
     return this.http.post<TeeOperationResponse>(url, body);
@@ -1,6 +1,9 @@
 #!/bin/bash
 forensicAnalysis=false
 AISuggestion=false
+preCopyRounds=0
+compression=""
+cleanupCheckpoints=false
 
 # Defaults for optional variables
 sourceCluster="cluster1"
@@ -13,7 +16,8 @@ while [[ "$#" -gt 0 ]]; do
     case $1 in
         -fa|--forensic-analysis) forensicAnalysis=true ;;
         -ai|--ai-suggestion) AISuggestion=true ;;
-        -h|--help) echo "-- Usage: $0 <podName> [--forensic-analysis|-fa] [--log-dir <path>] [--source-cluster <name>] [--dest-cluster <name>] [--namespace <ns>] --"; exit 0 ;;
+        --cleanup-checkpoints) cleanupCheckpoints=true ;;
+        -h|--help) echo "-- Usage: $0 <podName> [--forensic-analysis|-fa] [--log-dir <path>] [--source-cluster <name>] [--dest-cluster <name>] [--namespace <ns>] [--compression <none|gzip[:level]|zstd[:level]>] [--cleanup-checkpoints] --"; exit 0 ;;
         --log-dir) 
             shift
             custom_log_dir=$1
@@ -31,6 +35,14 @@ while [[ "$#" -gt 0 ]]; do
             shift
             namespace=$1
             ;;
+        --pre-copy)
+            shift
+            preCopyRounds=$1
+            ;;
+        --compression)
+            shift
+            compression=$1
+            ;;
         *) 
             if [[ -z "$podName" ]]; then
                 podName=$1
@@ -45,6 +57,12 @@ if [ -z "$podName" ]; then
     exit 1
 fi
 
+# The kubelet checkpoint API cannot pre-dump, pre-copy is only available for podman (tee-migration.sh)
+if [[ "${preCopyRounds:-0}" -gt 0 ]]; then
+    echo "-- Pre-copy is not supported for Kubernetes migrations, use tee-migration.sh for podman containers --" >&2
+    exit 1
+fi
+
 # If user did not provide a namespace, keep default above
 # namespace already set to "default" unless overridden by --namespace
 
@@ -55,6 +73,12 @@ log() {
   echo "$1" >> "$log_file"
 }
 
+# Report step progress on stdout, the backend turns these lines into status updates
+# Usage: progress <step> <start|end>
+progress() {
+  echo "STEP $1 $2 $(date +%s%3N)"
+}
+
 # Function to handle errors
 handle_error() {
   local errorMsg="$1"
@@ -169,29 +193,20 @@ generate_ai_suggestion() {
   # Define the system instruction
   systemInstruction="You are a professional IT security analyst specializing in container security. Your task is to analyze \`checkpointctl\` output provided by the user and generate a detailed security assessment. Specifically: \n- Identify and explain any issues, vulnerabilities, or misconfigurations present in the container based on the report.\n- Suggest corrective actions to address each identified issue.\n- Hypothesize potential attacks or threats that could exploit these vulnerabilities and explain the potential impact of these attacks.\n- Make one hypothesis about what attack happened in this container\n\nYour responses should be clear, concise, and professional, aimed at helping the user improve the container's security posture effectively. Use technical language appropriate for IT professionals and provide actionable recommendations.\n\nIt is possible that attacks come in a base64 encoded command. Make sure to decrypt the base64 encoded string to get more information about the attack.\n\n\nThe running app is a spring boot application.\nThe fact that these files are changed is required by the application and should not be considered as an issue:\n- etc/mtab\n- run/secrets/kubernetes.io/\n- run/secrets/kubernetes.io/serviceaccount/\n- tmp/hsperfdata_root/1"
 
-  # Use the variables inside the curl command
-  AIOutput=$(curl "https://api.groq.com/openai/v1/chat/completions" \
-    -X POST \
+  # Build the request with jq so the report and prompt are escaped properly
+  requestBody=$(jq -n --arg system "$(printf '%b' "$systemInstruction")" --argjson report "$forensicReport" \
+    --arg model "${CUBEMIG_AI_MODEL:-llama-3.3-70b-versatile}" \
+    '{messages: [{role: "system", content: $system}, {role: "user", content: $report}],
+      model: $model, temperature: 1, max_tokens: 1024, top_p: 1, stream: false, stop: null}')
+
+  # Bounded retries with backoff on timeouts, 429 and 5xx responses
+  AIOutput=$(curl "${CUBEMIG_AI_URL:-https://api.groq.com/openai/v1/chat/completions}" \
+    -X POST --fail --silent --show-error \
+    --connect-timeout 10 --max-time "${CUBEMIG_AI_TIMEOUT:-120}" \
+    --retry "${CUBEMIG_AI_MAX_RETRIES:-3}" --retry-delay 0 --retry-max-time 300 \
     -H "Content-Type: application/json" \
     -H "Authorization: Bearer ${GROQ_API_KEY}" \
-    -d "{
-          \"messages\": [
-            {
-              \"role\": \"system\",
-              \"content\": \"$systemInstruction\"
-            },
-            {
-              \"role\": \"user\",
-              \"content\": $forensicReport
-            }
-          ],
-          \"model\": \"llama-3.3-70b-versatile\",
-          \"temperature\": 1,
-          \"max_tokens\": 1024,
-          \"top_p\": 1,
-          \"stream\": false,
-          \"stop\": null
-        }") || handle_error "Failed to get AI suggestion"
+    -d "$requestBody") || handle_error "Failed to get AI suggestion"
 
   ai_suggestion=$(echo "$AIOutput" | jq -r '.choices[0].message.content')
   model=$(echo "$AIOutput" | jq -r '.model')
@@ -205,7 +220,8 @@ generate_ai_suggestion() {
   echo "Model: $model" > "$ai_suggestion_file"
   echo "AI Suggestion: $ai_suggestion" >> "$ai_suggestion_file"
 
-      cat <<EOF >> "$log_dir/performance_summary.txt"
+      # Appended to performance_summary.txt once the summary branch is done
+      cat <<EOF > "$log_dir/ai_performance.tmp"
 --- AI generation performance ---
 Queue Time: $ai_queue_time ms
 Prompt Time: $ai_prompt_time ms
@@ -236,34 +252,57 @@ log "-- Creating checkpoint for $podName on $nodename --"
 
 migrationStartTime=$(date +%s%3N)
 
+progress checkpoint start
 startTime=$(date +%s%3N)
 checkpoint_output=$(curl -sk -X POST "https://$nodename:10250/checkpoint/${namespace}/${podName}/${containerName}" \
   --key /home/ubuntu/.kube/pki/$currentCluster-apiserver-kubelet-client.key \
   --cacert /home/ubuntu/.kube/pki/$currentCluster-ca.crt \
   --cert /home/ubuntu/.kube/pki/$currentCluster-apiserver-kubelet-client.crt) || handle_error "Failed to create checkpoint"
 checkpointTime=$(($(date +%s%3N) - $startTime))
+progress checkpoint end
+# The mode that ran and its pre-dump rounds, for the performance records
+echo "CHECKPOINT_MODE full 0"
 log "checkpoint output: $checkpoint_output"
 log "-- Checkpoint created --"
 
 log "------------------------------------------------------------------"
 
-log "-- Determining latest checkpoint for ${podName} --"
+log "-- Locating checkpoint for ${podName} --"
 
+progress locate start
 startTime=$(date +%s%3N)
-# Step 4: Get path to newest checkpoint file with node name incorporated
-checkpointfile=$(ls -1t /home/ubuntu/nfs/checkpoints/${nodename}/checkpoint-${podName}_${namespace}-${containerName}-*.tar | head -n 1)
+# Step 4: Map the path the kubelet reported ({"items":["/var/lib/kubelet/checkpoints/..."]}) to the node's NFS mount
+checkpointItem=$(echo "$checkpoint_output" | jq -r '.items[0] // empty' 2>/dev/null)
+if [[ -n "$checkpointItem" ]]; then
+  checkpointfile="/home/ubuntu/nfs/checkpoints/${nodename}/$(basename "$checkpointItem")"
+  # NFS may not show the new file right away, back off from 5 ms up to 250 ms for at most ~10 s
+  delay=5
+  waited=0
+  while [[ ! -e "$checkpointfile" && "$waited" -lt 10000 ]]; do
+    sleep "$(awk -v ms=$delay 'BEGIN {print ms / 1000}')"
+    waited=$((waited + delay))
+    delay=$((delay * 2 > 250 ? 250 : delay * 2))
+  done
+  [[ -e "$checkpointfile" ]] || handle_error "Checkpoint $checkpointfile did not appear on NFS"
+else
+  # No path in the response, fall back to the newest matching checkpoint
+  checkpointfile=$(ls -1t /home/ubuntu/nfs/checkpoints/${nodename}/checkpoint-${podName}_${namespace}-${containerName}-*.tar | head -n 1)
+fi
 latestCheckpointTime=$(($(date +%s%3N) - $startTime))
+progress locate end
 
-log "-- Latest checkpoint found --"
+log "-- Checkpoint found: $checkpointfile --"
 
 log "------------------------------------------------------------------"
 
 log "-- Changing permissions for checkpoint file --"
 
+progress chmod start
 startTime=$(date +%s%3N)
 # Step 4.5: Change permissions of the checkpoint file
 sudo chmod a+rwx "$checkpointfile" || handle_error "Failed to change permissions of checkpoint file"
 permissionTime=$(($(date +%s%3N) - $startTime))
+progress chmod end
 
 log "-- Permissions changed --"
 
@@ -273,6 +312,7 @@ checkpoint_image_name=$(kubectl get pod $podName -o jsonpath='{.spec.containers[
 
 log "-- Convert checkpoint into image --"
 
+progress image_build start
 startTime=$(date +%s%3N)
 # Step 5: Convert checkpoint to image
 log "Checkpoint image name: $checkpoint_image_name"
@@ -282,12 +322,14 @@ buildah add $newcontainer $checkpointfile / || handle_error "Failed to add check
 buildah config --annotation=io.kubernetes.cri-o.annotations.checkpoint.name=${containerName} $newcontainer || handle_error "Failed to add checkpoint annotation to container"
 buildah config --annotation=io.container.manager=crio $newcontainer || handle_error "Failed to add crio annotation to container"
 newImageTime=$(($(date +%s%3N) - $startTime))
+progress image_build end
 
 checkpoint_image_name=$(image=$(kubectl get pod "$podName" -o jsonpath='{.spec.containers[0].image}') && image=${image##*/} && image=${image%%:*} && echo "$image") || handle_error "Failed to get image name"
 
 log "Checkpoint image name: $checkpoint_image_name"
 log "-- Commiting new image --"
 
+progress push start
 startTime=$(date +%s%3N)
 #sudo buildah commit $newcontainer $checkpoint_image_name:checkpoint
 buildah commit $newcontainer $checkpoint_image_name:checkpoint || handle_error "Failed to commit new image"
@@ -295,8 +337,24 @@ buildah rm $newcontainer || handle_error "Failed to remove new container"
 
 log "-- Pushing image \"$checkpoint_image_name:checkpoint\" to local registry --"
 # Step 6: Push the image to local registry
-buildah push --tls-verify=false localhost/$checkpoint_image_name:checkpoint 10.0.0.180:5000/$checkpoint_image_name:checkpoint || handle_error "Failed to push image to local registry"
+# Layer compression of the pushed image, buildah's default (gzip) when not given
+pushCompression=()
+if [[ -n "$compression" ]]; then
+  codec="${compression%%:*}"
+  level=""
+  [[ "$compression" == *:* ]] && level="${compression##*:}"
+  case "$codec" in
+    none) pushCompression=(--disable-compression) ;;
+    gzip|zstd)
+      pushCompression=(--compression-format "$codec")
+      [[ -n "$level" ]] && pushCompression+=(--compression-level "$level")
+      ;;
+    *) log "-- Warning: $codec is not a valid OCI layer compression, using the default --" ;;
+  esac
+fi
+buildah push --tls-verify=false "${pushCompression[@]}" localhost/$checkpoint_image_name:checkpoint 10.0.0.180:5000/$checkpoint_image_name:checkpoint || handle_error "Failed to push image to local registry"
 pushImageTime=$(($(date +%s%3N) - $startTime))
+progress push end
 
 log "-- Image pushed onto local registy --"
 
@@ -308,6 +366,7 @@ kubectl config set-context --current --namespace="$namespace"
 
 log "-- Applying restore yaml file --"
 
+progress pod_ready start
 startTime=$(date +%s%3N)
 kubectl apply -f /home/ubuntu/meierm78/CubeMig/scripts/migration/yaml/restore_$containerName.yaml || handle_error "Failed to apply restore yaml file"
 
@@ -353,63 +412,92 @@ else
     podReadyTime=$(($(date +%s%3N) - $startTime))
 fi
 
+progress pod_ready end
 migrationTotalTime=$(($(date +%s%3N) - $migrationStartTime))
 
 log "------------------------------------------------------------------"
 
-log "--- Deleting old pod ---"
-podDeletionStartTime=$(date +%s%3N)
-kubectl config use-context "$sourceCluster" || handle_error "Failed to switch context to $sourceCluster"
-kubectl config set-context --current --namespace="$namespace"
-kubectl delete pod $podName || handle_error "Failed to delete pod"
-podDeletionTime=$(($(date +%s%3N) - $podDeletionStartTime))
-log "-- Old pod \"$podName\" deleted --"
-
-log "------------------------------------------------------------------"
-
-log "-- Summarizing migration performance --"
-summarize_performance
-log "-- Performance summary created --"
-
+# Post-restore stages run as two branches: deletion + performance summary, and forensics + AI.
+# The AI suggestion only waits for the forensic report, the whole stage takes as long as the longer branch.
+(
+  log "--- Deleting old pod ---"
+  progress source_delete start
+  podDeletionStartTime=$(date +%s%3N)
+  kubectl config use-context "$sourceCluster" || handle_error "Failed to switch context to $sourceCluster"
+  kubectl config set-context --current --namespace="$namespace"
+  kubectl delete pod $podName || handle_error "Failed to delete pod"
+  podDeletionTime=$(($(date +%s%3N) - $podDeletionStartTime))
+  progress source_delete end
+  log "-- Old pod \"$podName\" deleted --"
+
+  log "-- Summarizing migration performance --"
+  summarize_performance
+  log "-- Performance summary created --"
+) &
+cleanupBranch=$!
+
+(
+  if [ "$forensicAnalysis" == true ]; then
+    log "-- Performing forensic analysis --"
+    progress forensics start
+    sudo chmod 770 /home/ubuntu/meierm78/CubeMig/scripts/utils/forensic_analysis/forensic_analysis.sh
+    /home/ubuntu/meierm78/CubeMig/scripts/utils/forensic_analysis/forensic_analysis.sh "$checkpointfile" "$log_dir" || handle_error "Failed to perform forensic analysis"
+    progress forensics end
+    log "-- Forensic analysis complete --"
+  fi
 
-if [ "$forensicAnalysis" == true ]; then
-  log "-- Performing forensic analysis --"
-  sudo chmod 770 /home/ubuntu/meierm78/CubeMig/scripts/utils/forensic_analysis/forensic_analysis.sh
-  /home/ubuntu/meierm78/CubeMig/scripts/utils/forensic_analysis/forensic_analysis.sh "$checkpointfile" "$log_dir" || handle_error "Failed to perform forensic analysis"
-  log "-- Forensic analysis complete --"
+  if [ "$forensicAnalysis" == true ] && [ "$AISuggestion" == true ]; then
+    log "-- Asking AI for suggestion --"
+    progress ai start
+    generate_ai_suggestion
+    progress ai end
+    log "-- AI suggestion generated --"
+  fi
+) &
+analysisBranch=$!
+
+wait $cleanupBranch
+cleanupStatus=$?
+wait $analysisBranch
+analysisStatus=$?
+if [ -f "$log_dir/ai_performance.tmp" ]; then
+  cat "$log_dir/ai_performance.tmp" >> "$log_dir/performance_summary.txt"
+  rm -f "$log_dir/ai_performance.tmp"
 fi
-
-if [ "$forensicAnalysis" == true ] && [ "$AISuggestion" == true ]; then
-  log "-- Asking AI for suggestion --"
-  generate_ai_suggestion
-  log "-- AI suggestion generated --"
+# handle_error already logged the cause inside the failed branch
+if [ "$cleanupStatus" -ne 0 ] || [ "$analysisStatus" -ne 0 ]; then
+  exit 1
 fi
 
 log "------------------------------------------------------------------"
 
-# Improved cleanup: Clean by application name, not individual pod names
-# Extract base app name (vuln-spring, vuln-redis, atomic-red, etc.)
-baseAppName=$(echo "$containerName" | sed 's/-[0-9].*$//')
-checkpointDir="/home/ubuntu/nfs/checkpoints/${nodename}/checkpoint-*_${namespace}-${baseAppName}-*.tar"
-log "-- Deleting old checkpoints for application ${baseAppName} if more than 5 are saved --"
-
-checkpointCount=$(ls $checkpointDir 2>/dev/null | wc -l)
-if [ "$checkpointCount" -gt 5 ]; then
-  excessCount=$((checkpointCount - 5))
-  log "-- $checkpointCount checkpoint files for ${baseAppName} on $nodename detected. Deleting oldest $excessCount files... --"
-  
-  # Delete the oldest files to keep only 5 (more efficient approach)
-  filesToDelete=$(ls -1t $checkpointDir | tail -n $excessCount)
-  for fileToDelete in $filesToDelete; do
-    log "-- Deleting $fileToDelete --"
-    rm "$fileToDelete" 2>/dev/null || log "-- Warning: Could not delete $fileToDelete --"
-  done
-  
-  # Verify final count
-  finalCount=$(ls $checkpointDir 2>/dev/null | wc -l)
-  log "-- Cleanup complete. ${baseAppName} now has $finalCount checkpoint files --"
-else
-  log "-- $checkpointCount checkpoint files for ${baseAppName} on $nodename detected (within limit) --"
+# Checkpoint retention is done by the backend in the background (utils/checkpoint_retention.py),
+# --cleanup-checkpoints keeps the old per-app cleanup for runs without the backend
+if [[ "$cleanupCheckpoints" == true ]]; then
+  # Improved cleanup: Clean by application name, not individual pod names
+  # Extract base app name (vuln-spring, vuln-redis, atomic-red, etc.)
+  baseAppName=$(echo "$containerName" | sed 's/-[0-9].*$//')
+  checkpointDir="/home/ubuntu/nfs/checkpoints/${nodename}/checkpoint-*_${namespace}-${baseAppName}-*.tar"
+  log "-- Deleting old checkpoints for application ${baseAppName} if more than 5 are saved --"
+
+  checkpointCount=$(ls $checkpointDir 2>/dev/null | wc -l)
+  if [ "$checkpointCount" -gt 5 ]; then
+    excessCount=$((checkpointCount - 5))
+    log "-- $checkpointCount checkpoint files for ${baseAppName} on $nodename detected. Deleting oldest $excessCount files... --"
+
+    # Delete the oldest files to keep only 5 (more efficient approach)
+    filesToDelete=$(ls -1t $checkpointDir | tail -n $excessCount)
+    for fileToDelete in $filesToDelete; do
+      log "-- Deleting $fileToDelete --"
+      rm "$fileToDelete" 2>/dev/null || log "-- Warning: Could not delete $fileToDelete --"
+    done
+
+    # Verify final count
+    finalCount=$(ls $checkpointDir 2>/dev/null | wc -l)
+    log "-- Cleanup complete. ${baseAppName} now has $finalCount checkpoint files --"
+  else
+    log "-- $checkpointCount checkpoint files for ${baseAppName} on $nodename detected (within limit) --"
+  fi
 fi
 
 log "------------------------------------------------------------------"
@@ -3,6 +3,8 @@
 # This script is used to migrate a podman container running in sous@bert.cloudlab.zhaw.ch to an SEV-SNP VM
 
 # Usage: ./tee-migration.sh <container_name> <src_vm_name> <dest_vm_name>
+# Set CHECKPOINT_COMPRESSION to none, gzip[:level], zstd[:level] or lz4 (default: gzip)
+# Set PRE_COPY_ROUNDS=1 to pre-dump the memory while the container keeps running and freeze it only for the dirty pages
 
 # Check if the container name and the source VM name and destination VM name are provided
 # Check if the container name is provided
@@ -51,8 +53,57 @@ else
     DEST_VM_ACCESS="$SSH_ACCESS_SEV_SNP_VM"
 fi
 
+# Checkpoint compression
+CHECKPOINT_COMPRESSION="${CHECKPOINT_COMPRESSION:-gzip}"
+CODEC="${CHECKPOINT_COMPRESSION%%:*}"
+LEVEL=""
+[[ "$CHECKPOINT_COMPRESSION" == *:* ]] && LEVEL="${CHECKPOINT_COMPRESSION##*:}"
+case "$CODEC" in
+    none) EXTENSION="tar"; COMPRESS_CMD="" ;;
+    gzip) EXTENSION="tar.gz"; COMPRESS_CMD="gzip -f -${LEVEL:-6}" ;;
+    zstd) EXTENSION="tar.zst"; COMPRESS_CMD="zstd -q -f --rm -T0 -${LEVEL:-3}" ;;
+    lz4) EXTENSION="tar.lz4"; COMPRESS_CMD="lz4 -q -f --rm -${LEVEL:-1}" ;;
+    *)
+        echo "Unknown checkpoint compression $CHECKPOINT_COMPRESSION, use none, gzip, zstd or lz4"
+        exit 1
+        ;;
+esac
+# podman compresses the export itself at its default level, explicit levels and lz4 go through the codec's CLI
+if [[ -z "$LEVEL" && "$CODEC" != "lz4" ]]; then
+    PODMAN_COMPRESS="$CODEC"
+    COMPRESS_CMD=""
+else
+    PODMAN_COMPRESS="none"
+fi
+case "$PODMAN_COMPRESS" in
+    none) EXPORT_EXTENSION="tar" ;;
+    gzip) EXPORT_EXTENSION="tar.gz" ;;
+    zstd) EXPORT_EXTENSION="tar.zst" ;;
+esac
+
 # define the checkpoint name
-CHECKPOINT_NAME="$CONTAINER_NAME-checkpoint.tar.gz"
+EXPORT_NAME="$CONTAINER_NAME-checkpoint.$EXPORT_EXTENSION"
+CHECKPOINT_NAME="$CONTAINER_NAME-checkpoint.$EXTENSION"
+PRE_CHECKPOINT_NAME="$CONTAINER_NAME-pre-checkpoint.$EXPORT_EXTENSION"
+
+# Number of pre-dump rounds, 0 takes a single full checkpoint
+PRE_COPY_ROUNDS="${PRE_COPY_ROUNDS:-0}"
+# podman keeps a single pre-checkpoint per container (a new one supersedes the previous one),
+# so more rounds would only repeat the full pre-dump
+if [ "$PRE_COPY_ROUNDS" -gt 1 ]; then
+    echo "podman supports a single pre-checkpoint, using 1 pre-copy round instead of $PRE_COPY_ROUNDS"
+    PRE_COPY_ROUNDS=1
+fi
+
+# print the CRIU statistics of a `podman container checkpoint --print-stats` run
+# Usage: print_checkpoint_stats <label> <stats json> [transfer time ms]
+print_checkpoint_stats() {
+    echo "$2" | jq -r --arg name "$1" --arg transfer "$3" '.container_statistics[0] as $c |
+        "\($name): pages written \($c.criu_statistics.pages_written), pages scanned \($c.criu_statistics.pages_scanned), " +
+        "frozen time \($c.criu_statistics.frozen_time / 1000) ms, memdump time \($c.criu_statistics.memdump_time / 1000) ms, " +
+        "checkpoint \($c.runtime_checkpoint_duration / 1000) ms" +
+        (if $transfer == "" then "" else ", transfer \($transfer) ms" end)' || echo "$1: $2"
+}
 
 
 ####### DO THE MIGRATION #######
@@ -66,14 +117,49 @@ else
     echo "Container $CONTAINER_NAME is running in the source VM $SRC_VM_NAME"
 fi
 
+# pre-copy: dump the memory while the container keeps running and send it ahead of the final checkpoint
+if [ "$PRE_COPY_ROUNDS" -gt 0 ]; then
+    round_start=$(date +%s%3N)
+    if ! pre_stats=$(ssh $SRC_VM_ACCESS "sudo podman container checkpoint $CONTAINER_NAME --pre-checkpoint --print-stats --compress $PODMAN_COMPRESS -e ~/podman_checkpoints/$PRE_CHECKPOINT_NAME"); then
+        echo "Failed to pre-checkpoint the container $CONTAINER_NAME"
+        exit 1
+    fi
+    transfer_start=$(date +%s%3N)
+    if ! ssh $SRC_VM_ACCESS "sudo chmod 777 ~/podman_checkpoints/$PRE_CHECKPOINT_NAME && sudo scp -i $SSH_KEY ~/podman_checkpoints/$PRE_CHECKPOINT_NAME $DEST_VM_NAME:~/podman_checkpoints/$PRE_CHECKPOINT_NAME"; then
+        echo "Failed to copy the pre-checkpoint to the destination VM $DEST_VM_NAME"
+        exit 1
+    fi
+    round_end=$(date +%s%3N)
+    print_checkpoint_stats "Pre-copy round 1" "$pre_stats" "$((round_end - transfer_start))"
+    echo "Pre-copy round 1 took $((round_end - round_start)) ms"
+
+    # final dump: only the pages dirtied since the pre-checkpoint are written while the container is frozen
+    if ! final_stats=$(ssh $SRC_VM_ACCESS "sudo podman container checkpoint $CONTAINER_NAME --with-previous --print-stats --tcp-established --file-locks --compress $PODMAN_COMPRESS -e ~/podman_checkpoints/$EXPORT_NAME"); then
+        echo "Failed to checkpoint the container $CONTAINER_NAME"
+        exit 1
+    else
+        echo "Container $CONTAINER_NAME checkpointed successfully"
+        print_checkpoint_stats "Final dump (dirty pages)" "$final_stats"
+    fi
 # make a checkpoint of the container
-if ! ssh $SRC_VM_ACCESS "sudo podman container checkpoint $CONTAINER_NAME --tcp-established --file-locks -e ~/podman_checkpoints/$CONTAINER_NAME-checkpoint.tar.gz"; then
+elif ! ssh $SRC_VM_ACCESS "sudo podman container checkpoint $CONTAINER_NAME --tcp-established --file-locks --compress $PODMAN_COMPRESS -e ~/podman_checkpoints/$EXPORT_NAME"; then
     echo "Failed to checkpoint the container $CONTAINER_NAME"
     exit 1
 else
     echo "Container $CONTAINER_NAME checkpointed successfully"
 fi
 
+# compress the checkpoint when podman cannot do it itself
+if [ -n "$COMPRESS_CMD" ]; then
+    compress_start=$(date +%s%3N)
+    if ! ssh $SRC_VM_ACCESS "sudo $COMPRESS_CMD ~/podman_checkpoints/$EXPORT_NAME"; then
+        echo "Failed to compress the checkpoint with $CHECKPOINT_COMPRESSION"
+        exit 1
+    fi
+    echo "Checkpoint compressed with $CHECKPOINT_COMPRESSION in $(( $(date +%s%3N) - compress_start )) ms"
+fi
+echo "Checkpoint size: $(ssh $SRC_VM_ACCESS "sudo stat -c %s ~/podman_checkpoints/$CHECKPOINT_NAME") bytes ($CHECKPOINT_COMPRESSION)"
+
 # add rights to all users to access and modify the podman checkpoints
 if ! ssh $SRC_VM_ACCESS "sudo chmod 777 ~/podman_checkpoints/$CHECKPOINT_NAME"; then
     echo "Failed to add rights to all users to access and modify the podman checkpoints in the source VM $SRC_VM_NAME"
@@ -83,15 +169,32 @@ else
 fi
 
 # copy the checkpoint to the destination VM
+transfer_start=$(date +%s%3N)
 if ! ssh $SRC_VM_ACCESS "sudo scp -i $SSH_KEY ~/podman_checkpoints/$CHECKPOINT_NAME $DEST_VM_NAME:~/podman_checkpoints/$CHECKPOINT_NAME"; then
     echo "Failed to copy the checkpoint to the destination VM $DEST_VM_NAME"
     exit 1
 else
-    echo "Checkpoint $CHECKPOINT_NAME copied to the destination VM $DEST_VM_NAME"
+    echo "Checkpoint $CHECKPOINT_NAME copied to the destination VM $DEST_VM_NAME in $(( $(date +%s%3N) - transfer_start )) ms"
+fi
+
+# podman imports tar, tar.gz and tar.zst, lz4 has to be unpacked first
+IMPORT_NAME="$CHECKPOINT_NAME"
+if [ "$CODEC" == "lz4" ]; then
+    IMPORT_NAME="$CONTAINER_NAME-checkpoint.tar"
+    decompress_start=$(date +%s%3N)
+    if ! ssh $DEST_VM_ACCESS "sudo lz4 -d -q -f --rm ~/podman_checkpoints/$CHECKPOINT_NAME ~/podman_checkpoints/$IMPORT_NAME"; then
+        echo "Failed to decompress the checkpoint in the destination VM $DEST_VM_NAME"
+        exit 1
+    fi
+    echo "Checkpoint decompressed in $(( $(date +%s%3N) - decompress_start )) ms"
 fi
 
 # restore the container in the destination VM
-if ! ssh $DEST_VM_ACCESS "sudo podman container restore --tcp-established --file-locks --import ~/podman_checkpoints/$CHECKPOINT_NAME"; then
+RESTORE_IMPORT="--import ~/podman_checkpoints/$IMPORT_NAME"
+if [ "$PRE_COPY_ROUNDS" -gt 0 ]; then
+    RESTORE_IMPORT="--import-previous ~/podman_checkpoints/$PRE_CHECKPOINT_NAME $RESTORE_IMPORT"
+fi
+if ! ssh $DEST_VM_ACCESS "sudo podman container restore --tcp-established --file-locks $RESTORE_IMPORT"; then
     echo "Failed to restore the container $CONTAINER_NAME in the destination VM $DEST_VM_NAME"
 else
     echo "Container $CONTAINER_NAME restored successfully in the destination VM $DEST_VM_NAME"